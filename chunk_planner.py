@@ -0,0 +1,103 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Choice of the Dask chunks of the loaded data, depending on the processes which use it.
+# The processes working along the time axis (temporal reducers, curve fitting, climatological normals) get chunks
+# containing the whole time series of small spatial tiles. The pixel-wise processes (band math, masks, kernels) get
+# one date per chunk with large spatial tiles. In both cases the chunks hold about TARGET_CHUNK_BYTES.
+
+import math
+from graph_optimizer import node_sources
+
+TARGET_CHUNK_BYTES = 128 * 1024**2 # Bytes per chunk of a single band
+MIN_TILE_SIZE      = 256           # Pixels, side of the smallest spatial tile
+MAX_TILE_SIZE      = 8192          # Pixels, side of the largest spatial tile
+TEMPORAL_PROCESSES = ['fit_curve','predict_curve','climatological_normal','anomaly','resample_cube_temporal','coherence']
+TEMPORAL_DIMENSIONS = ['t','time','temporal']
+
+TEMPORAL = 'temporal' # Chunks with the whole time series
+SPATIAL  = 'spatial'  # Chunks with a single date
+
+
+def is_temporal(node):
+    if node.process_id in TEMPORAL_PROCESSES:
+        return True
+    if node.process_id in ['reduce_dimension','apply_dimension']:
+        return node.arguments.get('dimension') in TEMPORAL_DIMENSIONS
+    return False
+
+def plan_chunks(graph,skip=()):
+    """
+    Chooses the chunk layout of the data of every load_collection of the graph.
+
+    The layout is TEMPORAL if any process downstream of the load_collection works along the time axis, SPATIAL otherwise.
+    :param graph: graph translated by openeo_pg_parser
+    :param skip: ids of the nodes not to be executed (e.g. merged duplicates)
+    :return: dict mapping the load_collection ids to TEMPORAL or SPATIAL
+    """
+    nodes = {node.id: node for node in graph}
+    consumers = {}
+    for node in graph:
+        if node.id in skip:
+            continue
+        for source in node_sources(node,nodes):
+            consumers.setdefault(source,[]).append(node)
+    plan = {}
+    for load in graph:
+        if load.process_id != 'load_collection' or load.id in skip:
+            continue
+        layout = SPATIAL
+        visited = set()
+        toVisit = [load.id]
+        while len(toVisit) > 0:
+            nodeId = toVisit.pop()
+            for consumer in consumers.get(nodeId,[]):
+                if consumer.id in visited:
+                    continue
+                visited.add(consumer.id)
+                if is_temporal(consumer):
+                    layout = TEMPORAL
+                    break
+                toVisit.append(consumer.id)
+            if layout == TEMPORAL:
+                break
+        plan[load.id] = layout
+    return plan
+
+def tile_size(pixels):
+    # Side of a square tile with the given number of pixels, multiple of MIN_TILE_SIZE
+    side = int(math.sqrt(max(pixels,1)) // MIN_TILE_SIZE) * MIN_TILE_SIZE
+    return min(max(side,MIN_TILE_SIZE),MAX_TILE_SIZE)
+
+def chunk_shape(layout,itemSize,nTimes,targetBytes=TARGET_CHUNK_BYTES):
+    """
+    Returns the dask_chunks for dc.load.
+
+    :param layout: TEMPORAL or SPATIAL
+    :param int itemSize: bytes per pixel of the largest band dtype
+    :param int nTimes: number of dates to be loaded
+    """
+    if layout == TEMPORAL:
+        side = tile_size(targetBytes / (itemSize * max(nTimes,1)))
+        return {'time': max(nTimes,1), 'y': side, 'x': side}
+    side = tile_size(targetBytes / itemSize)
+    return {'time': 1, 'y': side, 'x': side}
+
+def single_chunk(data,dims):
+    """
+    Rechunks the data so that each of the dimensions is in a single chunk, only if it isn't already.
+
+    :param data: xarray DataArray or Dataset, lazy or not
+    :param list dims: dimensions which the following operation needs entirely in every chunk
+    """
+    chunks = data.chunks
+    if chunks is None:
+        return data
+    if not isinstance(chunks,dict): # DataArray.chunks is a tuple following data.dims
+        chunks = dict(zip(data.dims,chunks))
+    toMerge = {dim: -1 for dim in dims if dim in chunks and len(chunks[dim]) > 1}
+    if len(toMerge) == 0:
+        return data
+    print('[*] Rechunking along {}'.format(', '.join(toMerge.keys())))
+    return data.chunk(toMerge)
@@ -0,0 +1,99 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Parallel GeoTiff writer. The file is created empty, internally tiled and compressed, and every Dask chunk of the data
+# is written into its window by the Dask worker computing it. The writes are serialized by a lock, the computations
+# are not. For Cloud-Optimized GeoTiffs the overviews are then built and the file is rewritten with the COG layout
+# (tiles and overviews before the data), with GDAL < 3.1 which doesn't have the COG driver.
+
+import os
+import uuid
+import threading
+import numpy as np
+import dask.array as da
+import rasterio
+import rasterio.shutil
+from rasterio.windows import Window
+from rasterio.enums import Resampling
+from affine import Affine
+
+TILE_SIZE   = 512       # Pixels, side of the internal tiles
+COMPRESSION = 'DEFLATE'
+WRITE_CHUNK = 4096      # Pixels, side of the chunks written by the workers, multiple of TILE_SIZE
+
+localLock = threading.Lock() # Used when there is no Dask distributed client
+
+
+class WindowWriter():
+    # Target of dask.array.store: every assigned block is written into its window of the GeoTiff
+    def __init__(self,path):
+        self.path = path
+
+    def __setitem__(self,key,block):
+        bands, rows, cols = key
+        indexes = list(range(bands.start + 1,bands.stop + 1))
+        with rasterio.open(self.path,'r+') as dst:
+            dst.write(block,indexes=indexes,window=Window.from_slices(rows,cols))
+
+def geotiff_profile(data,crs):
+    x = data.x.values
+    y = data.y.values
+    resX = x[1] - x[0] if len(x) > 1 else 1
+    resY = y[1] - y[0] if len(y) > 1 else -1
+    profile = {
+        'driver': 'GTiff',
+        'dtype': str(data.dtype),
+        'count': data.shape[0],
+        'height': data.shape[1],
+        'width': data.shape[2],
+        'crs': crs,
+        'transform': Affine(resX,0,x[0] - resX / 2,0,resY,y[0] - resY / 2),
+        'tiled': True,
+        'blockxsize': TILE_SIZE,
+        'blockysize': TILE_SIZE,
+        'compress': COMPRESSION,
+        'interleave': 'band', # Every band has its own tiles: a window of a band is written without touching the other bands
+        'BIGTIFF': 'IF_SAFER',
+    }
+    if np.issubdtype(data.dtype,np.floating):
+        profile['nodata'] = np.nan
+    return profile
+
+def overview_factors(height,width):
+    factors = []
+    factor = 2
+    while max(height,width) / factor >= TILE_SIZE:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+def write_geotiff(data,path,crs,cog=False,lock=None):
+    """
+    Writes a DataArray to a tiled and compressed GeoTiff, in parallel if the data is a Dask array.
+
+    :param data: DataArray with dims (band, y, x), band being any dimension (e.g. variable or time)
+    :param str path: output file
+    :param crs: CRS of the data
+    :param bool cog: if True a Cloud-Optimized GeoTiff, with overviews, is written
+    :param lock: lock shared by the Dask workers (e.g. dask.distributed.Lock), a local lock if None
+    """
+    profile = geotiff_profile(data,crs)
+    tmpPath = os.path.join(os.path.dirname(path),'.' + str(uuid.uuid4()) + '.tif') if cog else path
+    with rasterio.open(tmpPath,'w',**profile) as dst:
+        for i, name in enumerate(data[data.dims[0]].values):
+            dst.set_band_description(i + 1,str(name))
+    array = data.data
+    if not isinstance(array,da.Array):
+        array = da.from_array(array,chunks=(1,WRITE_CHUNK,WRITE_CHUNK))
+    else:
+        array = array.rechunk((1,WRITE_CHUNK,WRITE_CHUNK)) # Windows aligned to the tiles of a band, no tile is written twice
+    da.store(array,WindowWriter(tmpPath),lock=lock if lock is not None else localLock)
+    if not cog:
+        return
+    resampling = Resampling.average if np.issubdtype(data.dtype,np.floating) else Resampling.nearest
+    with rasterio.open(tmpPath,'r+') as dst:
+        dst.build_overviews(overview_factors(profile['height'],profile['width']),resampling)
+        dst.update_tags(ns='rio_overview',resampling=resampling.name)
+    rasterio.shutil.copy(tmpPath,path,driver='GTiff',copy_src_overviews=True,tiled=True,blockxsize=TILE_SIZE,blockysize=TILE_SIZE,compress=COMPRESSION,interleave='band',BIGTIFF='IF_SAFER')
+    os.remove(tmpPath)
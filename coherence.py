@@ -0,0 +1,55 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# InSAR coherence of all the pairs of consecutive dates timedelta days apart, in one lazy expression. The first and
+# second images of all the pairs are selected with one isel each and every polarization is computed at once.
+
+import numpy as np
+import xarray as xr
+
+
+def coherence(src,timedelta=6,window=None):
+    """
+    Computes the normalized complex product of the pairs of consecutive dates which are timedelta days apart.
+
+    :param src: DataArray with variable, time, y and x dims, the variables being the i_ and q_ components of every
+                polarization (e.g. i_VV, q_VV)
+    :param int timedelta: days between the two dates of a pair
+    :param window: [y, x] pixels of the spatial averaging window of the products and powers, None for no averaging
+    :return: DataArray with the imaginary (i_) and real (q_) parts for every polarization, the pairs being labelled
+             with their first date
+    """
+    # Indexes of the consecutive dates which are timedelta days apart
+    timesteps = src['time'].values
+    first = np.nonzero((timesteps[1:] - timesteps[:-1]).astype('timedelta64[D]') == np.timedelta64(timedelta,'D'))[0]
+    if len(first) == 0:
+        raise Exception('[!] No pair of dates {} days apart found for the coherence.'.format(timedelta))
+    # Polarizations with both the i_ and q_ components, e.g. VV and VH
+    variables = [str(v) for v in src['variable'].values]
+    pols = [v[2:] for v in variables if v.startswith('i_') and 'q_' + v[2:] in variables]
+
+    i = src.loc[dict(variable=['i_' + p for p in pols])].assign_coords(variable=pols)
+    q = src.loc[dict(variable=['q_' + p for p in pols])].assign_coords(variable=pols)
+    i0 = i.isel(time=first)
+    q0 = q.isel(time=first)
+    i1 = i.isel(time=first + 1).assign_coords(time=i0.time)
+    q1 = q.isel(time=first + 1).assign_coords(time=i0.time)
+
+    realPart  = i0*i1 + q0*q1
+    imagPart  = i1*q0 - i0*q1
+    power0    = i0**2 + q0**2
+    power1    = i1**2 + q1**2
+    if window is not None:
+        average  = lambda x: x.rolling(y=window[0],x=window[1],center=True,min_periods=1).mean()
+        realPart = average(realPart)
+        imagPart = average(imagPart)
+        power0   = average(power0)
+        power1   = average(power1)
+    norm = np.sqrt(power0*power1)
+
+    # Same naming of the input bands: q_ for the real part, i_ for the imaginary part
+    q_coh = (realPart/norm).assign_coords(variable=['q_' + p for p in pols])
+    i_coh = (imagPart/norm).assign_coords(variable=['i_' + p for p in pols])
+    order = [c + p for p in pols for c in ['i_','q_']]
+    return xr.concat([i_coh,q_coh],dim='variable').loc[dict(variable=order)]
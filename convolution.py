@@ -0,0 +1,80 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Chunked 2D convolution for apply_kernel. Every spatial chunk is convolved with a halo of the neighbouring chunks as
+# wide as half the kernel (dask map_overlap), so the chunks of the data are kept. The borders of the image are padded
+# lazily following the openEO border mode. Separable kernels are applied as two 1D convolutions, large kernels with FFT.
+
+import numpy as np
+import dask.array as da
+import scipy.ndimage
+import scipy.signal
+import xarray as xr
+
+FFT_KERNEL_SIZE = 225   # Kernel elements from which the FFT convolution is faster
+SEPARABLE_TOL   = 1e-10 # Relative size of the second singular value under which a kernel is separable
+
+# scipy.ndimage border modes to the equivalent numpy.pad modes
+PAD_MODES = {'constant': 'constant', 'nearest': 'edge', 'reflect': 'symmetric', 'mirror': 'reflect', 'wrap': 'wrap'}
+
+
+def separate(kernel):
+    # Returns the column and row vectors whose outer product is the kernel, None if the kernel is not separable
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0 or np.any(s[1:] > SEPARABLE_TOL * s[0]):
+        return None
+    return u[:,0] * np.sqrt(s[0]), vt[0] * np.sqrt(s[0])
+
+def convolve_block(block,kernel,separable,fft):
+    # Convolution of a block (..., y, x), its borders are the halo and are trimmed afterwards
+    if separable is not None:
+        column, row = separable
+        block = scipy.ndimage.convolve1d(block,column,axis=-2,mode='nearest')
+        return scipy.ndimage.convolve1d(block,row,axis=-1,mode='nearest')
+    fullKernel = kernel.reshape((1,) * (block.ndim - 2) + kernel.shape)
+    if fft:
+        return scipy.signal.fftconvolve(block,fullKernel,mode='same',axes=(-2,-1)).astype(block.dtype)
+    return scipy.ndimage.convolve(block,fullKernel,mode='nearest')
+
+def convolve(data,kernel,mode='constant',cval=0):
+    """
+    Convolves the data with the kernel along y and x, lazily and chunk by chunk.
+
+    :param data: DataArray with y and x dimensions
+    :param kernel: 2D array (y, x) with odd sizes
+    :param str mode: scipy.ndimage border mode: constant, nearest, reflect, mirror or wrap
+    :param cval: value outside the image with the constant mode
+    """
+    kernel = np.asarray(kernel,dtype=np.float64)
+    if kernel.ndim != 2 or kernel.shape[0] % 2 == 0 or kernel.shape[1] % 2 == 0:
+        raise Exception('[!] The kernel must be a 2D array with odd sizes, got shape {}'.format(kernel.shape))
+    dims = data.dims
+    data = data.transpose(*[d for d in dims if d not in ['y','x']],'y','x')
+    if not np.issubdtype(data.dtype,np.floating):
+        data = data.astype(np.float32)
+    array = data.data if isinstance(data.data,da.Array) else da.from_array(data.data,chunks=data.shape)
+    depthY, depthX = kernel.shape[0] // 2, kernel.shape[1] // 2
+
+    # The padding is merged into the first and last chunks, so that no chunk is smaller than the halo
+    pad = [(0,0)] * (array.ndim - 2) + [(depthY,depthY),(depthX,depthX)]
+    padKwargs = {'constant_values': cval} if mode == 'constant' else {}
+    padded = da.pad(array,pad,mode=PAD_MODES[mode],**padKwargs)
+    chunks = list(array.chunks)
+    for axis, depth in [(-2,depthY),(-1,depthX)]:
+        axisChunks = list(chunks[axis])
+        axisChunks[0] += depth
+        axisChunks[-1] += depth
+        chunks[axis] = tuple(axisChunks)
+    padded = padded.rechunk(tuple(chunks))
+    for axis, depth in [(-2,depthY),(-1,depthX)]:
+        if min(padded.chunks[axis]) < depth:
+            padded = padded.rechunk({padded.ndim + axis: max(2 * depth,max(padded.chunks[axis]))})
+
+    separable = separate(kernel)
+    fft = separable is None and kernel.size >= FFT_KERNEL_SIZE
+    depth = {padded.ndim - 2: depthY, padded.ndim - 1: depthX}
+    convolved = padded.map_overlap(convolve_block,depth=depth,boundary='none',trim=True,dtype=array.dtype,
+                                   kernel=kernel,separable=separable,fft=fft)
+    convolved = convolved[...,depthY:convolved.shape[-2] - depthY,depthX:convolved.shape[-1] - depthX]
+    return xr.DataArray(convolved,dims=data.dims,coords=data.coords,attrs=data.attrs).transpose(*dims)
@@ -0,0 +1,149 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Batched least squares for fit_curve: all the pixels of a chunk are fitted together with numpy, instead of calling
+# scipy.optimize.curve_fit pixel by pixel. Models linear in their parameters (e.g. harmonic seasonal models
+# a0 + a1*cos(w*x) + a2*sin(w*x)) are solved with the normal equations, the others with Levenberg-Marquardt.
+# Observations equal to zero or nan are masked, as done by the previous implementation.
+
+import numpy as np
+from function_compiler import UNARY_FUNCTIONS
+
+MAX_ITERATIONS = 100  # Levenberg-Marquardt iterations for the non-linear models
+TOLERANCE      = 1e-8 # Relative change of the parameters at which the iterations stop
+
+
+def parameter_degree(nodeId,nodes):
+    """
+    Returns the degree in the parameters of the child graph of fit_curve, up to the given node.
+
+    The degree is 0 for expressions not depending on the parameters, 1 for linear ones and inf for the other ones.
+    :param str nodeId: id of the node of the child graph
+    :param dict nodes: all the nodes of the graph, by id
+    """
+    node = nodes[nodeId]
+
+    def argument_degree(argument):
+        value = node.arguments.get(argument)
+        if isinstance(value,dict) and 'from_node' in value:
+            return parameter_degree(value['from_node'],nodes)
+        return 0 # Numbers and the x parameter
+
+    if node.process_id == 'array_element':
+        data = node.arguments.get('data')
+        return 1 if isinstance(data,dict) and data.get('from_parameter') != 'x' else 0
+    if node.process_id in ['add','subtract']:
+        return max(argument_degree('x'),argument_degree('y'))
+    if node.process_id == 'multiply':
+        return argument_degree('x') + argument_degree('y')
+    if node.process_id == 'divide':
+        return argument_degree('x') if argument_degree('y') == 0 else np.inf
+    if node.process_id == 'pi':
+        return 0
+    if node.process_id == 'power':
+        p = node.arguments.get('p')
+        if argument_degree('base') == 0 and argument_degree('p') == 0:
+            return 0
+        if isinstance(p,(int,float)) and not isinstance(p,bool) and float(p).is_integer() and p >= 0:
+            return 0 if p == 0 else argument_degree('base') * int(p)
+        return np.inf
+    if node.process_id in UNARY_FUNCTIONS:
+        # Linear only if no argument depends on the parameters
+        degrees = [parameter_degree(v['from_node'],nodes) for v in node.arguments.values() if isinstance(v,dict) and 'from_node' in v]
+        return 0 if all([d == 0 for d in degrees]) else np.inf
+    return np.inf # Unknown processes are fitted as non-linear
+
+def is_linear(nodeId,nodes):
+    return parameter_degree(nodeId,nodes) <= 1
+
+def design_matrix(function,x,nParams):
+    """
+    Returns the matrix B and the offset c such that function(x,*p) = c + B p, for a model linear in the parameters.
+
+    :param function: callable function(x,a0,a1,...) of the model
+    :param x: 1D array of the values of the independent variable
+    """
+    zeros = [0.0] * nParams
+    offset = np.broadcast_to(np.asarray(function(x,*zeros),dtype=np.float64),x.shape)
+    columns = []
+    for i in range(nParams):
+        unit = list(zeros)
+        unit[i] = 1.0
+        columns.append(np.broadcast_to(np.asarray(function(x,*unit),dtype=np.float64),x.shape) - offset)
+    return np.stack(columns,axis=-1), offset
+
+def valid_observations(y):
+    return np.isfinite(y) & (y != 0)
+
+def fit_linear(y,B,c):
+    """
+    Solves the weighted normal equations of all the pixels together.
+
+    :param y: array (..., T) of the observations
+    :param B: (T, P) design matrix from design_matrix
+    :param c: (T,) offset from design_matrix
+    :return: array (..., P) of the parameters, nan where there are less valid observations than parameters
+    """
+    shape = y.shape[:-1]
+    y = y.reshape((-1,y.shape[-1])).astype(np.float64)
+    valid = valid_observations(y)
+    scale = np.sqrt((B**2).sum(axis=0)) # Columns scaled to unit norm, to improve the conditioning
+    scale[scale == 0] = 1
+    Bs = B / scale
+    target = np.where(valid,y - c,0)
+    G = np.einsum('nt,tp,tq->npq',valid.astype(np.float64),Bs,Bs)
+    r = np.einsum('nt,tp->np',target,Bs)
+    p = np.einsum('npq,nq->np',np.linalg.pinv(G),r) / scale
+    p[valid.sum(axis=-1) < B.shape[1]] = np.nan
+    return p.reshape(shape + (B.shape[1],)).astype(np.float32)
+
+def fit_nonlinear(y,function,x,nParams,iterations=MAX_ITERATIONS):
+    """
+    Levenberg-Marquardt with numerical Jacobian, iterating on all the pixels together.
+
+    :param y: array (..., T) of the observations
+    :param function: callable function(x,a0,a1,...) of the model, accepting arrays of parameters
+    :param x: (T,) values of the independent variable
+    :return: array (..., P) of the parameters, nan where there are less valid observations than parameters
+    """
+    shape = y.shape[:-1]
+    y = y.reshape((-1,y.shape[-1])).astype(np.float64)
+    valid = valid_observations(y)
+    weights = valid.astype(np.float64)
+    y = np.where(valid,y,0)
+    p = np.ones((len(y),nParams)) # Same initial guess of scipy.optimize.curve_fit
+    damping = np.full(len(y),1e-3)
+    identity = np.eye(nParams)
+
+    def model(p):
+        return np.broadcast_to(function(x[None,:],*[p[:,i:i+1] for i in range(nParams)]),y.shape)
+
+    def residuals(p):
+        r = weights * (y - model(p))
+        return r, (r**2).sum(axis=-1)
+
+    r, cost = residuals(p)
+    for iteration in range(iterations):
+        f0 = model(p)
+        J = np.empty(y.shape + (nParams,))
+        for i in range(nParams):
+            h = 1e-6 * np.maximum(np.abs(p[:,i]),1)
+            shifted = p.copy()
+            shifted[:,i] += h
+            J[...,i] = (model(shifted) - f0) / h[:,None]
+        J *= weights[...,None]
+        JtJ = np.einsum('ntp,ntq->npq',J,J)
+        Jtr = np.einsum('ntp,nt->np',J,r)
+        diagonal = np.einsum('npp->np',JtJ) + 1e-12
+        step = np.einsum('npq,nq->np',np.linalg.pinv(JtJ + (damping[:,None] * diagonal)[:,:,None] * identity),Jtr)
+        newR, newCost = residuals(p + step)
+        better = newCost < cost
+        p[better] = p[better] + step[better]
+        r[better] = newR[better]
+        cost[better] = newCost[better]
+        damping = np.where(better,damping / 10,damping * 10)
+        if np.all(np.abs(step) <= TOLERANCE * (np.abs(p) + TOLERANCE)):
+            break
+    p[valid.sum(axis=-1) < nParams] = np.nan
+    return p.reshape(shape + (nParams,)).astype(np.float32)
@@ -0,0 +1,97 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Pool of long-lived Datacube objects shared by the requests served by a process.
+# Creating a Datacube opens a connection to the ODC index and loads the product metadata, so the objects are reused.
+# The pool size bounds the connections opened by every process: with 3 gunicorn workers and a pool of 2 Datacube
+# objects each, PostgreSQL sees at most 6 connections from the back-end.
+
+import uuid
+import threading
+from time import time
+from contextlib import contextmanager
+import datacube
+
+POOL_SIZE            = 2  # Datacube objects per process
+HEALTHCHECK_INTERVAL = 60 # Seconds, a Datacube idle for longer is checked before being reused
+ACQUIRE_TIMEOUT      = 60 # Seconds waited for a Datacube, well below the gunicorn timeout
+
+pools     = {} # ODC config file -> DatacubePool
+poolsLock = threading.Lock()
+
+
+class DatacubePool():
+    def __init__(self,config,size=POOL_SIZE):
+        self.config    = config
+        self.size      = size
+        self.idle      = [] # (Datacube, time of release)
+        self.created   = 0
+        self.condition = threading.Condition()
+
+    def acquire(self,timeout=ACQUIRE_TIMEOUT):
+        dc = None
+        deadline = time() + timeout
+        with self.condition:
+            while True:
+                if len(self.idle) > 0:
+                    dc, releaseTime = self.idle.pop()
+                    break
+                if self.created < self.size:
+                    self.created += 1
+                    break
+                remaining = deadline - time()
+                if remaining <= 0:
+                    raise Exception('[!] Back-end busy: no connection to the ODC index became available within {} seconds, please retry later.'.format(timeout))
+                self.condition.wait(remaining) # All the Datacube objects are in use, wait for one to be released
+        if dc is not None and time() - releaseTime > HEALTHCHECK_INTERVAL and not self.healthy(dc):
+            print('[!] Datacube connection not healthy, reconnecting')
+            try:
+                dc.close()
+            except:
+                pass
+            dc = None
+        if dc is None:
+            try:
+                dc = datacube.Datacube(config=self.config,app='openeo_odc_driver')
+            except:
+                with self.condition:
+                    self.created -= 1
+                    self.condition.notify()
+                raise
+        return dc
+
+    def release(self,dc):
+        with self.condition:
+            self.idle.append((dc,time()))
+            self.condition.notify()
+
+    def healthy(self,dc):
+        try:
+            dc.index.datasets.has(str(uuid.uuid4())) # Primary key lookup, a cheap round trip to the database
+            return True
+        except Exception as e:
+            print(e)
+            return False
+
+def get_pool(config):
+    with poolsLock:
+        if config not in pools:
+            pools[config] = DatacubePool(config)
+        return pools[config]
+
+@contextmanager
+def datacube_connection(config):
+    """
+    Context manager lending a Datacube object of the pool.
+
+    The connection is shared with the other requests of the process: it has to be used only to query the index, the
+    data is loaded lazily and read after leaving the context.
+    :param str config: path of the ODC config file
+    """
+    pool = get_pool(config)
+    dc = pool.acquire()
+    try:
+        yield dc
+    finally:
+        pool.release(dc)
@@ -0,0 +1,88 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Compiler of the child graphs of fit_curve and predict_curve into vectorized NumPy functions f(x,a0,a1,...).
+# The child graph is translated into a NumPy expression, which is compiled in its own namespace: concurrent requests
+# never share or overwrite each other's functions. The compiled functions are cached by the hash of their source.
+
+import hashlib
+import threading
+import numpy as np
+from openEO_error_messages import *
+
+BINARY_OPERATORS = {'add': '+', 'subtract': '-', 'multiply': '*', 'divide': '/'}
+UNARY_FUNCTIONS  = {'sin': 'np.sin', 'cos': 'np.cos', 'tan': 'np.tan', 'exp': 'np.exp', 'sqrt': 'np.sqrt', 'absolute': 'np.abs', 'ln': 'np.log'}
+CACHE_ENTRIES    = 1024
+
+compiled     = {} # hash of the source -> function
+compiledLock = threading.Lock()
+
+
+def expression(nodeId,nodes,memo=None):
+    """
+    Translates the child graph, up to the given node, into a NumPy expression of x and of the parameters a0, a1, ...
+
+    :param str nodeId: id of the node of the child graph
+    :param dict nodes: all the nodes of the graph, by id
+    """
+    if memo is None:
+        memo = {}
+    if nodeId in memo:
+        return memo[nodeId]
+    node = nodes[nodeId]
+    processName = node.process_id
+
+    def operand(argument):
+        value = node.arguments.get(argument)
+        if isinstance(value,(int,float)) and not isinstance(value,bool):
+            return repr(float(value))
+        if isinstance(value,dict):
+            if 'from_node' in value:
+                return expression(value['from_node'],nodes,memo)
+            if 'from_parameter' in value:
+                return 'x'
+        raise Exception(ArgumentMissing.format(argument,processName))
+
+    if processName == 'pi':
+        result = 'np.pi'
+    elif processName == 'array_element':
+        result = 'a' + str(int(node.arguments['index']))
+    elif processName in BINARY_OPERATORS:
+        if processName == 'multiply' and (node.arguments.get('x') is None or node.arguments.get('y') is None):
+            raise Exception(MultiplicandMissing)
+        y = operand('y')
+        if processName == 'divide' and y == '0.0':
+            raise Exception(DivisionByZero)
+        result = '(' + operand('x') + BINARY_OPERATORS[processName] + y + ')'
+    elif processName == 'power':
+        result = '(' + operand('base') + '**' + operand('p') + ')'
+    elif processName in UNARY_FUNCTIONS:
+        result = UNARY_FUNCTIONS[processName] + '(' + operand('x') + ')'
+    else:
+        raise Exception(ProcessUnsupported.format(processName))
+    memo[nodeId] = result
+    return result
+
+def compile_function(nodeId,nodes,nParams,name='fitting_function'):
+    """
+    Returns the function f(x,a0,...,a<nParams-1>) computing the child graph whose result is the given node.
+
+    :param str nodeId: id of the result node of the child graph
+    :param dict nodes: all the nodes of the graph, by id
+    :param int nParams: number of parameters of the function
+    """
+    source = 'def {}(x{}):\n    return {}\n'.format(name,''.join([',a' + str(i) for i in range(nParams)]),expression(nodeId,nodes))
+    key = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    with compiledLock:
+        if key in compiled:
+            return compiled[key]
+    print(source)
+    namespace = {'np': np} # Functions defined outside of the module globals can also be sent to the Dask workers
+    exec(compile(source,'<' + name + '>','exec'),namespace)
+    function = namespace[name]
+    with compiledLock:
+        if len(compiled) >= CACHE_ENTRIES:
+            compiled.clear()
+        compiled[key] = function
+    return function
@@ -0,0 +1,174 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Geocoding of data in radar geometry by linear interpolation on the Delaunay triangulation of its geolocation grid.
+# The interpolation is a sparse matrix W (regular grid pixels x radar pixels) with the barycentric weights of the
+# 3 vertices of the triangle containing every output pixel. W depends only on the geolocation grid and on the output
+# grid, it is computed once and stored in a folder; geocoding a band of a date is then a sparse matrix product.
+
+import os
+import uuid
+import hashlib
+import json
+import threading
+import numpy as np
+import dask
+import dask.array as da
+from scipy.spatial import Delaunay
+from scipy import sparse
+
+SIMPLEX_BLOCK = 5000000 # Output pixels located in the triangulation at once, bounds the memory used
+TILE_SIZE     = 2048    # Pixels, side of the tiles of the regular grid geocoded by every Dask task
+
+weightsLocks = {} # key -> lock, the same weights are computed only once, different ones at the same time
+locksLock    = threading.Lock()
+
+
+def weights_key(product,crs,resolution,gridLon,gridLat):
+    """
+    Identifies the geocoding weights: the product, the output grid and the window of the geolocation grid.
+
+    :param gridLon: 2D numpy array of the longitudes of the radar pixels
+    :param gridLat: 2D numpy array of the latitudes of the radar pixels
+    """
+    extent = [round(float(np.nanmin(gridLon)),6),round(float(np.nanmax(gridLon)),6),round(float(np.nanmin(gridLat)),6),round(float(np.nanmax(gridLat)),6)]
+    description = [product,str(crs),resolution,list(gridLon.shape),extent]
+    return hashlib.sha1(json.dumps(description,sort_keys=True,default=str).encode('utf-8')).hexdigest()
+
+def barycentric_weights(points,targets):
+    """
+    Computes the sparse matrix of the linear interpolation from the irregular points to the targets.
+
+    :param points: (n,2) array of the coordinates of the irregular points
+    :param targets: (m,2) array of the coordinates of the regular grid
+    :return: (m,n) CSR matrix, the rows of the targets outside the triangulation are empty
+    """
+    triangulation = Delaunay(points)
+    rows = []
+    cols = []
+    values = []
+    for start in range(0,len(targets),SIMPLEX_BLOCK):
+        block = targets[start:start + SIMPLEX_BLOCK]
+        simplex = triangulation.find_simplex(block)
+        valid = np.nonzero(simplex >= 0)[0]
+        transform = triangulation.transform[simplex[valid]]
+        bary = np.einsum('nij,nj->ni',transform[:,:2],block[valid] - transform[:,2])
+        weights = np.c_[bary,1 - bary.sum(axis=1)]
+        rows.append(np.repeat(valid + start,3))
+        cols.append(triangulation.simplices[simplex[valid]].ravel())
+        values.append(weights.ravel().astype(np.float32))
+    return sparse.csr_matrix((np.concatenate(values),(np.concatenate(rows),np.concatenate(cols))),shape=(len(targets),len(points)))
+
+def get_weights(key,folder,points,targets):
+    """
+    Returns the geocoding weights, reading them from the folder or computing and storing them there.
+
+    :param str key: from weights_key
+    :param points: callable returning the irregular points, called only if the weights have to be computed
+    :param targets: callable returning the coordinates of the regular grid
+    """
+    path = os.path.join(folder,key + '.npz')
+    with locksLock:
+        keyLock = weightsLocks.setdefault(key,threading.Lock())
+    with keyLock:
+        if os.path.exists(path):
+            try:
+                print('[*] Geocoding weights read from {}'.format(path))
+                return sparse.load_npz(path)
+            except Exception as e:
+                print('[!] Geocoding weights not readable: {}'.format(e))
+        weights = barycentric_weights(points(),targets())
+        try:
+            os.makedirs(folder,exist_ok=True)
+            tmpPath = path + '.' + str(os.getpid()) + '.tmp.npz'
+            sparse.save_npz(tmpPath,weights)
+            os.rename(tmpPath,path)
+        except Exception as e:
+            print('[!] Geocoding weights not written: {}'.format(e))
+        return weights
+
+def geocode_array(weights,data,shape):
+    """
+    Interpolates the data on the regular grid.
+
+    :param weights: CSR matrix from get_weights
+    :param data: array (..., rows, columns) in radar geometry
+    :param shape: (y, x) shape of the regular grid
+    :return: array (..., y, x), NaN outside of the radar image
+    """
+    leading = data.shape[:-2]
+    flat = data.reshape((-1,data.shape[-2] * data.shape[-1])).T
+    geocoded = np.asarray(weights.dot(flat),dtype=np.float32)
+    geocoded[weights.getnnz(axis=1) == 0] = np.nan
+    return geocoded.T.reshape(leading + tuple(shape))
+
+def tile_weights(weights,rows,cols,shape,radarShape):
+    """
+    Restricts the weights to a tile of the regular grid and to the window of the radar image it reads.
+
+    :param rows: slice of the rows of the tile in the regular grid
+    :param cols: slice of the columns of the tile in the regular grid
+    :param shape: (y, x) shape of the regular grid
+    :param radarShape: (rows, columns) of the radar image
+    :return: (CSR matrix of the tile, radar rows slice, radar columns slice), None if the tile is outside the radar image
+    """
+    y = np.arange(rows.start,rows.stop)
+    x = np.arange(cols.start,cols.stop)
+    tile = weights[(y[:,None] * shape[1] + x[None,:]).ravel()]
+    if tile.nnz == 0:
+        return None
+    radarRows = tile.indices // radarShape[1]
+    radarCols = tile.indices % radarShape[1]
+    r0, r1 = radarRows.min(), radarRows.max() + 1
+    c0, c1 = radarCols.min(), radarCols.max() + 1
+    # The columns are renumbered on the window: only the radar pixels used by the tile are read
+    indices = (radarRows - r0) * (c1 - c0) + (radarCols - c0)
+    tile = sparse.csr_matrix((tile.data,indices,tile.indptr),shape=(tile.shape[0],(r1 - r0) * (c1 - c0)))
+    return tile, slice(r0,r1), slice(c0,c1)
+
+def geocode_tiled(weights,data,shape,tileSize=TILE_SIZE):
+    """
+    Geocodes lazily a Dask array, every tile of the regular grid being a Dask task reading only its radar window.
+
+    :param weights: CSR matrix from get_weights
+    :param data: Dask array (..., rows, columns) in radar geometry
+    :param shape: (y, x) shape of the regular grid
+    :return: Dask array (..., y, x) chunked in tiles, with the chunks of data along the leading dimensions
+    """
+    leading = data.shape[:-2]
+    radarShape = data.shape[-2:]
+    flat = data.reshape((-1,) + radarShape)
+    # The tile matrices are the same for all the bands and dates: they are computed once and are a single node of the
+    # Dask graph, shared by the tasks geocoding the tile
+    tiles = {}
+    for y0 in range(0,shape[0],tileSize):
+        for x0 in range(0,shape[1],tileSize):
+            rows = slice(y0,min(y0 + tileSize,shape[0]))
+            cols = slice(x0,min(x0 + tileSize,shape[1]))
+            restricted = tile_weights(weights,rows,cols,shape,radarShape)
+            if restricted is not None:
+                tile, radarRows, radarCols = restricted
+                restricted = (dask.delayed(tile,name='geocoding-tile-' + uuid.uuid4().hex,traverse=False),radarRows,radarCols)
+            tiles[(y0,x0)] = (rows,cols,restricted)
+    layers = []
+    start = 0
+    for size in flat.chunks[0]: # The bands and dates are geocoded in the groups of the input chunks
+        layer = flat[start:start + size]
+        start += size
+        tileRows = []
+        for y0 in range(0,shape[0],tileSize):
+            row = []
+            for x0 in range(0,shape[1],tileSize):
+                rows, cols, restricted = tiles[(y0,x0)]
+                tileShape = (rows.stop - rows.start,cols.stop - cols.start)
+                if restricted is None:
+                    row.append(da.full((size,) + tileShape,np.nan,dtype=np.float32))
+                    continue
+                tile, radarRows, radarCols = restricted
+                window = layer[:,radarRows,radarCols]
+                task = dask.delayed(geocode_array)(tile,window,tileShape)
+                row.append(da.from_delayed(task,shape=(size,) + tileShape,dtype=np.float32))
+            tileRows.append(row)
+        layers.append(tileRows)
+    return da.block(layers).reshape(leading + tuple(shape))
@@ -0,0 +1,308 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Optimization passes over the process graph translated by openeo_pg_parser, applied before its execution.
+
+import json
+import hashlib
+import numpy as np
+
+NOT_MERGEABLE = ['save_result'] # Processes with side effects, never merged
+
+
+def node_references(value):
+    # Returns the ids of the nodes referenced with from_node in an argument value
+    references = []
+    if isinstance(value,dict):
+        if 'from_node' in value:
+            references.append(value['from_node'])
+        else:
+            for v in value.values():
+                references += node_references(v)
+    elif isinstance(value,list):
+        for v in value:
+            references += node_references(v)
+    return references
+
+def rewire(value,aliases):
+    # Replaces in place the from_node references to the aliased nodes
+    if isinstance(value,dict):
+        if 'from_node' in value and value['from_node'] in aliases:
+            value['from_node'] = aliases[value['from_node']]
+        else:
+            for v in value.values():
+                rewire(v,aliases)
+    elif isinstance(value,list):
+        for v in value:
+            rewire(v,aliases)
+
+def is_child_of(node,parent):
+    return node.parent_process is not None and node.parent_process.id == parent.id
+
+def graph_keys(graph):
+    """
+    Computes a canonical key for every node of the graph.
+
+    The key is a hash of the process id, of the arguments and of the keys of the nodes referenced by the arguments.
+    The nodes of a child graph also depend on the signature of their parent process, which provides their parameters.
+    Two nodes with the same key compute the same result.
+    :param graph: graph translated by openeo_pg_parser
+    :return: dict mapping the node ids to their keys
+    """
+    nodes = {node.id: node for node in graph}
+    keys = {}
+    signatures = {}
+
+    def digest(obj):
+        return hashlib.sha1(json.dumps(obj,sort_keys=True,default=str).encode('utf-8')).hexdigest()
+
+    def normalize(value,owner,children):
+        if isinstance(value,dict):
+            if 'from_node' in value:
+                referenced = nodes[value['from_node']]
+                if is_child_of(referenced,owner):
+                    return {'from_node': node_key(referenced) if children else 'child'}
+                return {'from_node': node_key(referenced)}
+            return {k: normalize(v,owner,children) for k, v in value.items()}
+        if isinstance(value,list):
+            return [normalize(v,owner,children) for v in value]
+        if isinstance(value,int) and not isinstance(value,bool):
+            return float(value) # 2 and 2.0 are the same argument
+        return value
+
+    def parent_signature(parent):
+        # The parent process without its child graphs: what the parameters of the child graph depend on
+        if parent is None:
+            return None
+        if parent.id not in signatures:
+            signatures[parent.id] = digest([parent.process_id,parent_signature(parent.parent_process),normalize(parent.arguments,parent,False)])
+        return signatures[parent.id]
+
+    def node_key(node):
+        if node.id not in keys:
+            if node.process_id in NOT_MERGEABLE:
+                keys[node.id] = digest([node.process_id,node.id])
+            else:
+                keys[node.id] = digest([node.process_id,parent_signature(node.parent_process),normalize(node.arguments,node,True)])
+        return keys[node.id]
+
+    for node in graph:
+        node_key(node)
+    return keys
+
+def eliminate_common_subexpressions(graph):
+    """
+    Merges the nodes of the graph computing the same result.
+
+    The first node, in execution order, of every group of identical nodes is kept and the from_node references to the
+    other ones are rewired to it.
+    :param graph: graph translated by openeo_pg_parser, sorted in execution order
+    :return: dict mapping the ids of the merged nodes to the id of the node computing their result
+    """
+    keys = graph_keys(graph)
+    # A load_collection with a resample_spatial on one of its filter chains gets the resampling in its query, which
+    # applies to all its consumers: it must keep its identity, not to resample the data of an identical load
+    resampled = [loadId for loadId, paths in pushdown_paths(graph).items() if any([f.process_id == 'resample_spatial' for path in paths for f in path])]
+    canonical = {}
+    aliases = {}
+    for node in graph:
+        key = keys[node.id]
+        if node.id in resampled:
+            continue
+        if key in canonical:
+            aliases[node.id] = canonical[key]
+        else:
+            canonical[key] = node.id
+    if len(aliases) > 0:
+        for node in graph:
+            rewire(node.arguments,aliases)
+            if node.parent_process is not None:
+                rewire(node.parent_process.arguments,aliases)
+    return aliases
+
+def node_sources(node,nodes):
+    """
+    Returns the ids of the nodes whose results are read when executing the node.
+
+    Besides the from_node references in its arguments, a node of a child graph reads the data passed by its parent
+    process through the from_parameter references.
+    :param node: node of the graph
+    :param dict nodes: all the nodes of the graph, by id
+    """
+    sources = node_references(node.arguments)
+    parent = node.parent_process
+    if parent is not None:
+        sources += [s for s in node_references(parent.arguments) if s in nodes and not is_child_of(nodes[s],parent)]
+    return list(set(sources))
+
+def consumer_counts(graph,skip=()):
+    # Returns the number of nodes reading the result of every node, ignoring the nodes in skip
+    nodes = {node.id: node for node in graph}
+    counts = {}
+    for node in graph:
+        if node.id in skip:
+            continue
+        for source in node_sources(node,nodes):
+            counts[source] = counts.get(source,0) + 1
+    return counts
+
+PUSHDOWN_PROCESSES = ['filter_bands','filter_temporal','filter_bbox','resample_spatial'] # Applied by the ODC query
+
+def next_day(date):
+    return str(np.datetime64(date.split('T')[0]) + np.timedelta64(1,'D'))
+
+def pushdown_paths(graph,skip=()):
+    """
+    Lists the chains of filters following every load_collection and load_result.
+
+    :param graph: graph translated by openeo_pg_parser
+    :param skip: ids of the nodes not to be executed (e.g. merged duplicates)
+    :return: dict mapping the load ids to a list of paths, one per process using the data, every path being the list
+             of the PUSHDOWN_PROCESSES nodes from the load to that process
+    """
+    nodes = {node.id: node for node in graph}
+    consumers = {}
+    for node in graph:
+        if node.id in skip:
+            continue
+        for source in node_sources(node,nodes):
+            consumers.setdefault(source,[]).append(node)
+
+    def paths_from(nodeId,chain):
+        # Lists of the filters from the node to every process using the data
+        if nodeId not in consumers:
+            return [chain]
+        paths = []
+        for consumer in consumers[nodeId]:
+            if consumer.process_id in PUSHDOWN_PROCESSES and consumer.parent_process is None and \
+               node_references(consumer.arguments) == [nodeId]:
+                paths += paths_from(consumer.id,chain + [consumer])
+            else:
+                paths.append(chain)
+        return paths
+
+    return {load.id: paths_from(load.id,[]) for load in graph if load.process_id in ['load_collection','load_result'] and load.id not in skip}
+
+def push_down_filters(graph,skip=()):
+    """
+    Finds the filters which can be applied directly by the ODC query of every load_collection, or when opening the
+    data of every load_result.
+
+    A band selection, temporal or spatial subset is pushed down only if every path from the load_collection to the
+    processes using its data goes through a filter of that kind: the query selects the union of what the paths use
+    and the filters in the graph are still applied to the loaded data. resample_spatial is pushed down if it is on
+    one of the paths, the load_collection handler then loads the data directly at the requested resolution.
+    :param graph: graph translated by openeo_pg_parser
+    :param skip: ids of the nodes not to be executed (e.g. merged duplicates)
+    :return: dict mapping the load_collection ids to the query parameters: bands, temporal_extent, spatial_extent
+             and resample (the arguments of the resample_spatial node)
+    """
+    nodes = {node.id: node for node in graph}
+    pushdown = {}
+    for loadId, paths in pushdown_paths(graph,skip).items():
+        load = nodes[loadId]
+        params = {}
+        filtered = lambda processId: all([any([f.process_id == processId for f in path]) for path in paths])
+
+        if filtered('filter_bands'):
+            bands = []
+            for path in paths:
+                for f in path:
+                    if f.process_id == 'filter_bands':
+                        bands += [b for b in f.arguments['bands'] if b not in bands]
+            loadBands = load.arguments.get('bands')
+            if loadBands:
+                bands = [b for b in loadBands if b in bands]
+            params['bands'] = bands
+
+        if filtered('filter_temporal'):
+            # The filter_temporal handler includes the end date, the load_collection query excludes it
+            intervals = []
+            for path in paths:
+                start, end = None, None
+                for f in path:
+                    if f.process_id == 'filter_temporal':
+                        fStart, fEnd = f.arguments['extent']
+                        if fStart is not None:
+                            fStart = fStart.split('T')[0]
+                            start = fStart if start is None else max(start,fStart)
+                        if fEnd is not None:
+                            fEnd = next_day(fEnd)
+                            end = fEnd if end is None else min(end,fEnd)
+                intervals.append((start,end))
+            if all([s is not None for s, e in intervals]) and all([e is not None for s, e in intervals]):
+                start = min([s for s, e in intervals])
+                end   = max([e for s, e in intervals])
+                loadExtent = load.arguments.get('temporal_extent')
+                if loadExtent is not None:
+                    if loadExtent[0] is not None:
+                        start = max(start,loadExtent[0].split('T')[0])
+                    if loadExtent[1] is not None:
+                        end = min(end,loadExtent[1].split('T')[0])
+                params['temporal_extent'] = [start,end]
+
+        loadExtent = load.arguments.get('spatial_extent')
+        if filtered('filter_bbox') and (loadExtent is None or 'west' in loadExtent):
+            boxes = []
+            for path in paths:
+                box = None
+                for f in path:
+                    if f.process_id == 'filter_bbox':
+                        extent = f.arguments['extent']
+                        if extent.get('crs') not in [None,4326,'EPSG:4326','epsg:4326']:
+                            box = None
+                            break
+                        fBox = [extent['west'],extent['south'],extent['east'],extent['north']]
+                        box = fBox if box is None else [max(box[0],fBox[0]),max(box[1],fBox[1]),min(box[2],fBox[2]),min(box[3],fBox[3])]
+                boxes.append(box)
+            if all([b is not None for b in boxes]):
+                box = [min([b[0] for b in boxes]),min([b[1] for b in boxes]),max([b[2] for b in boxes]),max([b[3] for b in boxes])]
+                if loadExtent is not None:
+                    box = [max(box[0],loadExtent['west']),max(box[1],loadExtent['south']),min(box[2],loadExtent['east']),min(box[3],loadExtent['north'])]
+                params['spatial_extent'] = {'west':box[0],'south':box[1],'east':box[2],'north':box[3]}
+
+        resamples = [f for path in paths for f in path if f.process_id == 'resample_spatial']
+        if len(resamples) > 0:
+            if not filtered('resample_spatial') or any([r.arguments != resamples[0].arguments for r in resamples]):
+                print('[!] The data of {} is used with different resolutions, only the one of {} is applied'.format(load.id,resamples[0].id))
+            params['resample'] = resamples[0].arguments
+
+        if len(params) > 0:
+            pushdown[load.id] = params
+    return pushdown
+
+PIXEL_PROCESSES = ['apply_kernel','aggregate_spatial_window','geocode','radar_mask','coherence'] # Results depending on the pixel size
+
+def needs_native_resolution(graph,skip=()):
+    """
+    Finds the loads whose data is used, directly or not, by a process working on windows of pixels.
+
+    The data of these loads can't be loaded at a coarser resolution for a preview, the result of such processes would
+    change with the pixel size.
+    :param graph: graph translated by openeo_pg_parser
+    :param skip: ids of the nodes not to be executed (e.g. merged duplicates)
+    :return: list of load_collection ids
+    """
+    nodes = {node.id: node for node in graph}
+    consumers = {}
+    for node in graph:
+        if node.id in skip:
+            continue
+        for source in node_sources(node,nodes):
+            consumers.setdefault(source,[]).append(node)
+    loads = []
+    for load in graph:
+        if load.process_id != 'load_collection' or load.id in skip:
+            continue
+        visited = set()
+        toVisit = [load.id]
+        while len(toVisit) > 0:
+            for consumer in consumers.get(toVisit.pop(),[]):
+                if consumer.id in visited:
+                    continue
+                visited.add(consumer.id)
+                toVisit.append(consumer.id)
+        if any([nodes[n].process_id in PIXEL_PROCESSES for n in visited]):
+            loads.append(load.id)
+    return loads
@@ -1,4 +1,19 @@
+import os
+import sys
+import subprocess
+
 bind     = "0.0.0.0:5000"
 workers  = 3
 threads  = 2
-timeout  = 240
\ No newline at end of file
+timeout  = 240
+
+jobRunner = None
+
+def on_starting(server):
+    # The batch jobs are executed by a single process, separate from the workers and not bound by their timeout
+    global jobRunner
+    jobRunner = subprocess.Popen([sys.executable,os.path.join(os.path.dirname(os.path.abspath(__file__)),'jobs.py')])
+
+def on_exit(server):
+    if jobRunner is not None:
+        jobRunner.terminate()
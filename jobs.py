@@ -0,0 +1,208 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Batch jobs: the process graphs are executed in background by the job runner, a process separate from the gunicorn
+# workers, started once with the web server (see gunicorn.conf.py) or with: python jobs.py
+# Every job has its workspace in TMP_FOLDER_PATH + job id, the same folder used by OpenEO to store its results.
+# The status of the job is stored in the workspace (status.json), so that it can be read by any gunicorn worker.
+# The web workers only queue the jobs: an empty file named after the job id is created in QUEUE_FOLDER/queued and
+# moved to QUEUE_FOLDER/running by the runner executing it. Only one runner is started for a TMP_FOLDER_PATH.
+
+import os
+import json
+import uuid
+import threading
+import traceback
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from openeo_odc_driver import OpenEO, TMP_FOLDER_PATH
+
+JOBS_WORKERS  = 2 # Process graphs executed at the same time by the job runner
+POLL_INTERVAL = 1 # Seconds between two checks of the queue by the job runner
+QUEUE_FOLDER  = TMP_FOLDER_PATH + 'JOBS_QUEUE/'
+
+QUEUED   = 'queued'
+RUNNING  = 'running'
+FINISHED = 'finished'
+ERROR    = 'error'
+
+statusLock = threading.Lock()
+
+
+def workspace(jobId):
+    return TMP_FOLDER_PATH + jobId
+
+def status_path(jobId):
+    return os.path.join(workspace(jobId),'status.json')
+
+def graph_path(jobId):
+    return os.path.join(workspace(jobId),'process_graph.json')
+
+def queue_entry(state,jobId):
+    return os.path.join(QUEUE_FOLDER,state,jobId)
+
+def valid_job_id(jobId):
+    try:
+        return str(uuid.UUID(jobId)) == jobId # Job ids are used in paths, only the ones we generated are accepted
+    except ValueError:
+        return False
+
+def write_status(jobId,**fields):
+    with statusLock:
+        status = read_status(jobId) or {'id': jobId, 'created': str(datetime.utcnow())}
+        status.update(fields)
+        status['updated'] = str(datetime.utcnow())
+        tmpPath = status_path(jobId) + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpPath,'w') as f:
+            json.dump(status,f)
+        os.rename(tmpPath,status_path(jobId)) # Readers never see a partially written file
+    return status
+
+def read_status(jobId):
+    if not valid_job_id(jobId):
+        return None
+    try:
+        with open(status_path(jobId)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+def submit_job(jsonGraph,streaming=False):
+    """
+    Queues the execution of a process graph, which is started by the job runner.
+
+    :param dict jsonGraph: openEO process graph, as received by the /graph endpoint
+    :param bool streaming: if True the result is written in parts, see OpenEO.write_parts
+    :return: the status of the new job, with its id
+    """
+    jobId = str(uuid.uuid4())
+    jsonGraph = dict(jsonGraph)
+    jsonGraph['id'] = jobId # OpenEO stores the results in the workspace of the job
+    os.makedirs(workspace(jobId))
+    with open(graph_path(jobId),'w') as f:
+        json.dump(jsonGraph,f)
+    status = write_status(jobId,status=QUEUED,streaming=streaming)
+    os.makedirs(os.path.join(QUEUE_FOLDER,QUEUED),exist_ok=True)
+    open(queue_entry(QUEUED,jobId),'w').close() # Written last, the runner finds only complete jobs
+    return status
+
+def run_job(jobId):
+    write_status(jobId,status=RUNNING,pid=os.getpid())
+    try:
+        with open(graph_path(jobId)) as f:
+            jsonGraph = json.load(f)
+        eo = OpenEO(jsonGraph,streaming=read_status(jobId).get('streaming',False))
+        if os.path.exists(os.path.join(workspace(jobId),'parts','done')): # The result has been written in parts
+            write_status(jobId,status=FINISHED,output=os.path.join('parts','manifest.json'),mimeType='application/json')
+        else:
+            write_status(jobId,status=FINISHED,output='output' + eo.outFormat,mimeType=eo.mimeType)
+    except Exception as e:
+        traceback.print_exc()
+        write_status(jobId,status=ERROR,error=str(e))
+    finally:
+        os.remove(queue_entry(RUNNING,jobId))
+
+def claim_jobs(n):
+    # Moves the n oldest queued jobs to the running ones and returns their ids
+    queued = os.path.join(QUEUE_FOLDER,QUEUED)
+    entries = []
+    for name in os.listdir(queued):
+        try:
+            entries.append((os.path.getmtime(os.path.join(queued,name)),name))
+        except OSError:
+            pass
+    claimed = []
+    for submitTime, jobId in sorted(entries)[:n]:
+        try:
+            os.rename(queue_entry(QUEUED,jobId),queue_entry(RUNNING,jobId))
+        except OSError:
+            continue
+        claimed.append(jobId)
+    return claimed
+
+def fail_interrupted_jobs():
+    # The jobs left running by a previous runner, which stopped before completing them, are set to error
+    for jobId in os.listdir(os.path.join(QUEUE_FOLDER,RUNNING)):
+        print('[!] Job {} interrupted by the stop of the job runner'.format(jobId))
+        if valid_job_id(jobId):
+            write_status(jobId,status=ERROR,error='The back-end stopped while executing the job, please submit the job again.')
+        os.remove(queue_entry(RUNNING,jobId))
+
+def run_jobs(workers=JOBS_WORKERS):
+    """
+    Job runner: executes the queued jobs, at most workers at the same time, until the process is stopped.
+    """
+    for state in [QUEUED,RUNNING]:
+        os.makedirs(os.path.join(QUEUE_FOLDER,state),exist_ok=True)
+    fail_interrupted_jobs()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    running = []
+    while True:
+        running = [f for f in running if not f.done()]
+        for jobId in claim_jobs(workers - len(running)):
+            print('[*] Starting job {}'.format(jobId))
+            running.append(executor.submit(run_job,jobId))
+        time.sleep(POLL_INTERVAL)
+
+def job_result(jobId):
+    # Returns the path of the result of a finished job, None otherwise
+    status = read_status(jobId)
+    if status is None or status['status'] != FINISHED:
+        return None
+    return os.path.join(workspace(jobId),status['output'])
+
+def job_part(jobId,name):
+    # Returns the path of a part of the result of a job written in parts, None if it is not (yet) listed in its manifest
+    partsFolder = os.path.join(workspace(jobId),'parts')
+    try:
+        with open(os.path.join(partsFolder,'manifest.json')) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if name not in manifest['parts']: # Only the names we wrote are used in the path
+        return None
+    return os.path.join(partsFolder,name)
+
+def stream_parts(jobId,blockSize=1024**2,pollInterval=1):
+    """
+    Generator of the parts of the result of a job, yielded as soon as they are written.
+
+    Yields tuples (part name, mime type, generator of the bytes of the part). Results written in a single file
+    (e.g. PNG) are yielded as one part when the job is finished.
+    :param str jobId: id of a job submitted with streaming=True
+    """
+    partsFolder = os.path.join(workspace(jobId),'parts')
+    sent = 0
+    while True:
+        done = os.path.exists(os.path.join(partsFolder,'done')) # Checked before the manifest, which is then complete
+        try:
+            with open(os.path.join(partsFolder,'manifest.json')) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            manifest = {'parts': []}
+        for name in manifest['parts'][sent:]:
+            yield name, manifest['mimeType'], read_blocks(os.path.join(partsFolder,name),blockSize)
+            sent += 1
+        if done:
+            return
+        status = read_status(jobId)
+        if status['status'] == ERROR:
+            raise Exception(status['error'])
+        if status['status'] == FINISHED and not os.path.exists(partsFolder):
+            yield status['output'], status['mimeType'], read_blocks(job_result(jobId),blockSize)
+            return
+        time.sleep(pollInterval)
+
+def read_blocks(path,blockSize):
+    with open(path,'rb') as f:
+        while True:
+            block = f.read(blockSize)
+            if not block:
+                return
+            yield block
+
+
+if __name__ == '__main__':
+    run_jobs()
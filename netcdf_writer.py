@@ -0,0 +1,62 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# NetCDF writer: a single pass over the data, compressed and chunked like the Dask chunks of the computation.
+# The attributes are made valid for NetCDF before writing, instead of retrying the write when it fails.
+
+import numpy as np
+import xarray as xr
+
+COMPRESSION_LEVEL = 4
+
+
+def netcdf_attrs(attrs):
+    # NetCDF attributes can only be strings, numbers or 1D arrays of numbers
+    clean = {}
+    for k, v in attrs.items():
+        if v is None:
+            continue
+        if isinstance(v,(bool,np.bool_)):
+            v = int(v)
+        elif isinstance(v,(list,tuple,np.ndarray)):
+            array = np.asarray(v)
+            if array.ndim == 1 and np.issubdtype(array.dtype,np.number):
+                v = array
+            else:
+                v = str(v)
+        elif not isinstance(v,(str,int,float,np.number)):
+            v = str(v)
+        clean[k] = v
+    return clean
+
+def sanitize(data):
+    data = data.copy()
+    for name in [n for n, v in data.data_vars.items() if v.dtype == bool]: # NetCDF has no boolean type
+        data[name] = data[name].astype(np.uint8)
+    data.attrs = netcdf_attrs(data.attrs)
+    for variable in data.variables.values():
+        variable.attrs = netcdf_attrs(variable.attrs)
+        if np.issubdtype(variable.dtype,np.datetime64):
+            # units and calendar of the dates are set by xarray when encoding them, they can't be attributes too
+            variable.attrs.pop('units',None)
+            variable.attrs.pop('calendar',None)
+        variable.encoding = {}
+    return data
+
+def write_netcdf(data,path):
+    """
+    Writes a Dataset or DataArray to NetCDF, compressed and chunked like its Dask chunks.
+
+    :param data: xarray Dataset or DataArray
+    :param str path: output file
+    """
+    if isinstance(data,xr.DataArray):
+        data = data.to_dataset(name=data.name if data.name is not None else 'result')
+    data = sanitize(data)
+    encoding = {}
+    for name, variable in data.data_vars.items():
+        encoding[name] = {'zlib': True, 'complevel': COMPRESSION_LEVEL, 'shuffle': True}
+        if variable.chunks is not None and len(variable.dims) > 0:
+            encoding[name]['chunksizes'] = tuple([c[0] for c in variable.chunks])
+    data.to_netcdf(path,encoding=encoding)
@@ -8,11 +8,15 @@ from openeo_odc_driver import OpenEO
 import argparse
 import os
 import sys
-from flask import Flask, request, jsonify, send_file
+import uuid
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
+from jobs import submit_job, read_status, job_result, job_part, stream_parts, FINISHED
 import json
 import requests
 import yaml
 import datacube
+from datacube_pool import datacube_connection
+from odc_wrapper import index_changed
 
 DATACUBE_EXPLORER_ENDPOINT = "http://0.0.0.0:9000"
 OPENDATACUBE_CONFIG_FILE = ""
@@ -22,8 +26,8 @@ METADATA_FOLDER = "./DATACUBES/METADATA/"
 ODC_COLLECTIONS_FILE = METADATA_FOLDER + "/CACHE/" + "ODC_collections.json"
 
 def sar2cube_collection_extent(collectionName):
-    dc = datacube.Datacube(config = OPENDATACUBE_CONFIG_FILE)
-    sar2cubeData = dc.load(product = collectionName, dask_chunks={'time':1,'x':2000,'y':2000})
+    with datacube_connection(OPENDATACUBE_CONFIG_FILE) as dc:
+        sar2cubeData = dc.load(product = collectionName, dask_chunks={'time':1,'x':2000,'y':2000})
     zero_lon_mask = sar2cubeData.grid_lon[0]>0
     zero_lat_mask = sar2cubeData.grid_lat[0]>0
     min_lon = sar2cubeData.grid_lon[0].where(zero_lon_mask).min().values.item(0)
@@ -43,10 +47,79 @@ def process_graph():
     jsonGraph = request.json
     try:
         eo = OpenEO(jsonGraph)
-        return send_file(eo.tmpFolderPath + "/output"+eo.outFormat, as_attachment=True, attachment_filename='output'+eo.outFormat)
+        return send_file(eo.tmpFolderPath + "/output"+eo.outFormat, as_attachment=True, attachment_filename='output'+eo.outFormat, conditional=True) # conditional enables HTTP range requests
     except Exception as e:
         return error500("ODC back-end failed processing! \n" + str(e))
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    # The process graph is executed in background, the client polls the status of the job
+    jsonGraph = request.json
+    try:
+        status = submit_job(jsonGraph)
+    except Exception as e:
+        return error500("ODC back-end failed creating the job! \n" + str(e))
+    response = jsonify(status)
+    response.status_code = 201
+    response.headers['Location'] = '/jobs/' + status['id']
+    return response
+
+@app.route('/jobs/<string:jobId>', methods=['GET'])
+def get_job(jobId):
+    status = read_status(jobId)
+    if status is None:
+        return jsonify({'message': 'Job {} not found'.format(jobId)}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<string:jobId>/results', methods=['GET'])
+def get_job_results(jobId):
+    status = read_status(jobId)
+    if status is None:
+        return jsonify({'message': 'Job {} not found'.format(jobId)}), 404
+    if status['status'] != FINISHED:
+        return jsonify(status), 409
+    return send_file(job_result(jobId), mimetype=status['mimeType'], as_attachment=True, attachment_filename=status['output'], conditional=True)
+
+@app.route('/jobs/<string:jobId>/results/<string:name>', methods=['GET'])
+def get_job_result_part(jobId,name):
+    # Parts of a result written in parts, listed in the manifest returned by /jobs/<id>/results
+    status = read_status(jobId)
+    if status is None:
+        return jsonify({'message': 'Job {} not found'.format(jobId)}), 404
+    path = job_part(jobId,name)
+    if path is None:
+        return jsonify({'message': 'Part {} of job {} not found'.format(name,jobId)}), 404
+    return send_file(path, as_attachment=True, attachment_filename=name, conditional=True)
+
+@app.route('/graph/stream', methods=['POST'])
+def process_graph_stream():
+    # The result is sent as a multipart response, every part (a date or a strip of rows) as soon as it is computed
+    jsonGraph = request.json
+    try:
+        status = submit_job(jsonGraph,streaming=True)
+    except Exception as e:
+        return error500("ODC back-end failed processing! \n" + str(e))
+    boundary = uuid.uuid4().hex
+    def generate():
+        try:
+            for name, mimeType, blocks in stream_parts(status['id']):
+                yield '--{}\r\nContent-Type: {}\r\nContent-Disposition: attachment; filename="{}"\r\n\r\n'.format(boundary,mimeType,name).encode()
+                for block in blocks:
+                    yield block
+                yield b'\r\n'
+        except Exception as e:
+            yield '--{}\r\nContent-Type: text/plain\r\nContent-Disposition: inline; filename="error"\r\n\r\nODC back-end failed processing! \n{}\r\n'.format(boundary,e).encode()
+        yield '--{}--\r\n'.format(boundary).encode()
+    response = Response(stream_with_context(generate()), mimetype='multipart/mixed; boundary=' + boundary)
+    response.headers['X-Job-Id'] = status['id'] # The parts remain available through /jobs/<id>/results/<part>
+    return response
+
+@app.route('/index/changed', methods=['POST'])
+def notify_index_changed():
+    # To be called after indexing new datasets or products: the cached dataset searches and product grids are dropped
+    index_changed()
+    return '', 204
+
 @app.route('/collections', methods=['GET'])
 def list_collections():
     if USE_CACHED_COLLECTIONS:
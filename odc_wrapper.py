@@ -2,27 +2,68 @@
 # Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
 # Date:   10/05/2021
 
-import datacube
+import os
 import numpy as np
-import copy
-from datetime import datetime
+import json
+import threading
+from time import time
+from collections import Counter
 import shapely
 from shapely.geometry import shape
 #libraries for polygon and polygon mask
 import fiona
 import shapely.geometry
 import rasterio
+import rasterio.features
+from affine import Affine
+import dask.array as da
+import xarray as xr
 from datacube.utils import geometry
 from datacube.utils.geometry import Geometry, CRS
-import dea_tools.datahandling  # or some other submodule
+from datacube_pool import datacube_connection
+from sar2cube_index import get_index
+from chunk_planner import chunk_shape, SPATIAL
 
 OPENDATACUBE_CONFIG_FILE = ""
+INDEX_CHANGED_FILE       = "./DATACUBES/METADATA/CACHE/index_changed" # Touched when the ODC index changes, see index_changed
+DATASETS_CACHE_TTL       = 300 # Seconds, datasets indexed in the meantime are found only after this time
+DATASETS_CACHE_ENTRIES   = 256
+DEFAULT_RESOLUTION       = [10,10] # Used for the products without a default grid
+
+# Caches shared by the requests served by this process
+datasetsCache   = {} # query -> (search time, datasets found)
+productDefaults = {} # product -> (crs, resolution) of its default grid, None if it has none
+cacheLock       = threading.Lock()
+indexStamp      = None # Modification time of INDEX_CHANGED_FILE when the caches were last cleared
+
+def clear_caches():
+    with cacheLock:
+        datasetsCache.clear()
+        productDefaults.clear()
+
+def index_changed():
+    # To be called after (re-)indexing datasets or products, e.g. through the /index/changed endpoint of the back-end.
+    # The file is seen by all the processes, which clear their caches before the next query
+    os.makedirs(os.path.dirname(INDEX_CHANGED_FILE),exist_ok=True)
+    with open(INDEX_CHANGED_FILE,'a'):
+        os.utime(INDEX_CHANGED_FILE)
+    check_index_changed()
+
+def check_index_changed():
+    global indexStamp
+    try:
+        stamp = os.path.getmtime(INDEX_CHANGED_FILE)
+    except OSError:
+        return
+    if stamp != indexStamp:
+        clear_caches()
+        indexStamp = stamp
 
 class Odc:
     def __init__(self,collections=None,timeStart=None,timeEnd=None,lowLat=None,\
-                 highLat=None,lowLon=None,highLon=None,bands=None,resolutions=None,outputCrs=None,polygon=None,resamplingMethod=None):
+                 highLat=None,lowLon=None,highLon=None,bands=None,resolutions=None,outputCrs=None,polygon=None,resamplingMethod=None,cache=None,chunkLayout=SPATIAL,previewSize=None,indexFolder=None):
 
-        self.dc = datacube.Datacube(config = OPENDATACUBE_CONFIG_FILE)
+        self.dc = None # Datacube lent by the pool while querying the index
         self.collections = collections
         self.timeStart   = timeStart
         self.timeEnd     = self.exclusive_date(timeEnd)
@@ -34,13 +75,29 @@ class Odc:
         self.resolutions = resolutions
         self.outputCrs   = outputCrs
         self.resamplingMethod = resamplingMethod
-        self.polygon     = polygon
+        self.polygon     = polygon # GeoJSON Polygon or MultiPolygon in lat/lon, or the coordinates of a Polygon
+        self.geometry    = None
+        self.cache       = cache # result_cache.ResultCache shared by the requests, None to always read from storage
+        self.chunkLayout = chunkLayout # chunk_planner.TEMPORAL or chunk_planner.SPATIAL, depending on the processes using the data
+        self.previewSize = previewSize # Pixels on the longest side of the image produced from the data, None for full resolution
+        self.indexFolder = indexFolder # Where the spatial indexes of the SAR2Cube products are stored
+        self.continuous  = False # True if all the bands are continuous and can be averaged for previews
         self.geoms       = None
         self.data        = None
         self.query       = None
-        self.build_query()
-        self.load_collection()
-        if self.polygon is not None: # We mask the data with the given polygon, i.e. we set to zero the values outside the polygon
+        self.cacheKey    = None
+        self.cacheWrite  = None # Dask delayed writing the loaded data into the cache, computed with the result
+        with datacube_connection(OPENDATACUBE_CONFIG_FILE) as dc:
+            self.dc = dc
+            self.build_query()
+            cached = self.load_collection() # The data is loaded lazily, the index is not needed afterwards
+        self.dc = None
+        if not cached:
+            # The geolocation grid is read and the cache entry prepared after giving back the connection
+            self.sar2cube_subset()
+            if self.cacheKey is not None:
+                self.cacheWrite = self.cache.put(self.cacheKey,self.data)
+        if self.polygon is not None and not self.sar2cube_collection(): # We mask the data with the given polygon, i.e. we set to nan the values outside the polygon
             self.apply_mask()
     
     def sar2cube_collection(self):
@@ -55,11 +112,11 @@ class Odc:
         if self.bands is not None:
             query['measurements'] = self.bands
         if self.polygon is not None:
-            #crs = CRS("epsg:4326")
-            #geom = Geometry(geom=self.polygon, crs=crs)
-            #query['geopolygon'] = geom
+            self.geometry = self.build_geometry()
             self.get_bbox()
-        if (self.lowLat is not None and self.highLat is not None and self.lowLon is not None and self.highLon is not None and not self.sar2cube_collection()):
+            if not self.sar2cube_collection():
+                query['geopolygon'] = self.geometry # Only the datasets intersecting the polygon are loaded
+        if ('geopolygon' not in query and self.lowLat is not None and self.highLat is not None and self.lowLon is not None and self.highLon is not None and not self.sar2cube_collection()):
             query['latitude']  = (self.lowLat,self.highLat)
             query['longitude'] = (self.lowLon,self.highLon)
         if self.resolutions is not None:
@@ -68,9 +125,125 @@ class Odc:
             query['output_crs'] = self.outputCrs
         self.query = query
         
+    def find_datasets(self):
+        check_index_changed()
+        key = json.dumps([self.query,self.timeStart,self.timeEnd],sort_keys=True,default=str)
+        with cacheLock:
+            if key in datasetsCache and time() - datasetsCache[key][0] < DATASETS_CACHE_TTL:
+                return datasetsCache[key][1]
+        datasets = self.dc.find_datasets(time=(self.timeStart,self.timeEnd),**self.query)
+        with cacheLock:
+            for k in [k for k, v in datasetsCache.items() if time() - v[0] >= DATASETS_CACHE_TTL]:
+                datasetsCache.pop(k)
+            while len(datasetsCache) >= DATASETS_CACHE_ENTRIES:
+                datasetsCache.pop(min(datasetsCache,key=lambda k: datasetsCache[k][0]))
+            datasetsCache[key] = (time(),datasets)
+        return datasets
+
+    def product_defaults(self):
+        # Returns the crs and resolution of the default grid of the product, None if it has no default grid
+        check_index_changed()
+        with cacheLock:
+            if self.collections in productDefaults:
+                return productDefaults[self.collections]
+        defaults = None
+        product = self.dc.index.products.get_by_name(self.collections)
+        if product is not None and product.grid_spec is not None:
+            defaults = (str(product.grid_spec.crs),product.grid_spec.resolution)
+        with cacheLock:
+            productDefaults[self.collections] = defaults
+        return defaults
+
+    def measurement_itemsize(self):
+        # Bytes per pixel of the largest requested band
+        product = self.dc.index.products.get_by_name(self.collections)
+        if product is None:
+            return 4
+        measurements = product.measurements
+        names = self.bands if self.bands is not None else list(measurements.keys())
+        return max([np.dtype(measurements[n]['dtype']).itemsize for n in names if n in measurements] + [1])
+
+    def preview_resolution(self,datasets):
+        # Sets a resolution giving about previewSize pixels on the longest side of the bbox, if coarser than the native one
+        if self.lowLat is None or self.highLat is None or self.lowLon is None or self.highLon is None or len(datasets) == 0:
+            return
+        defaults  = self.product_defaults()
+        crs       = self.query.get('output_crs')
+        if crs is None:
+            crs = defaults[0] if defaults is not None else Counter([str(ds.crs) for ds in datasets]).most_common(1)[0][0]
+        nativeRes = self.native_resolution(datasets,crs,defaults)
+        if nativeRes is None:
+            print('[!] Native resolution of {} unknown, the preview is loaded at full resolution'.format(self.collections))
+            return
+        bbox = geometry.box(min(self.lowLon,self.highLon),self.lowLat,max(self.lowLon,self.highLon),self.highLat,crs='epsg:4326').to_crs(crs).boundingbox
+        res  = max(bbox.right - bbox.left,bbox.top - bbox.bottom) / self.previewSize
+        if res <= nativeRes:
+            return
+        print('[*] Loading the data at resolution {} for a preview of {} pixels'.format(res,self.previewSize))
+        self.query['output_crs'] = crs
+        self.query['resolution'] = (-res,res)
+        if self.resamplingMethod is None:
+            self.resamplingMethod = 'average' if self.continuous else 'nearest'
+
+    def native_resolution(self,datasets,crs,defaults):
+        # Pixel size of the data in the units of crs: from the default grid of the product or from the grid of a
+        # dataset in the same crs, None if unknown
+        if defaults is not None and CRS(defaults[0]) == CRS(crs):
+            return abs(defaults[1][1])
+        for ds in datasets:
+            if ds.crs is None or ds.crs != CRS(crs):
+                continue
+            transform = None
+            try:
+                transform = ds.transform
+            except Exception:
+                pass
+            grids = ds.metadata_doc.get('grids') if transform is None else None
+            if grids is not None and 'default' in grids and 'transform' in grids['default']:
+                transform = Affine(*grids['default']['transform'][:6])
+            if transform is not None:
+                return abs(transform.e)
+        return None
+
+    def continuous_bands(self):
+        # Only continuous bands can be averaged for previews: the values of categorical bands (e.g. SCL or cloud masks)
+        # would become fractions. Bands with flags or integer values may be categorical, they are resampled by nearest
+        product = self.dc.index.products.get_by_name(self.collections)
+        if product is None:
+            return False
+        measurements = product.measurements
+        names = self.bands if self.bands is not None else list(measurements.keys())
+        for n in names:
+            if n not in measurements or 'flags_definition' in measurements[n] or not np.issubdtype(np.dtype(measurements[n]['dtype']),np.floating):
+                return False
+        return True
+
     def load_collection(self):
-        datasets  = self.dc.find_datasets(time=(self.timeStart,self.timeEnd),**self.query)
-        self.query['dask_chunks'] = {"x": 2000, "y":2000}             # This let us load the data as Dask chunks instead of numpy arrays
+        datasets  = self.find_datasets()
+        self.continuous = self.continuous_bands()
+        if self.previewSize is not None and 'resolution' not in self.query and not self.sar2cube_collection():
+            self.preview_resolution(datasets)
+        nTimes    = len(set([ds.center_time for ds in datasets]))
+        chunks    = chunk_shape(self.chunkLayout,self.measurement_itemsize(),nTimes)
+        if ('output_crs' not in self.query or 'resolution' not in self.query) and len(datasets) > 0 and self.product_defaults() is None:
+            # Without a default grid ODC requires output_crs and resolution: we use the most common projection of the datasets found
+            if 'output_crs' not in self.query:
+                self.query['output_crs'] = Counter([str(ds.crs) for ds in datasets]).most_common(1)[0][0]
+            if 'resolution' not in self.query:
+                self.query['resolution'] = DEFAULT_RESOLUTION
+        if self.cache is not None:
+            # The key includes the indexed datasets, so that a re-indexed collection doesn't use stale entries
+            datasetsFingerprint = sorted([(str(ds.id),str(ds.indexed_time)) for ds in datasets])
+            cacheKey = self.cache.key(self.query,self.timeStart,self.timeEnd,self.resamplingMethod,datasetsFingerprint)
+            cached = self.cache.get(cacheKey)
+            if cached is not None:
+                cachedChunks = {dim: c[0] for dim, c in cached.chunks.items() if dim in chunks}
+                if any([cachedChunks.get(dim) != min(size,cached.sizes[dim]) for dim, size in chunks.items() if dim in cached.sizes]):
+                    cached = cached.chunk({dim: size for dim, size in chunks.items() if dim in cached.sizes})
+                self.data = cached
+                return True
+            self.cacheKey = cacheKey
+        self.query['dask_chunks'] = chunks             # This let us load the data as Dask chunks instead of numpy arrays
         if self.resamplingMethod  is not None:
             if self.resamplingMethod == 'near':
                 self.query['resampling'] = 'nearest'
@@ -78,25 +251,19 @@ class Odc:
                 ##TODO add other method parsing here
                 self.query['resampling'] = self.resamplingMethod
         
-        try:
-            self.data = self.dc.load(datasets=datasets,**self.query)
-        except Exception as e:
-            print(e)
-            if (str(e)=='Product has no default CRS. Must specify \'output_crs\' and \'resolution\''):
-                # Identify the most common projection system in the input query
-                crs_query = copy.deepcopy(self.query)
-                crs_query.pop('product')
-                crs_query.pop('dask_chunks')
-                output_crs = dea_tools.datahandling.mostcommon_crs(dc=self.dc, product=self.collections, query=crs_query)
-                self.query['output_crs'] = output_crs
-                self.query['resolution'] = [10,10]
-                self.data = self.dc.load(datasets=datasets,**self.query)
-            else:
-                raise Exception(str(e))
+        self.data = self.dc.load(datasets=datasets,**self.query)
+        return False
 
-            
+    def sar2cube_subset(self):
         if (self.sar2cube_collection() and self.lowLat is not None and self.highLat is not None and self.lowLon is not None and self.highLon is not None):
             bbox = [self.highLon,self.lowLat,self.lowLon,self.highLat]
+            # The spatial index maps the bbox to a window of the radar geometry, the data outside it is never read
+            index = get_index(self.collections,self.data.grid_lon[0],self.data.grid_lat[0],self.indexFolder)
+            window = index.window(*bbox)
+            if window is None:
+                raise Exception("The requested spatial extent doesn't intersect the SAR2Cube collection {}".format(self.collections))
+            yDim, xDim = self.data.grid_lon.dims[-2:]
+            self.data = self.data.isel({yDim: window[0], xDim: window[1]})
             bbox_mask = np.bitwise_and(np.bitwise_and(self.data.grid_lon[0]>bbox[0],self.data.grid_lon[0]<bbox[2]),np.bitwise_and(self.data.grid_lat[0]>bbox[1],self.data.grid_lat[0]<bbox[3]))
             self.data = self.data.where(bbox_mask,drop=True)
 
@@ -125,22 +292,33 @@ class Odc:
         #shape_name = shape_file.split('/')[-1].split('.')[0]+'_'+str(i)
         return geoms    
     
+    def build_geometry(self):
+        if isinstance(self.polygon,dict):
+            geojson = self.polygon
+        else:
+            geojson = {'type': 'Polygon', 'coordinates': self.polygon}
+        if geojson['type'] not in ['Polygon','MultiPolygon']:
+            raise Exception('[!] Only Polygon and MultiPolygon geometries are supported as spatial extent, got {}'.format(geojson['type']))
+        return Geometry({'type': geojson['type'], 'coordinates': geojson['coordinates']}, crs='epsg:4326')
+
     def get_bbox(self):
-        self.lowLat      = np.min([[el[1] for el in self.polygon[0]]])
-        self.highLat     = np.max([[el[1] for el in self.polygon[0]]])
-        self.lowLon      = np.min([[el[0] for el in self.polygon[0]]])
-        self.highLon     = np.max([[el[0] for el in self.polygon[0]]])
+        # Same convention of the load_collection handler: lowLon is the east and highLon the west bound
+        bbox = self.geometry.boundingbox
+        self.lowLat      = bbox.bottom
+        self.highLat     = bbox.top
+        self.lowLon      = bbox.right
+        self.highLon     = bbox.left
         return
     
     def apply_mask(self):
-        geoms = []
-        pol = {}
-        pol['type'] = 'Polygon'
-        coords = [[(el[0], el[1]) for el in self.polygon[0]]]
-        pol['coordinates'] = coords
-        geom = geometry.Geometry(pol, crs='epsg:4326')
-        geoms.append(geom)
-        mask = self.geometry_mask(geoms, self.data.geobox, invert=True)
+        # The polygon is rasterized lazily, chunk by chunk, with the same chunks of the data
+        geobox = self.data.geobox
+        yDim, xDim = geobox.dimensions
+        polygon = shapely.geometry.shape(self.geometry.to_crs(geobox.crs).__geo_interface__)
+        # map_blocks over an empty array with the chunks of the data: without input arrays older Dask versions fail
+        template = da.empty((len(self.data[yDim]),len(self.data[xDim])),chunks=(self.data.chunks[yDim],self.data.chunks[xDim]),dtype=bool)
+        mask = template.map_blocks(polygon_block_mask,polygon,geobox.affine,dtype=bool)
+        mask = xr.DataArray(mask,dims=(yDim,xDim),coords={yDim: self.data[yDim], xDim: self.data[xDim]})
         self.data = self.data.where(mask)
         return
 
@@ -163,4 +341,24 @@ class Odc:
                                                all_touched=all_touched,
                                                invert=invert)
 
- 
\ No newline at end of file
+ 
+
+def polygon_block_mask(block,polygon,affine,block_info=None):
+    """
+    Rasterizes the polygon on a block of the grid, True inside the polygon.
+
+    :param block: block of the template array, only its location is used
+    :param polygon: shapely geometry in the CRS of the grid
+    :param affine: transform of the whole grid
+    :param block_info: passed by dask.array.map_blocks, with the location of the block in the grid
+    """
+    (y0, y1), (x0, x1) = block_info[0]['array-location']
+    shape = (y1 - y0, x1 - x0)
+    blockAffine = affine * Affine.translation(x0,y0)
+    corners = [blockAffine * (0,0), blockAffine * (shape[1],0), blockAffine * (shape[1],shape[0]), blockAffine * (0,shape[0])]
+    block = shapely.geometry.Polygon(corners)
+    if not polygon.intersects(block): # Blocks outside the polygon are not rasterized
+        return np.zeros(shape,dtype=bool)
+    if polygon.contains(block):
+        return np.ones(shape,dtype=bool)
+    return rasterio.features.geometry_mask([polygon],out_shape=shape,transform=blockAffine,invert=True)
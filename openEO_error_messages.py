@@ -1 +1,5 @@
-OverlapResolverMissing = "Overlapping data cubes, but no overlap resolver has been specified."
\ No newline at end of file
+OverlapResolverMissing = "Overlapping data cubes, but no overlap resolver has been specified."
+MultiplicandMissing    = "Multiplication requires at least two operands."
+DivisionByZero         = "Division by zero is not supported."
+ProcessUnsupported     = "Process '{}' is not supported by the back-end."
+ArgumentMissing        = "Argument '{}' is missing in process '{}'."
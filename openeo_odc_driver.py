@@ -10,13 +10,13 @@ from time import time
 from datetime import datetime
 import json
 import uuid
+import shutil
 # Math
 import math
 import numpy as np
 from scipy.interpolate import griddata
 from scipy.spatial import Delaunay
 from scipy.interpolate import LinearNDInterpolator
-from scipy.optimize import curve_fit
 # Geography
 from osgeo import gdal, osr
 from pyproj import Proj, transform, Transformer, CRS
@@ -29,12 +29,24 @@ import rioxarray
 import pandas as pd
 # Parallel Computing
 import dask
-from dask.distributed import Client
+from dask.distributed import Client, Lock, fire_and_forget, as_completed
 from dask import delayed
 # openEO & SAR2Cube specific
 from openeo_pg_parser.translate import translate_process_graph
 from openEO_error_messages import *
 from odc_wrapper import Odc
+from process_registry import register_process, translated_by_parent, get_process, load_plugins
+from result_cache import ResultCache, sanitize_attrs
+from graph_optimizer import eliminate_common_subexpressions, consumer_counts, node_sources, push_down_filters, needs_native_resolution
+from chunk_planner import plan_chunks, single_chunk, SPATIAL
+from cog_writer import write_geotiff
+from netcdf_writer import write_netcdf
+from geocoding import weights_key, get_weights, geocode_tiled
+from curve_fitting import is_linear, design_matrix, fit_linear, fit_nonlinear
+from function_compiler import compile_function
+from convolution import convolve
+from temporal_resampling import match_dates
+from coherence import coherence as sar_coherence
 try:
     from sar2cube_utils import *
 except:
@@ -43,12 +55,24 @@ except:
 DASK_SCHEDULER_ADDRESS = ''
 TMP_FOLDER_PATH        = '' # Has to be accessible from all the Dask workers
 OPENEO_PROCESSES       = 'https://openeo.eurac.edu/processes' # The processes available at the back-end
+PROCESS_PLUGINS        = [] # Modules registering additional processes with process_registry.register_process
+LAZY_EXECUTION         = True # Build a single Dask graph for the whole process graph, computed only by save_result
+MERGE_COMMON_NODES     = True # Compute only once the nodes of the graph which are structurally identical
+PUSHDOWN_FILTERS       = True # Apply the band, temporal and spatial filters of the graph in the load_collection query
+USE_RESULT_CACHE       = True # Keep the loaded data in a Zarr cache shared by the requests
+RESULT_CACHE_SIZE      = 100 * 1024**3 # Bytes, the least recently used entries are removed when the cache is bigger
+RESULT_CACHE_ENTRY     = 2 * 1024**3 # Bytes, bigger loaded data is never cached
+STREAM_STRIP_ROWS      = 1024 # Rows of every part of a streamed result without time dimension, if not chunked
+PREDICT_TIME_CHUNK     = 32 # Dates per chunk of the time series computed by predict_curve, if the input is not chunked
 client = Client(DASK_SCHEDULER_ADDRESS)
-    
+resultCache = ResultCache(TMP_FOLDER_PATH + 'CACHE/',RESULT_CACHE_SIZE,RESULT_CACHE_ENTRY) if USE_RESULT_CACHE else None
+translated_by_parent('fit_curve','predict_curve') # Their child graphs are compiled by function_compiler
+
 
 class OpenEO():
-    def __init__(self,jsonProcessGraph):
+    def __init__(self,jsonProcessGraph,streaming=False):
         self.jsonProcessGraph = jsonProcessGraph
+        self.streaming = streaming # Write the result in parts, which can be sent while the following ones are computed
         self.jobId = jsonProcessGraph['id']
         self.data = None
         self.listExecutedIds = []
@@ -56,6 +80,25 @@ class OpenEO():
         self.crs = None
         self.bands = None
         self.graph = translate_process_graph(jsonProcessGraph,process_defs=OPENEO_PROCESSES).sort(by='result')
+        self.mergedNodes = {} # Ids of the nodes removed from the graph -> id of the identical node computing their result
+        if MERGE_COMMON_NODES:
+            self.mergedNodes = eliminate_common_subexpressions(self.graph)
+            if len(self.mergedNodes) > 0:
+                print('[*] {} duplicated nodes merged'.format(len(self.mergedNodes)))
+        self.nodes = {node.id: node for node in self.graph}
+        self.consumers = consumer_counts(self.graph,skip=self.mergedNodes) # Nodes still needing the result of every node
+        self.pushdown = push_down_filters(self.graph,skip=self.mergedNodes) # load_collection id -> query parameters
+        if not PUSHDOWN_FILTERS: # resample_spatial is implemented only in the query, it is always pushed down
+            self.pushdown = {k: {'resample': v['resample']} for k, v in self.pushdown.items() if 'resample' in v}
+        self.chunkPlan = plan_chunks(self.graph,skip=self.mergedNodes) # load_collection id -> chunk layout
+        self.previewSize = None # Longest side of the PNG result, the data is loaded at the resolution it needs
+        for n in self.graph:
+            if n.process_id == 'save_result' and str(n.arguments.get('format')).lower() == 'png':
+                self.previewSize = (n.arguments.get('options') or {}).get('size')
+        self.nativeResolution = needs_native_resolution(self.graph,skip=self.mergedNodes) # load_collection ids never loaded for a preview
+        self.continuousBands = True # False if a loaded band may be categorical, the PNG preview is then never averaged
+        self.residentBytes = 0     # Size of the intermediate results held in memory (not lazy)
+        self.peakResidentBytes = 0
         self.outFormat = None
         self.mimeType = None
         self.i = 0
@@ -64,7 +107,11 @@ class OpenEO():
         else:
             self.tmpFolderPath = TMP_FOLDER_PATH + self.jobId # If it is a batch job, there will be a field with it's id
         self.sar2cubeCollection = False
+        self.collection = None
         self.fitCurveFunctionString = ""
+        self.lazy = LAZY_EXECUTION
+        self.eagerComputes = [] # (node id, process id) of the handlers which computed data before save_result
+        self.cacheWrites = [] # Dask delayed writing the loaded collections into resultCache, see start_cache_writes
         try:
             os.mkdir(self.tmpFolderPath)
         except:
@@ -73,1345 +120,1157 @@ class OpenEO():
             if not self.process_node(i):
                 print('[*] Processing finished!')
                 break
+        print('[*] Peak resident intermediate results: {:.1f} MB'.format(self.peakResidentBytes/1024**2))
+        if len(self.eagerComputes) > 0:
+            print('[!] Eager computes forced by: {}'.format(', '.join(['{} ({})'.format(p,n) for n,p in self.eagerComputes])))
 
     def process_node(self,i):
         node = self.graph[i]
         processName = node.process_id
         print("Process id: {} Process name: {}".format(node.id,processName))
+        if node.id in self.mergedNodes:
+            print("Result already computed by node {}".format(self.mergedNodes[node.id]))
+            return 1
         try:
-            if processName == 'load_collection':
-                defaultTimeStart = '1970-01-01'
-                defaultTimeEnd   = str(datetime.now()).split(' ')[0] # Today is the default date for timeEnd, to include all the dates if not specified
-                timeStart        = defaultTimeStart
-                timeEnd          = defaultTimeEnd
-                collection       = None
-                lowLat           = None
-                highLat          = None
-                lowLon           = None
-                highLon          = None
-                bands            = None # List of bands
-                resolutions      = None # Tuple
-                outputCrs        = None
-                resamplingMethod = None
-                polygon          = None
-                if 'bands' in node.arguments:
-                    bands = node.arguments['bands']
-                    if bands == []: bands = None
-
-                collection = node.arguments['id'] # The datacube we have to load
-                if collection is None:
-                    raise Exception('[!] You must provide a collection which provides the data!')
-                self.sar2cubeCollection = ('SAR2Cube' in collection) # Return True if it's a SAR2Cube collection
-        
-                if node.arguments['temporal_extent'] is not None:
-                    timeStart  = node.arguments['temporal_extent'][0]
-                    timeEnd    = node.arguments['temporal_extent'][1]
-
-                # If there is a bounding-box or a polygon we set the variables, otherwise we pass the defaults
-                if 'spatial_extent' in node.arguments and node.arguments['spatial_extent'] is not None:
-                    if 'south' in node.arguments['spatial_extent'] and \
-                       'north' in node.arguments['spatial_extent'] and \
-                       'east'  in node.arguments['spatial_extent'] and \
-                       'west'  in node.arguments['spatial_extent']:
-                        lowLat     = node.arguments['spatial_extent']['south']
-                        highLat    = node.arguments['spatial_extent']['north']
-                        lowLon     = node.arguments['spatial_extent']['east']
-                        highLon    = node.arguments['spatial_extent']['west']
-
-                    elif 'coordinates' in node.arguments['spatial_extent']:
-                        # Pass coordinates to odc and process them there
-                        polygon = node.arguments['spatial_extent']['coordinates']
-
-                for n in self.graph: # Let's look for resample_spatial nodes
-                    parentID = 0
-                    if n.content['process_id'] == 'resample_spatial':
-                        for n_0 in n.dependencies: # Check if the (or one of the) resample_spatial process is related to this load_collection
-                            parentID = n_0.id
-                            continue
-                        if parentID == node.id: # The found resample_spatial comes right after the current load_collection, let's apply the resampling to the query
-                            if 'resolution' in n.arguments:
-                                res = n.arguments['resolution']
-                                if isinstance(res,float) or isinstance(res,int):
-                                    resolutions = (res,res)
-                                elif len(res) == 2:
-                                    resolutions = (res[0],res[1])
-                                else:
-                                    print('error')
-
-                            if 'projection' in n.arguments:
-                                if n.arguments['projection'] is not None:
-                                    projection = n.arguments['projection']
-                                    if isinstance(projection,int):           # Check if it's an EPSG code and append 'epsg:' to it, without ODC returns an error
-                                        ## TODO: make other projections available
-                                        projection = 'epsg:' + str(projection)
-                                    else:
-                                        print('This type of reprojection is not yet implemented')
-                                    outputCrs = projection
-
-                            if 'method' in n.arguments:
-                                resamplingMethod = n.arguments['method']
-
-                odc = Odc(collections=collection,timeStart=timeStart,timeEnd=timeEnd,bands=bands,lowLat=lowLat,highLat=highLat,lowLon=lowLon,highLon=highLon,resolutions=resolutions,outputCrs=outputCrs,polygon=polygon,resamplingMethod=resamplingMethod)
-                if len(odc.data) == 0:
-                    raise Exception("load_collection returned an empty dataset, please check the requested bands, spatial and temporal extent.")
-                self.partialResults[node.id] = odc.data.to_array()
-                self.crs = odc.data.crs             # We store the data CRS separately, because it's a metadata we may lose it in the processing
-                print(self.partialResults[node.id]) # The loaded data, stored in a dictionary with the id of the node that has generated it
-                        
-            if processName == 'resample_spatial':
-                source = node.arguments['data']['from_node']
-                self.partialResults[node.id] = self.partialResults[source]
-            
-            # The following code block handles the fit_curve and predict_curve processes, where we need to convert a process graph into a callable python function
-            if node.parent_process is not None:
-                if (node.parent_process.process_id=='fit_curve' or node.parent_process.process_id=='predict_curve'):
-                    if processName in ['pi']:
-                        if processName == 'pi':
-                            self.partialResults[node.id] =  "np.pi"
-                    if processName in ['array_element']:
-                        self.partialResults[node.id] = 'a' + str(node.arguments['index'])
-                    if processName in ['multiply','divide','subtract','add','sin','cos']:
-                        x = None
-                        y = None
-                        source = None
-                        if 'x' in node.arguments and node.arguments['x'] is not None:
-                            if isinstance(node.arguments['x'],float) or isinstance(node.arguments['x'],int): # We have to distinguish when the input data is a number or a datacube from a previous process
-                                x = str(node.arguments['x'])
-                            else:
-                                if 'from_node' in node.arguments['x']:
-                                    source = node.arguments['x']['from_node']
-                                elif 'from_parameter' in node.arguments['x']:
-                                    x = 'x'
-                                if source is not None:
-                                    x = self.partialResults[source]
-                        source = None        
-                        if 'y' in node.arguments and node.arguments['y'] is not None:
-                            if isinstance(node.arguments['y'],float) or isinstance(node.arguments['y'],int):
-                                y = str(node.arguments['y'])
-                            else:
-                                if 'from_node' in node.arguments['y']:
-                                    source = node.arguments['y']['from_node']
-                                elif 'from_parameter' in node.arguments['y']:
-                                    y = 'x'
-                                if source is not None:
-                                    y = self.partialResults[source]
-                        if processName == 'multiply':
-                            if x is None or y is None:
-                                raise Exception(MultiplicandMissing)
-                            else:
-                                self.partialResults[node.id] = "(" + x  + "*" + y + ")"
-                        elif processName == 'divide':
-                            if y==0:
-                                raise Exception(DivisionByZero)
-                            else:
-                                self.partialResults[node.id] = "(" + x + "/" + y + ")"
-                        elif processName == 'subtract':
-                            self.partialResults[node.id] = "(" + x + "-" + y + ")"
-                        elif processName == 'add':
-                            self.partialResults[node.id] = "(" + x + "+" + y + ")"
-                        elif processName == 'sin':
-                            self.partialResults[node.id] = "np.sin(" + x + ")"
-                        elif processName == 'cos':
-                            self.partialResults[node.id] = "np.cos(" + x + ")"
-                    return 1
-                
-                
-            if processName == 'resample_cube_spatial':
-                target = node.arguments['target']['from_node']
-                source = node.arguments['data']['from_node']
-                method = node.arguments['method']
-                if method is None:
-                    method = 'nearest'
-                if method == 'near':
-                    method = 'nearest'
-                try:
-                    import odc.algo
-                    self.partialResults[node.id] = odc.algo._warp.xr_reproject(self.partialResults[source].compute(),self.partialResults[target].geobox,resampling=method).compute()
-                except Exception as e:
-                    print(e)
-                    try:
-                        self.partialResults[node.id] = self.partialResults[source].rio.reproject_match(self.partialResults[target],resampling=method)
-                    except Exception as e:
-                        raise Exception("ODC Error in process: ",processName,'\n Full Python log:\n',str(e))
-
-            if processName == 'resample_cube_temporal':
-                target = node.arguments['target']['from_node']
-                source = node.arguments['data']['from_node']
-                def nearest(items, pivot):
-                    return min(items, key=lambda x: abs(x - pivot))
-                def resample_temporal(sourceCube,targetCube):
-                    # Find in sourceCube the closest dates to tergetCube
-                    newTime = []
-                    for i,targetTime in enumerate(targetCube.time):
-                        nearT = nearest(sourceCube.time.values,targetTime.values)
-                        if i==0:
-                            tmp = sourceCube.loc[dict(time=nearT)]
-                        else:
-                            tmp = xr.concat([tmp,sourceCube.loc[dict(time=nearT)]], dim='time')
-                    tmp['time'] = targetCube.time
-                    return tmp
-                self.partialResults[node.id] = resample_temporal(self.partialResults[source],self.partialResults[target])
-
-            if processName in ['multiply','divide','subtract','add','lt','lte','gt','gte','eq','neq']:
-                x = None
-                y = None
-                source = None
-                if 'x' in node.arguments and node.arguments['x'] is not None:
-                    if isinstance(node.arguments['x'],float) or isinstance(node.arguments['x'],int): # We have to distinguish when the input data is a number or a datacube from a previous process
-                        x = node.arguments['x']
-                    else:
-                    if 'from_node' in node.arguments['x']:
-                        source = node.arguments['x']['from_node']
-                    elif 'from_parameter' in node.arguments['x']:
-                        if node.parent_process.process_id == 'merge_cubes':
-                                source = node.parent_process.arguments['cube1']['from_node']
-                            else:
-                                source = node.parent_process.arguments['data']['from_node']
-                        if source is not None:
-                            x = self.partialResults[source]
-                if 'y' in node.arguments and node.arguments['y'] is not None:
-                    if isinstance(node.arguments['y'],float) or isinstance(node.arguments['y'],int):
-                        y = node.arguments['y']
-                    else:
-                    if 'from_node' in node.arguments['y']:
-                        source = node.arguments['y']['from_node']
-                    elif 'from_parameter' in node.arguments['y']:
-                        if node.parent_process.process_id == 'merge_cubes':
-                                source = node.parent_process.arguments['cube2']['from_node']
-                            else:
-                                source = node.parent_process.arguments['data']['from_node']
-                        if source is not None:
-                            y = self.partialResults[source]
+            process = get_process(node)
+            if process is None:
+                self.release_sources(node)
+                return 1 # The node belongs to a child graph which is translated by its parent process
+            process(self,node)
+            if process.terminal:
+                return 0 # Save result is the end of the process graph
+            self.listExecutedIds.append(node.id) # Store the processed nodes ids
+            self.release_sources(node)
+            return 1 # Go on and process the next node
 
-                if processName == 'multiply':
-                    if x is None or y is None:
-                        raise Exception(MultiplicandMissing)
-                    else:
-                        try:
-                            self.partialResults[node.id] = (x * y).astype(np.float32)
-                        except:
-                            if hasattr(x,'chunks'):
-                                x = x.compute()
-                            if hasattr(y,'chunks'):
-                                y = y.compute()
-                            try:
-                                self.partialResults[node.id] = (x * y).astype(np.float32).chunk()
-                            except Exception as e:
-                                raise e
-                elif processName == 'divide':
-                    if y==0:
-                        raise Exception(DivisionByZero)
-                    else:
-                        try:
-                            self.partialResults[node.id] = (x / y).astype(np.float32)
-                        except:
-                            if hasattr(x,'chunks'):
-                                x = x.compute()
-                            if hasattr(y,'chunks'):
-                                y = y.compute()
-                            try:
-                                self.partialResults[node.id] = (x / y).astype(np.float32).chunk()
-                            except Exception as e:
-                                raise e
-                elif processName == 'subtract':
-                    try:
-                        self.partialResults[node.id] = (x - y).astype(np.float32)
-                    except:
-                        if hasattr(x,'chunks'):
-                            x = x.compute()
-                        if hasattr(y,'chunks'):
-                            y = y.compute()
-                        try:
-                            self.partialResults[node.id] = (x - y).astype(np.float32).chunk()
-                        except Exception as e:
-                            raise e
-                elif processName == 'add':
-                    try:
-                        self.partialResults[node.id] = (x + y).astype(np.float32)
-                    except:
-                        if hasattr(x,'chunks'):
-                            x = x.compute()
-                        if hasattr(y,'chunks'):
-                            y = y.compute()
-                        try:
-                            self.partialResults[node.id] = (x + y).astype(np.float32).chunk()
-                        except Exception as e:
-                            raise e
-                elif processName == 'lt':
-                    self.partialResults[node.id] = x < y
-                elif processName == 'lte':
-                    self.partialResults[node.id] = x <= y
-                elif processName == 'gt':
-                    self.partialResults[node.id] = x > y
-                elif processName == 'gte':
-                    self.partialResults[node.id] = x >= y
-                elif processName == 'eq':
-                    self.partialResults[node.id] = x == y
-                elif processName == 'neq':
-                    self.partialResults[node.id] = x != y       
-
-            if processName == 'not':
-                if isinstance(node.arguments['x'],float) or isinstance(node.arguments['x'],int): # We have to distinguish when the input data is a number or a datacube from a previous process
-                    x = node.arguments['x']
-                else:
-                    if 'from_node' in node.arguments['x']:
-                        source = node.arguments['x']['from_node']
-                    elif 'from_parameter' in node.arguments['x']:
-                        source = node.parent_process.arguments['data']['from_node']
-                    x = self.partialResults[source]
-                self.partialResults[node.id] = np.logical_not(x)
-
-            if processName == 'sum':
-                parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
-                if parent.content['process_id'] == 'aggregate_spatial_window':
-                    source = node.arguments['data']['from_node']
-                    xDim, yDim = parent.content['arguments']['size']
-                    self.partialResults[node.id] = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad').sum()
-                else:
-                    x = 0
-                    for i,d in enumerate(node.arguments['data']):
-                        if isinstance(d,float) or isinstance(d,int):         # We have to distinguish when the input data is a number or a datacube from a previous process
-                            x = d
-                        else:
-                            if 'from_node' in d:
-                                source = d['from_node']
-                            elif 'from_parameter' in d:
-                                source = node.parent_process.arguments['data']['from_node']
-                            x = self.partialResults[source]
-                        if i==0: self.partialResults[node.id] = x
-                        else: self.partialResults[node.id] += x
-
-            if processName == 'product':
-                parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
-                if parent.content['process_id'] == 'aggregate_spatial_window':
-                    source = node.arguments['data']['from_node']
-                    xDim, yDim = parent.content['arguments']['size']
-                    self.partialResults[node.id] = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad').prod()
-                else:
-                    x = 0
-                    for i,d in enumerate(node.arguments['data']):
-                        if isinstance(d,float) or isinstance(d,int):        # We have to distinguish when the input data is a number or a datacube from a previous process
-                            x = d
-                        else:
-                            if 'from_node' in d:
-                                source = d['from_node']
-                            elif 'from_parameter' in d:
-                                source = node.parent_process.arguments['data']['from_node']
-                            x = self.partialResults[source]
-                        if i==0: self.partialResults[node.id] = x
-                        else: self.partialResults[node.id] *= x
-
-            if processName == 'sqrt':
-                x = node.arguments['x']
-                if isinstance(x,float) or isinstance(x,int):        # We have to distinguish when the input data is a number or a datacube from a previous process
-                    self.partialResults[node.id] = np.sqrt(x)
-                else:
-                    if 'from_node' in node.arguments['x']:
-                        source = node.arguments['x']['from_node']
-                    elif 'from_parameter' in node.arguments['x']:
-                        source = node.parent_process.arguments['data']['from_node']
-                    self.partialResults[node.id] = np.sqrt(self.partialResults[source])
-
-            if processName == 'and':
-                x = node.arguments['x']['from_node']
-                y = node.arguments['y']['from_node']
-                self.partialResults[node.id] = np.bitwise_and(self.partialResults[x],self.partialResults[y])
-
-            if processName == 'or':
-                x = node.arguments['x']['from_node']
-                y = node.arguments['y']['from_node']
-                self.partialResults[node.id] = np.bitwise_or(self.partialResults[x],self.partialResults[y])
-
-            if processName == 'array_element':
-                if 'from_node' in node.arguments['data']:
-                    source = node.arguments['data']['from_node']
-                elif 'from_parameter' in node.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
-                else:
-                    print('ERROR')
-                noLabel = 1
-                if 'label' in node.arguments:
-                    if node.arguments['label'] is not None:
-                        bandLabel = node.arguments['label']
-                        noLabel = 0
-                        self.partialResults[node.id] = self.partialResults[source].loc[dict(variable=bandLabel)].drop('variable')
-                if 'index' in node.arguments and noLabel:
-                    index = node.arguments['index']
-                    self.partialResults[node.id] = self.partialResults[source][index]            
-
-            if processName == 'normalized_difference':
-                def normalized_difference(x,y):
-                    return (x-y)/(x+y)
-                xSource = (node.arguments['x']['from_node'])
-                ySource = (node.arguments['y']['from_node'])
-                self.partialResults[node.id] = normalized_difference(self.partialResults[xSource],self.partialResults[ySource])
-
-            if processName == 'reduce_dimension':
-                source = node.arguments['reducer']['from_node']
-                self.partialResults[node.id] = self.partialResults[source]
-
-            if processName == 'aggregate_spatial_window':
-                source = node.arguments['reducer']['from_node']
-                self.partialResults[node.id] = self.partialResults[source]
-
-            if processName == 'max':
-                parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
-                if 'from_node' in node.arguments['data']:
-                    source = node.arguments['data']['from_node']
-                elif 'from_parameter' in node.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
-                else:
-                    print('ERROR')
-                if parent.content['process_id'] == 'aggregate_spatial_window':
-                    xDim, yDim = parent.content['arguments']['size']
-                    self.partialResults[node.id] = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad').max()
-                else:
-                    dim = parent.dimension
-                    if dim in ['t','temporal','DATE'] and 'time' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].max('time')
-                    elif dim in ['bands'] and 'variable' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].max('variable')
-                    elif dim in ['x'] and 'x' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].max('x')
-                    elif dim in ['y'] and 'y' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].max('y')
-                    else:
-                        self.partialResults[node.id] = self.partialResults[source]
-                        print('[!] Dimension {} not available in the current data.'.format(dim))
-
-            if processName == 'min':
-                parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
-                if 'from_node' in node.arguments['data']:
-                    source = node.arguments['data']['from_node']
-                elif 'from_parameter' in node.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
-                else:
-                    print('ERROR')
-                if parent.content['process_id'] == 'aggregate_spatial_window':
-                    xDim, yDim = parent.content['arguments']['size']
-                    ## TODO get pad, trim parameter from arguments
-                    self.partialResults[node.id] = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad').min()
-                else:
-                    dim = parent.dimension
-                    if dim in ['t','temporal','DATE'] and 'time' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].min('time')
-                    elif dim in ['bands'] and 'variable' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].min('variable')
-                    elif dim in ['x'] and 'x' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].min('x')
-                    elif dim in ['y'] and 'y' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].min('y')
-                    else:
-                        self.partialResults[node.id] = self.partialResults[source]
-                        print('[!] Dimension {} not available in the current data.'.format(dim))
-
-            if processName == 'mean':
-                parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
-                if 'from_node' in node.arguments['data']:
-                    source = node.arguments['data']['from_node']
-                elif 'from_parameter' in node.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
-                else:
-                    print('ERROR')
-                self.partialResults[source] = self.partialResults[source].astype(np.float32)
-                if parent.content['process_id'] == 'aggregate_spatial_window':
-                    xDim, yDim = parent.content['arguments']['size']
-                    self.partialResults[node.id] = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad').mean()
-                else:
-                    dim = parent.dimension
-                    if dim in ['t','temporal','DATE'] and 'time' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].mean('time')
-                    elif dim in ['bands'] and 'variable' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].mean('variable')
-                    elif dim in ['x'] and 'x' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].mean('x')
-                    elif dim in ['y'] and 'y' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].mean('y')
-                    else:
-                        self.partialResults[node.id] = self.partialResults[source]
-                        print('[!] Dimension {} not available in the current data.'.format(dim))
-
-            if processName == 'median':
-                parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
-                if 'from_node' in node.arguments['data']:
-                    source = node.arguments['data']['from_node']
-                elif 'from_parameter' in node.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
-                else:
-                    print('ERROR')
-                self.partialResults[source] = self.partialResults[source].astype(np.float32)
-                if parent.content['process_id'] == 'aggregate_spatial_window':
-                    xDim, yDim = parent.content['arguments']['size']
-                    self.partialResults[node.id] = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad').median()
-                else:
-                    dim = parent.dimension
-                    if dim in ['t','temporal','DATE'] and 'time' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].median('time')
-                    elif dim in ['bands'] and 'variable' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].median('variable')
-                    elif dim in ['x'] and 'x' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].median('x')
-                    elif dim in ['y'] and 'y' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].median('y')
-                    else:
-                        self.partialResults[node.id] = self.partialResults[source]
-                        print('[!] Dimension {} not available in the current data.'.format(dim))
-                     
-            if processName == 'sd':
-                parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
-                if 'from_node' in node.arguments['data']:
-                    source = node.arguments['data']['from_node']
-                elif 'from_parameter' in node.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
-                else:
-                    print('ERROR')
-                if parent.content['process_id'] == 'aggregate_spatial_window':
-                    xDim, yDim = parent.content['arguments']['size']
-                    self.partialResults[node.id] = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad').std()
+        except Exception as e:
+            print(e)
+            raise Exception(processName + '\n' + str(e))
+
+    def release_sources(self,node):
+        # Drops the results which are not needed anymore by the following nodes
+        self.update_resident_bytes()
+        for source in node_sources(node,self.nodes):
+            self.consumers[source] -= 1
+            if self.consumers[source] == 0 and source in self.partialResults:
+                del self.partialResults[source]
+
+    def update_resident_bytes(self):
+        # Only the results which are not lazy Dask arrays occupy memory
+        counted = set()
+        self.residentBytes = 0
+        for data in self.partialResults.values():
+            if id(data) in counted or not hasattr(data,'nbytes'):
+                continue
+            counted.add(id(data))
+            if getattr(data,'chunks',None):
+                continue
+            self.residentBytes += data.nbytes
+        self.peakResidentBytes = max(self.peakResidentBytes,self.residentBytes)
+
+    def materialize(self,node,data):
+        # Every computation before save_result goes through here, so that we know which handler forced it
+        self.eagerComputes.append((node.id,node.process_id))
+        print('[!] Process {} ({}) forced an eager compute'.format(node.process_id,node.id))
+        if hasattr(data,'chunks') and data.chunks is not None:
+            self.start_cache_writes()
+            return data.compute()
+        return data
+
+    def start_cache_writes(self):
+        # The cache entries are written by the cluster in background, while the result is computed: the scheduler runs
+        # only once the tasks with the same key, so the chunks loaded for both computations are read once
+        for write in self.cacheWrites:
+            fire_and_forget(client.compute(write))
+        self.cacheWrites = []
+
+    def get_source(self,node,value,argument='data'):
+        # Returns the id of the node which generated the data passed as value, resolving the parameters of child graphs
+        source = None
+        if 'from_node' in value:
+            source = value['from_node']
+        elif 'from_parameter' in value:
+            parent = node.parent_process
+            if parent.process_id == 'merge_cubes' and argument in ['x','y']:
+                source = parent.arguments['cube1' if argument == 'x' else 'cube2']['from_node']
+            else:
+                source = parent.arguments['data']['from_node']
+        return source
+
+    def get_value(self,node,argument):
+        # We have to distinguish when the input data is a number or a datacube from a previous process
+        value = node.arguments[argument]
+        if isinstance(value,float) or isinstance(value,int):
+            return value
+        return self.partialResults[self.get_source(node,value,argument)]
+
+    @register_process('load_collection',required=['id'])
+    def load_collection(self,node):
+        defaultTimeStart = '1970-01-01'
+        defaultTimeEnd   = str(datetime.now()).split(' ')[0] # Today is the default date for timeEnd, to include all the dates if not specified
+        timeStart        = defaultTimeStart
+        timeEnd          = defaultTimeEnd
+        collection       = None
+        lowLat           = None
+        highLat          = None
+        lowLon           = None
+        highLon          = None
+        bands            = None # List of bands
+        resolutions      = None # Tuple
+        outputCrs        = None
+        resamplingMethod = None
+        polygon          = None
+        if 'bands' in node.arguments:
+            bands = node.arguments['bands']
+            if bands == []: bands = None
+
+        collection = node.arguments['id'] # The datacube we have to load
+        if collection is None:
+            raise Exception('[!] You must provide a collection which provides the data!')
+        self.sar2cubeCollection = ('SAR2Cube' in collection) # Return True if it's a SAR2Cube collection
+        self.collection = collection
+
+        if node.arguments['temporal_extent'] is not None:
+            timeStart  = node.arguments['temporal_extent'][0]
+            timeEnd    = node.arguments['temporal_extent'][1]
+
+        # If there is a bounding-box or a polygon we set the variables, otherwise we pass the defaults
+        if 'spatial_extent' in node.arguments and node.arguments['spatial_extent'] is not None:
+            if 'south' in node.arguments['spatial_extent'] and \
+               'north' in node.arguments['spatial_extent'] and \
+               'east'  in node.arguments['spatial_extent'] and \
+               'west'  in node.arguments['spatial_extent']:
+                lowLat     = node.arguments['spatial_extent']['south']
+                highLat    = node.arguments['spatial_extent']['north']
+                lowLon     = node.arguments['spatial_extent']['east']
+                highLon    = node.arguments['spatial_extent']['west']
+
+            elif 'coordinates' in node.arguments['spatial_extent']:
+                # Pass the GeoJSON geometry to odc and process it there
+                polygon = node.arguments['spatial_extent']
+
+        # Filters and resampling found in the graph by push_down_filters are applied directly in the ODC query
+        pushdown = self.pushdown.get(node.id,{})
+        if 'bands' in pushdown:
+            bands = pushdown['bands']
+        if 'temporal_extent' in pushdown:
+            timeStart, timeEnd = pushdown['temporal_extent']
+        if 'spatial_extent' in pushdown:
+            lowLat     = pushdown['spatial_extent']['south']
+            highLat    = pushdown['spatial_extent']['north']
+            lowLon     = pushdown['spatial_extent']['east']
+            highLon    = pushdown['spatial_extent']['west']
+        if 'resample' in pushdown:
+            resample = pushdown['resample']
+            if 'resolution' in resample:
+                res = resample['resolution']
+                if isinstance(res,float) or isinstance(res,int):
+                    resolutions = (res,res)
+                elif len(res) == 2:
+                    resolutions = (res[0],res[1])
                 else:
-                    dim = parent.dimension
-                    if dim in ['t','temporal','DATE'] and 'time' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].std('time')
-                    elif dim in ['bands'] and 'variable' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].std('variable')
-                    elif dim in ['x'] and 'x' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].std('x')
-                    elif dim in ['y'] and 'y' in self.partialResults[source].dims:
-                        self.partialResults[node.id] = self.partialResults[source].std('y')
+                    print('error')
+
+            if 'projection' in resample:
+                if resample['projection'] is not None:
+                    projection = resample['projection']
+                    if isinstance(projection,int):           # Check if it's an EPSG code and append 'epsg:' to it, without ODC returns an error
+                        ## TODO: make other projections available
+                        projection = 'epsg:' + str(projection)
                     else:
-                        self.partialResults[node.id] = self.partialResults[source]
-                        print('[!] Dimension {} not available in the current data.'.format(dim))
-                        
-            if processName == 'power':
-                dim = node.arguments['base']
-                if isinstance(node.arguments['base'],float) or isinstance(node.arguments['base'],int): # We have to distinguish when the input data is a number or a datacube from a previous process
-                    x = node.arguments['base']
-                else:
-                    x = self.partialResults[node.arguments['base']['from_node']]
-                self.partialResults[node.id] = (x**node.arguments['p']).astype(np.float32)
+                        print('This type of reprojection is not yet implemented')
+                    outputCrs = projection
 
-            if processName == 'absolute':
-                source = node.arguments['x']['from_node']
-                self.partialResults[node.id] = abs(self.partialResults[source])
+            if 'method' in resample:
+                resamplingMethod = resample['method']
+        if len(pushdown) > 0:
+            print('[*] Pushed down into the query of {}: {}'.format(node.id,', '.join(pushdown.keys())))
 
-            if processName == 'linear_scale_range':
-                parent = node.parent_process # I need to read the parent apply process
-                if 'from_node' in parent.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
-                else:
-                    print('ERROR')
-                inputMin = node.arguments['inputMin']
-                inputMax = node.arguments['inputMax']
-                outputMax = node.arguments['outputMax']
-                outputMin = 0
-                if 'outputMin' in node.arguments:
-                    outputMin = node.arguments['outputMin']
-                try:
-                    tmp = self.partialResults[source].clip(inputMin,inputMax)
-                except:
-                    try:
-                        tmp = self.partialResults[source].compute()
-                        tmp = tmp.clip(inputMin,inputMax)
-                    except Exception as e:
-                        raise e
-                self.partialResults[node.id] = ((tmp - inputMin) / (inputMax - inputMin)) * (outputMax - outputMin) + outputMin
-
-            if processName == 'clip':
-                parent = node.parent_process # I need to read the parent apply process
-                if 'from_node' in parent.arguments['data']:
-                    source = node.parent_process.arguments['data']['from_node']
+        odc = Odc(collections=collection,timeStart=timeStart,timeEnd=timeEnd,bands=bands,lowLat=lowLat,highLat=highLat,lowLon=lowLon,highLon=highLon,resolutions=resolutions,outputCrs=outputCrs,polygon=polygon,resamplingMethod=resamplingMethod,cache=resultCache,chunkLayout=self.chunkPlan.get(node.id,SPATIAL),previewSize=self.previewSize if resolutions is None and node.id not in self.nativeResolution else None,indexFolder=TMP_FOLDER_PATH + 'SAR2CUBE_INDEX/')
+        if len(odc.data) == 0:
+            raise Exception("load_collection returned an empty dataset, please check the requested bands, spatial and temporal extent.")
+        self.partialResults[node.id] = odc.data.to_array()
+        self.continuousBands = self.continuousBands and odc.continuous
+        if odc.cacheWrite is not None:
+            self.cacheWrites.append(odc.cacheWrite)
+        self.crs = odc.data.crs             # We store the data CRS separately, because it's a metadata we may lose it in the processing
+        print(self.partialResults[node.id]) # The loaded data, stored in a dictionary with the id of the node that has generated it
+
+    @register_process('resample_spatial',required=['data'])
+    def resample_spatial(self,node):
+        # The resampling is applied in the load_collection query by push_down_filters
+        source = node.arguments['data']['from_node']
+        self.partialResults[node.id] = self.partialResults[source]
+
+    @register_process('resample_cube_spatial',required=['data','target'],optional={'method':None})
+    def resample_cube_spatial(self,node):
+        target = node.arguments['target']['from_node']
+        source = node.arguments['data']['from_node']
+        method = node.arguments['method']
+        if method is None:
+            method = 'nearest'
+        if method == 'near':
+            method = 'nearest'
+        try:
+            import odc.algo
+            if self.lazy:
+                self.partialResults[node.id] = odc.algo._warp.xr_reproject(self.partialResults[source],self.partialResults[target].geobox,resampling=method)
+            else:
+                self.partialResults[node.id] = self.materialize(node,odc.algo._warp.xr_reproject(self.materialize(node,self.partialResults[source]),self.partialResults[target].geobox,resampling=method))
+        except Exception as e:
+            print(e)
+            try:
+                # rioxarray loads the data in memory to reproject it
+                self.partialResults[node.id] = self.materialize(node,self.partialResults[source]).rio.reproject_match(self.partialResults[target],resampling=method)
+            except Exception as e:
+                raise Exception("ODC Error in process: ",node.process_id,'\n Full Python log:\n',str(e))
+
+    @register_process('resample_cube_temporal',required=['data','target'],optional={'valid_within':None,'mode':'nearest'})
+    def resample_cube_temporal(self,node):
+        # mode: 'nearest' date of data for every date of target, or the nearest 'before' or 'after' it (not later/earlier)
+        # valid_within: maximum distance in days, the dates of target without a date of data within it are set to nan
+        target = node.arguments['target']['from_node']
+        source = node.arguments['data']['from_node']
+        mode = node.arguments['mode']
+        sourceCube = self.partialResults[source]
+        if not sourceCube.indexes['time'].is_monotonic_increasing:
+            sourceCube = sourceCube.sortby('time')
+        sourceTimes = sourceCube.time.values
+        targetTimes = self.partialResults[target].time.values
+
+        index, valid = match_dates(sourceTimes,targetTimes,mode,node.arguments['valid_within'])
+
+        result = sourceCube.isel(time=index).assign_coords(time=targetTimes)
+        if not valid.all():
+            result = result.where(xr.DataArray(valid,dims='time',coords={'time': targetTimes}))
+        self.partialResults[node.id] = result
+
+    @register_process('multiply','divide','subtract','add','lt','lte','gt','gte','eq','neq')
+    def binary_operation(self,node):
+        processName = node.process_id
+        x = None
+        y = None
+        if 'x' in node.arguments and node.arguments['x'] is not None:
+            x = self.get_value(node,'x')
+        if 'y' in node.arguments and node.arguments['y'] is not None:
+            y = self.get_value(node,'y')
+
+        if processName == 'multiply':
+            if x is None or y is None:
+                raise Exception(MultiplicandMissing)
+            self.partialResults[node.id] = self.arithmetic(node,lambda x,y: x * y,x,y)
+        elif processName == 'divide':
+            if (isinstance(y,float) or isinstance(y,int)) and y==0:
+                raise Exception(DivisionByZero)
+            self.partialResults[node.id] = self.arithmetic(node,lambda x,y: x / y,x,y)
+        elif processName == 'subtract':
+            self.partialResults[node.id] = self.arithmetic(node,lambda x,y: x - y,x,y)
+        elif processName == 'add':
+            self.partialResults[node.id] = self.arithmetic(node,lambda x,y: x + y,x,y)
+        elif processName == 'lt':
+            self.partialResults[node.id] = x < y
+        elif processName == 'lte':
+            self.partialResults[node.id] = x <= y
+        elif processName == 'gt':
+            self.partialResults[node.id] = x > y
+        elif processName == 'gte':
+            self.partialResults[node.id] = x >= y
+        elif processName == 'eq':
+            self.partialResults[node.id] = x == y
+        elif processName == 'neq':
+            self.partialResults[node.id] = x != y
+
+    def arithmetic(self,node,operation,x,y):
+        try:
+            return operation(x,y).astype(np.float32)
+        except Exception as e:
+            print(e)
+        if self.lazy:
+            # Mixing Dask and numpy backed data can fail, we convert both operands to Dask arrays
+            try:
+                if hasattr(x,'chunk'):
+                    x = x.chunk()
+                if hasattr(y,'chunk'):
+                    y = y.chunk()
+                return operation(x,y).astype(np.float32)
+            except Exception as e:
+                print(e)
+        if hasattr(x,'chunks'):
+            x = self.materialize(node,x)
+        if hasattr(y,'chunks'):
+            y = self.materialize(node,y)
+        return operation(x,y).astype(np.float32).chunk()
+
+    def clip_data(self,node,data,minValue,maxValue,fillValue=None):
+        try:
+            return data.clip(minValue,maxValue)
+        except Exception as e:
+            print(e)
+        if self.lazy:
+            # np.clip applied chunk by chunk keeps the data lazy
+            return xr.apply_ufunc(np.clip,data,minValue,maxValue,dask='parallelized',output_dtypes=[data.dtype])
+        data = self.materialize(node,data)
+        if fillValue is not None:
+            return data.fillna(fillValue).clip(minValue,maxValue).chunk()
+        return data.clip(minValue,maxValue)
+
+    @register_process('not',required=['x'])
+    def logical_not(self,node):
+        self.partialResults[node.id] = np.logical_not(self.get_value(node,'x'))
+
+    @register_process('sum','product',required=['data'])
+    def sum_product(self,node):
+        processName = node.process_id
+        parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
+        if parent.content['process_id'] == 'aggregate_spatial_window':
+            source = node.arguments['data']['from_node']
+            xDim, yDim = parent.content['arguments']['size']
+            coarsened = self.partialResults[source].coarsen(x=xDim,y=yDim,boundary = 'pad')
+            self.partialResults[node.id] = coarsened.sum() if processName == 'sum' else coarsened.prod()
+        else:
+            x = 0
+            for i,d in enumerate(node.arguments['data']):
+                if isinstance(d,float) or isinstance(d,int):         # We have to distinguish when the input data is a number or a datacube from a previous process
+                    x = d
                 else:
-                    print('ERROR')
-                outputMax = node.arguments['max']
-                outputMin = 0
-                if 'min' in node.arguments:
-                    outputMin = node.arguments['min']
-                try:
-                    tmp = self.partialResults[source].clip(outputMin,outputMax)
-                except:
-                    try:
-                        tmp = self.partialResults[source].compute()
-                        tmp = tmp.fillna(0).clip(outputMin,outputMax).chunk()
-                    except Exception as e:
-                        raise e
-                self.partialResults[node.id] = tmp
-
-            if processName == 'filter_temporal':
-                timeStart = node.arguments['extent'][0]
-                timeEnd = node.arguments['extent'][1]
-                if len(timeStart.split('T')) > 1:                # xarray slicing operation doesn't work with dates in the format 2017-05-01T00:00:00Z but only 2017-05-01
-                    timeStart = timeStart.split('T')[0]
-                if len(timeEnd.split('T')) > 1:
-                    timeEnd = timeEnd.split('T')[0]
-                source = node.arguments['data']['from_node']
-                self.partialResults[node.id] = self.partialResults[source].loc[dict(time=slice(timeStart,timeEnd))]
-
-            if processName == 'filter_bands':
-                bandsToKeep = node.arguments['bands']
-                source = node.arguments['data']['from_node']
-                self.partialResults[node.id]  = self.partialResults[source].loc[dict(variable=bandsToKeep)]
-
-            if processName == 'rename_labels':
-                source = node.arguments['data']['from_node']
-                # We need to create a new dataset, with time dimension if present.
-                if 'time' in self.partialResults[source].coords:
-                    tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x,'time':self.partialResults[source].time})
+                    x = self.partialResults[self.get_source(node,d)]
+                if i==0: self.partialResults[node.id] = x
+                elif processName == 'sum': self.partialResults[node.id] += x
+                else: self.partialResults[node.id] *= x
+
+    @register_process('sqrt',required=['x'])
+    def sqrt(self,node):
+        self.partialResults[node.id] = np.sqrt(self.get_value(node,'x'))
+
+    @register_process('and',required=['x','y'])
+    def logical_and(self,node):
+        x = node.arguments['x']['from_node']
+        y = node.arguments['y']['from_node']
+        self.partialResults[node.id] = np.bitwise_and(self.partialResults[x],self.partialResults[y])
+
+    @register_process('or',required=['x','y'])
+    def logical_or(self,node):
+        x = node.arguments['x']['from_node']
+        y = node.arguments['y']['from_node']
+        self.partialResults[node.id] = np.bitwise_or(self.partialResults[x],self.partialResults[y])
+
+    @register_process('array_element',required=['data'])
+    def array_element(self,node):
+        source = self.get_source(node,node.arguments['data'])
+        if source is None:
+            print('ERROR')
+        noLabel = 1
+        if 'label' in node.arguments:
+            if node.arguments['label'] is not None:
+                bandLabel = node.arguments['label']
+                noLabel = 0
+                self.partialResults[node.id] = self.partialResults[source].loc[dict(variable=bandLabel)].drop('variable')
+        if 'index' in node.arguments and noLabel:
+            index = node.arguments['index']
+            self.partialResults[node.id] = self.partialResults[source][index]
+
+    @register_process('normalized_difference',required=['x','y'])
+    def normalized_difference(self,node):
+        def normalized_difference(x,y):
+            return (x-y)/(x+y)
+        xSource = (node.arguments['x']['from_node'])
+        ySource = (node.arguments['y']['from_node'])
+        self.partialResults[node.id] = normalized_difference(self.partialResults[xSource],self.partialResults[ySource])
+
+    @register_process('reduce_dimension','aggregate_spatial_window',required=['reducer'])
+    def reduce_dimension(self,node):
+        # The reduction has already been computed by the last node of the reducer child graph
+        source = node.arguments['reducer']['from_node']
+        self.partialResults[node.id] = self.partialResults[source]
+
+    @register_process('max','min','mean','median','sd',required=['data'])
+    def reducer(self,node):
+        processName = node.process_id
+        method = {'max':'max','min':'min','mean':'mean','median':'median','sd':'std'}[processName]
+        parent = node.parent_process # I need to read the parent reducer process to see along which dimension take the mean
+        source = self.get_source(node,node.arguments['data'])
+        if source is None:
+            print('ERROR')
+        data = self.partialResults[source]
+        if processName in ['mean','median']:
+            data = data.astype(np.float32)
+        if parent.content['process_id'] == 'aggregate_spatial_window':
+            xDim, yDim = parent.content['arguments']['size']
+            ## TODO get pad, trim parameter from arguments
+            self.partialResults[node.id] = getattr(data.coarsen(x=xDim,y=yDim,boundary = 'pad'),method)()
+        else:
+            dim = parent.dimension
+            if dim in ['t','temporal','DATE'] and 'time' in data.dims:
+                self.partialResults[node.id] = getattr(data,method)('time')
+            elif dim in ['bands'] and 'variable' in data.dims:
+                self.partialResults[node.id] = getattr(data,method)('variable')
+            elif dim in ['x'] and 'x' in data.dims:
+                self.partialResults[node.id] = getattr(data,method)('x')
+            elif dim in ['y'] and 'y' in data.dims:
+                self.partialResults[node.id] = getattr(data,method)('y')
+            else:
+                self.partialResults[node.id] = data
+                print('[!] Dimension {} not available in the current data.'.format(dim))
+
+    @register_process('power',required=['base','p'])
+    def power(self,node):
+        if isinstance(node.arguments['base'],float) or isinstance(node.arguments['base'],int): # We have to distinguish when the input data is a number or a datacube from a previous process
+            x = node.arguments['base']
+        else:
+            x = self.partialResults[node.arguments['base']['from_node']]
+        self.partialResults[node.id] = (x**node.arguments['p']).astype(np.float32)
+
+    @register_process('absolute',required=['x'])
+    def absolute(self,node):
+        source = node.arguments['x']['from_node']
+        self.partialResults[node.id] = abs(self.partialResults[source])
+
+    @register_process('linear_scale_range',required=['inputMin','inputMax','outputMax'],optional={'outputMin':0})
+    def linear_scale_range(self,node):
+        parent = node.parent_process # I need to read the parent apply process
+        if 'from_node' in parent.arguments['data']:
+            source = node.parent_process.arguments['data']['from_node']
+        else:
+            print('ERROR')
+        inputMin = node.arguments['inputMin']
+        inputMax = node.arguments['inputMax']
+        outputMax = node.arguments['outputMax']
+        outputMin = node.arguments['outputMin']
+        tmp = self.clip_data(node,self.partialResults[source],inputMin,inputMax)
+        self.partialResults[node.id] = ((tmp - inputMin) / (inputMax - inputMin)) * (outputMax - outputMin) + outputMin
+
+    @register_process('clip',required=['max'],optional={'min':0})
+    def clip(self,node):
+        parent = node.parent_process # I need to read the parent apply process
+        if 'from_node' in parent.arguments['data']:
+            source = node.parent_process.arguments['data']['from_node']
+        else:
+            print('ERROR')
+        outputMax = node.arguments['max']
+        outputMin = node.arguments['min']
+        self.partialResults[node.id] = self.clip_data(node,self.partialResults[source],outputMin,outputMax,fillValue=0)
+
+    @register_process('filter_temporal',required=['data','extent'])
+    def filter_temporal(self,node):
+        timeStart = node.arguments['extent'][0]
+        timeEnd = node.arguments['extent'][1]
+        if len(timeStart.split('T')) > 1:                # xarray slicing operation doesn't work with dates in the format 2017-05-01T00:00:00Z but only 2017-05-01
+            timeStart = timeStart.split('T')[0]
+        if len(timeEnd.split('T')) > 1:
+            timeEnd = timeEnd.split('T')[0]
+        source = node.arguments['data']['from_node']
+        self.partialResults[node.id] = self.partialResults[source].loc[dict(time=slice(timeStart,timeEnd))]
+
+    @register_process('filter_bbox',required=['data','extent'])
+    def filter_bbox(self,node):
+        source = node.arguments['data']['from_node']
+        data = self.partialResults[source]
+        if radar_geometry(data):
+            # Also when pushed down into the query: it may have been merged with other boxes, or not applied at all
+            self.partialResults[node.id] = self.clip_radar_bbox(data,node.arguments['extent'])
+            return
+        self.partialResults[node.id] = self.clip_bbox(data,node.arguments['extent'])
+
+    def clip_radar_bbox(self,data,extent):
+        # Data in radar geometry has no projected coordinates: the pixels inside the bounding box are found with the
+        # geolocation grid, the data is reduced to the window containing them and masked outside of the bounding box
+        west, south, east, north = extent['west'], extent['south'], extent['east'], extent['north']
+        bboxCrs = extent['crs'] if extent.get('crs') is not None else 4326
+        if isinstance(bboxCrs,int):
+            bboxCrs = 'epsg:' + str(bboxCrs)
+        if str(bboxCrs).lower() != 'epsg:4326':
+            transformer = Transformer.from_crs(bboxCrs,'epsg:4326',always_xy=True)
+            lons, lats = transformer.transform([west,east,west,east],[south,south,north,north])
+            west, south, east, north = min(lons), min(lats), max(lons), max(lats)
+        gridLon = data.loc[dict(variable='grid_lon')]
+        gridLat = data.loc[dict(variable='grid_lat')]
+        if 'time' in gridLon.dims:
+            gridLon = gridLon.isel(time=0)
+            gridLat = gridLat.isel(time=0)
+        inside = ((gridLon > west) & (gridLon < east) & (gridLat > south) & (gridLat < north)).compute()
+        yDim, xDim = inside.dims
+        rows = np.nonzero(inside.any(xDim).values)[0]
+        cols = np.nonzero(inside.any(yDim).values)[0]
+        if len(rows) == 0 or len(cols) == 0:
+            raise Exception("[!] The bounding box doesn't intersect the data.")
+        window = {yDim: slice(rows[0],rows[-1] + 1), xDim: slice(cols[0],cols[-1] + 1)}
+        return data.isel(window).where(inside.isel(window))
+
+    def clip_bbox(self,data,extent):
+        # Returns the window of the data inside the bounding box, given in lat/lon or in extent['crs']
+        bboxCrs = extent['crs'] if extent.get('crs') is not None else 4326
+        if isinstance(bboxCrs,int):
+            bboxCrs = 'epsg:' + str(bboxCrs)
+        transformer = Transformer.from_crs(bboxCrs,data_crs(data),always_xy=True)
+        xs, ys = transformer.transform([extent['west'],extent['east'],extent['west'],extent['east']],[extent['south'],extent['south'],extent['north'],extent['north']])
+        # Slicing a contiguous window, cheap also on lazy data and independent of the coordinates order
+        xIndex = np.where((data.x >= min(xs)) & (data.x <= max(xs)))[0]
+        yIndex = np.where((data.y >= min(ys)) & (data.y <= max(ys)))[0]
+        if len(xIndex) == 0 or len(yIndex) == 0:
+            raise Exception("[!] The bounding box doesn't intersect the data.")
+        return data.isel(x=slice(xIndex[0],xIndex[-1] + 1),y=slice(yIndex[0],yIndex[-1] + 1))
+
+    @register_process('filter_bands',required=['data','bands'])
+    def filter_bands(self,node):
+        bandsToKeep = node.arguments['bands']
+        source = node.arguments['data']['from_node']
+        self.partialResults[node.id]  = self.partialResults[source].loc[dict(variable=bandsToKeep)]
+
+    @register_process('rename_labels',required=['data','target'],optional={'source':[]})
+    def rename_labels(self,node):
+        source = node.arguments['data']['from_node']
+        # We need to create a new dataset, with time dimension if present.
+        if 'time' in self.partialResults[source].coords:
+            tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x,'time':self.partialResults[source].time})
+        else:
+            tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x})
+        for i in range(len(node.arguments['target'])):
+            label_target = node.arguments['target'][i]
+            if (len(node.arguments['source']))>0:
+                label_source = node.arguments['source'][i]
+                tmp = tmp.assign({label_target:self.partialResults[source].loc[dict(variable=label_source)]})
+            else:
+                if 'variable' in self.partialResults[source].coords:
+                    tmp = tmp.assign({label_target:self.partialResults[source][i]})
                 else:
-                    tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x})
-                for i in range(len(node.arguments['target'])):
-                    label_target = node.arguments['target'][i]
-                    if (len(node.arguments['source']))>0:
-                        label_source = node.arguments['source'][i]
-                        tmp = tmp.assign({label_target:self.partialResults[source].loc[dict(variable=label_source)]})
-                    else:
-                        if 'variable' in self.partialResults[source].coords:
-                            tmp = tmp.assign({label_target:self.partialResults[source][i]})
-                        else:
-                            tmp = tmp.assign({label_target:self.partialResults[source]})
-                self.partialResults[node.id] = tmp.to_array()
-
-            if processName == 'add_dimension':
-                source = node.arguments['data']['from_node']
-                try:
-                    len(self.partialResults[source].coords['time'])
-                    tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x,'time':self.partialResults[source].time})
-                except:
-                    tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x})
-                label_target = node.arguments['label']
-                tmp = tmp.assign({label_target:self.partialResults[source]})
-                self.partialResults[node.id] = tmp.to_array()
-
-            if processName == 'merge_cubes':
-                # x,y,t + x,y (requires overlap resolver)
-                # x,y,bands + x,y (requires overlap resolver)
-                # x,y,t,bands + x,y (requires overlap resolver)
-                # x,y,t,bands + x,y,bands falls into multiple categories. Depending on how the bands are structured. If they have the same bands, they need an overlap resolver. Bands that do only exist in one the cubes, get concatenated.
-                
-                ## dimensions check
-                cube1 = node.arguments['cube1']['from_node']
-                cube2 = node.arguments['cube2']['from_node']
-                cube1_dims = self.partialResults[cube1].dims
-                cube2_dims = self.partialResults[cube2].dims
-                #dimensions are x, y, time, variable.
-                if hasattr(cube1,'chunks') or hasattr(cube2,'chunks'):
-                    # We need to re-chunk the data to avoid errors merging chunked and not chunked data
-                    cube1 = cube1.chunk()
-                    cube2 = cube2.chunk()
-                print("dimensions are x, y, time, variable.")
-                if cube1_dims == cube2_dims:
-                    # We need to check if they have bands
-                    if 'variable' in cube1_dims and 'variable' in cube2_dims:
-                        # We need to check if the bands are different or there are some common ones
-                        print("We need to check if the bands are different or there are some common ones")
-                        cube1_bands = self.partialResults[cube1]['variable'].values
-                        cube2_bands = self.partialResults[cube2]['variable'].values
-                        # Simple case: same bands in both datacubes
-                        print("Simple case: same bands in both datacubes")
-                        if (cube1_bands == cube2_bands).all():
-                            print("We need to check if the timestep are different, if yes we can merge directly")
-                            if (self.partialResults[cube1].time.values != self.partialResults[cube2].time.values).all():
-                                self.partialResults[node.id] = xr.concat([self.partialResults[cube1],self.partialResults[cube2]],dim='time')
-                            else:
-                                #Overlap resolver required
-                                print("Overlap resolver required")
-                                if 'overlap_resolver' in node.arguments:
-                                    if 'from_node' in node.arguments['overlap_resolver']:
-                                        source = node.arguments['overlap_resolver']['from_node']
-                                        self.partialResults[node.id] = self.partialResults[source]
-                                    else:
-                                        raise Exception(OverlapResolverMissing)
-                                else:
-                                    raise Exception(OverlapResolverMissing)
-                        else:
-                            #Check if at least one band is in common
-                            print("Check if at least one band is in common")
-                            common_band = False
-                            for v in cube1_bands:
-                                if v in cube2_bands: common_band=True
-                            if common_band:
-                                #Complicate case where overlap_resolver has to be appliead only on one or some bands
-                                print("Complicate case where overlap_resolver has to be appliead only on one or some bands")
-                                raise Exception("[!] Trying to merge two datacubes with one or more common bands, not supported yet!")
-                            else:
-                                #Simple case where all the bands are different and we can just concatenate the datacubes without overlap resolver
-                                print("Simple case where all the bands are different and we can just concatenate the datacubes without overlap resolver")
-                                ds1 = self.partialResults[cube1]
-                                ds2 = self.partialResults[cube2]
-                                self.partialResults[node.id] = xr.concat([ds1,ds2],dim='variable')
+                    tmp = tmp.assign({label_target:self.partialResults[source]})
+        self.partialResults[node.id] = tmp.to_array()
+
+    @register_process('add_dimension',required=['data','label'])
+    def add_dimension(self,node):
+        source = node.arguments['data']['from_node']
+        try:
+            len(self.partialResults[source].coords['time'])
+            tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x,'time':self.partialResults[source].time})
+        except:
+            tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x})
+        label_target = node.arguments['label']
+        tmp = tmp.assign({label_target:self.partialResults[source]})
+        self.partialResults[node.id] = tmp.to_array()
+
+    @register_process('merge_cubes',required=['cube1','cube2'])
+    def merge_cubes(self,node):
+        # x,y,t + x,y (requires overlap resolver)
+        # x,y,bands + x,y (requires overlap resolver)
+        # x,y,t,bands + x,y (requires overlap resolver)
+        # x,y,t,bands + x,y,bands falls into multiple categories. Depending on how the bands are structured. If they have the same bands, they need an overlap resolver. Bands that do only exist in one the cubes, get concatenated.
+
+        ## dimensions check
+        cube1 = node.arguments['cube1']['from_node']
+        cube2 = node.arguments['cube2']['from_node']
+        cube1_dims = self.partialResults[cube1].dims
+        cube2_dims = self.partialResults[cube2].dims
+        #dimensions are x, y, time, variable.
+        if hasattr(cube1,'chunks') or hasattr(cube2,'chunks'):
+            # We need to re-chunk the data to avoid errors merging chunked and not chunked data
+            cube1 = cube1.chunk()
+            cube2 = cube2.chunk()
+        print("dimensions are x, y, time, variable.")
+        if cube1_dims == cube2_dims:
+            # We need to check if they have bands
+            if 'variable' in cube1_dims and 'variable' in cube2_dims:
+                # We need to check if the bands are different or there are some common ones
+                print("We need to check if the bands are different or there are some common ones")
+                cube1_bands = self.partialResults[cube1]['variable'].values
+                cube2_bands = self.partialResults[cube2]['variable'].values
+                # Simple case: same bands in both datacubes
+                print("Simple case: same bands in both datacubes")
+                if (cube1_bands == cube2_bands).all():
+                    print("We need to check if the timestep are different, if yes we can merge directly")
+                    if (self.partialResults[cube1].time.values != self.partialResults[cube2].time.values).all():
+                        self.partialResults[node.id] = xr.concat([self.partialResults[cube1],self.partialResults[cube2]],dim='time')
                     else:
-                        # We don't have bands, dimensions are either x,y or x,y,t for both datacubes
-                        print("We don't have bands, dimensions are either x,y or x,y,t for both datacubes")
-                        if 'time' in cube1_dims:
-                            # TODO: check if the timesteps are the same, if yes use overlap resolver
-                            cube1_time = self.partialResults[cube1].time.values
-                            cube2_time = self.partialResults[cube2].time.values
-                            if (cube1_time == cube2_time).all():
-                                #Overlap resolver required
-                                print("Overlap resolver required")
-                                if 'overlap_resolver' in node.arguments:
-                                    try:
-                                        source = node.arguments['overlap_resolver']['from_node']
-                                        self.partialResults[node.id] = self.partialResults[source]
-                                    except:
-                                        raise Exception(OverlapResolverMissing)
-                                else:
-                                    raise Exception(OverlapResolverMissing)
-                            ## TODO: Case when only some timesteps are the same
-                            ## TODO: Case when no timesteps are in common
-                        else:
-                            # We have only x,y (or maybe only x or only y)
-                            print("We have only x,y (or maybe only x or only y)")
-                            # Overlap resolver required
-                            if 'overlap_resolver' in node.arguments and 'from_node' in node.arguments['overlap_resolver']:
+                        #Overlap resolver required
+                        print("Overlap resolver required")
+                        if 'overlap_resolver' in node.arguments:
+                            if 'from_node' in node.arguments['overlap_resolver']:
                                 source = node.arguments['overlap_resolver']['from_node']
                                 self.partialResults[node.id] = self.partialResults[source]
                             else:
                                 raise Exception(OverlapResolverMissing)
+                        else:
+                            raise Exception(OverlapResolverMissing)
                 else:
-                    # CASE x,y,t + x,y (requires overlap resolver)
-                    if 'time' in cube1_dims or 'time' in cube2_dims:
-                            if 'x' and 'y' in cube1_dims and 'x' and 'y' in cube2_dims:
-                                # We need to check if they have bands, if yes is still not possible
-                                if 'variable' not in cube1_dims and 'variable' not in cube2_dims:
-                                    #Overlap resolver required
-                                    print("Overlap resolver required")
-                                    if 'overlap_resolver' in node.arguments and 'from_node' in node.arguments['overlap_resolver']:
-                                        source = node.arguments['overlap_resolver']['from_node']
-                                        self.partialResults[node.id] = self.partialResults[source]
-                                    else:
-                                        raise Exception(OverlapResolverMissing)
-                                else:
-                                    raise Exception("[!] Trying to merge two datacubes with different dimensions, not supported yet!")
+                    #Check if at least one band is in common
+                    print("Check if at least one band is in common")
+                    common_band = False
+                    for v in cube1_bands:
+                        if v in cube2_bands: common_band=True
+                    if common_band:
+                        #Complicate case where overlap_resolver has to be appliead only on one or some bands
+                        print("Complicate case where overlap_resolver has to be appliead only on one or some bands")
+                        raise Exception("[!] Trying to merge two datacubes with one or more common bands, not supported yet!")
                     else:
-                        cube1 = node.arguments['cube1']['from_node']
-                        cube2 = node.arguments['cube2']['from_node']
+                        #Simple case where all the bands are different and we can just concatenate the datacubes without overlap resolver
+                        print("Simple case where all the bands are different and we can just concatenate the datacubes without overlap resolver")
                         ds1 = self.partialResults[cube1]
                         ds2 = self.partialResults[cube2]
                         self.partialResults[node.id] = xr.concat([ds1,ds2],dim='variable')
-
-                    #raise Exception("[!] Trying to merge two datacubes with different dimensions, not supported yet!")
-                
-#                 if 'overlap_resolver' in node.arguments and 'from_node' in node.arguments['overlap_resolver']:
-#                         source = node.arguments['overlap_resolver']['from_node']
-#                         self.partialResults[node.id] = self.partialResults[source]
-#                 else:
-#                     cube1 = node.arguments['cube1']['from_node']
-#                     cube2 = node.arguments['cube2']['from_node']
-#                     ds1 = self.partialResults[cube1]
-#                     ds2 = self.partialResults[cube2]
-#                     print('++++',ds1)
-#                     print('++++',ds2)
-#                     self.partialResults[node.id] = xr.concat([ds1,ds2],dim='variable')
-#                     print(self.partialResults[node.id])
-                
-#                 if 'time' in self.partialResults[source].coords:
-#                         tmp = xr.Dataset(coords={'t':self.partialResults[source].time.values,'y':self.partialResults[source].y,'x':self.partialResults[source].x})
-#                         if 'variable' in self.partialResults[source].coords:
-#                             try:
-#                                 for var in self.partialResults[source]['variable'].values:
-#                                     tmp[str(var)] = (('t','y','x'),self.partialResults[source].loc[dict(variable=var)])
-#                             except Exception as e:
-#                                 print(e)
-#                                 tmp[str((self.partialResults[source]['variable'].values))] = (('t','y','x'),self.partialResults[source])
-#                         else:
-#                             tmp['result'] = (('t','y','x'),self.partialResults[source])
-#                     else:
-#                         tmp = xr.Dataset(coords={'y':self.partialResults[source].y,'x':self.partialResults[source].x})
-#                         if 'variable' in self.partialResults[source].coords:
-#                             try:
-#                                 for var in self.partialResults[source]['variable'].values:
-#                                     tmp[str(var)] = (('y','x'),self.partialResults[source].loc[dict(variable=var)])
-#                             except:
-#                                 tmp[str((self.partialResults[source]['variable'].values))] = (('y','x'),self.partialResults[source])
-#                         else:
-#                             tmp['result'] = (('y','x'),self.partialResults[source])
-                
-            if processName == 'if':
-                acceptVal = None
-                rejectVal = None
-                valueVal  = None
-                if isinstance(node.arguments['reject'],float) or isinstance(node.arguments['reject'],int):
-                    rejectVal = node.arguments['reject']
-                else:   
-                    reject = node.arguments['reject']['from_node']
-                    rejectVal = self.partialResults[reject]
-                if isinstance(node.arguments['accept'],float) or isinstance(node.arguments['accept'],int):
-                    acceptVal = node.arguments['accept']
-                else:   
-                    accept = node.arguments['accept']['from_node']
-                    acceptVal = self.partialResults[accept]
-                if isinstance(node.arguments['value'],float) or isinstance(node.arguments['value'],int):
-                    valueVal = node.arguments['value']
-                else:   
-                    value = node.arguments['value']['from_node']
-                    valueVal = self.partialResults[value]         
-
-                tmpAccept = valueVal * acceptVal
-                tmpReject = xr.ufuncs.logical_not(valueVal) * rejectVal
-                self.partialResults[node.id] = tmpAccept + tmpReject     
-
-            if processName == 'apply':
-                source = node.arguments['process']['from_node']
-                self.partialResults[node.id] = self.partialResults[source]
-
-            if processName == 'mask':
-                maskSource = node.arguments['mask']['from_node']
-                dataSource = node.arguments['data']['from_node']
-                # If the mask has a variable dimension, it will keep only the values of the input with the same variable name.
-                # Solution is to take the min over the variable dim to drop that dimension. (Problems if there are more than 1 band/variable)
-                if 'variable' in self.partialResults[maskSource].dims:
-                    mask = self.partialResults[maskSource].min(dim='variable')
-                else:
-                    mask = self.partialResults[maskSource]
-                self.partialResults[node.id] = self.partialResults[dataSource].where(xr.ufuncs.logical_not(mask))
-                if 'replacement' in node.arguments:
-                    burnValue  = node.arguments['replacement']
-                    self.partialResults[node.id] = self.partialResults[node.id].fillna(burnValue)
-            
-            if processName == 'climatological_normal':
-                source             = node.arguments['data']['from_node']
-                frequency          = node.arguments['frequency']
-                if 'climatology_period' in node.arguments:
-                    climatology_period = node.arguments['climatology_period']
-                    # Perform a filter_temporal and then compute the mean over a monthly period
-                    timeStart = climatology_period[0]
-                    timeEnd   = climatology_period[1]
-                    if len(timeStart.split('T')) > 1:         # xarray slicing operation doesn't work with dates in the format 2017-05-01T00:00:00Z but only 2017-05-01
-                        timeStart = timeStart.split('T')[0]
-                    if len(timeEnd.split('T')) > 1:
-                        timeEnd = timeEnd.split('T')[0]
-                    tmp = self.partialResults[source].loc[dict(time=slice(timeStart,timeEnd))]
-                else:
-                    tmp = self.partialResults[source]
-                if frequency=='monthly':
-                    freq = 'time.month'
-                else:
-                    freq = None
-                self.partialResults[node.id] = tmp.groupby(freq).mean("time")
-
-            if processName == 'anomaly':
-                source    = node.arguments['data']['from_node']
-                normals   = node.arguments['normals']['from_node']
-                frequency = node.arguments['frequency']
-                if frequency=='monthly':
-                    freq = 'time.month'
+            else:
+                # We don't have bands, dimensions are either x,y or x,y,t for both datacubes
+                print("We don't have bands, dimensions are either x,y or x,y,t for both datacubes")
+                if 'time' in cube1_dims:
+                    # TODO: check if the timesteps are the same, if yes use overlap resolver
+                    cube1_time = self.partialResults[cube1].time.values
+                    cube2_time = self.partialResults[cube2].time.values
+                    if (cube1_time == cube2_time).all():
+                        #Overlap resolver required
+                        print("Overlap resolver required")
+                        if 'overlap_resolver' in node.arguments:
+                            try:
+                                source = node.arguments['overlap_resolver']['from_node']
+                                self.partialResults[node.id] = self.partialResults[source]
+                            except:
+                                raise Exception(OverlapResolverMissing)
+                        else:
+                            raise Exception(OverlapResolverMissing)
+                    ## TODO: Case when only some timesteps are the same
+                    ## TODO: Case when no timesteps are in common
                 else:
-                    freq = None
-                self.partialResults[node.id] = (self.partialResults[source].groupby(freq) - self.partialResults[normals]).drop('month')
-
-            if processName == 'apply_kernel':
-                def convolve(data, kernel, mode='constant', cval=0, fill_value=0):
-                    dims = ('x','y')
-                #   scipy.ndimage.convolve(input, weights, output=None, mode='reflect', cval=0.0, origin=0)
-                    convolved = lambda data: scipy.ndimage.convolve(data, kernel, mode=mode, cval=cval)
-
-                    data_masked = data.fillna(fill_value)
-
-                    return xr.apply_ufunc(convolved, data_masked,
-                                          vectorize=True,
-                                          dask='parallelized',
-                                          input_core_dims = [dims],
-                                          output_core_dims = [dims],
-                                          output_dtypes=[data.dtype],
-                                          dask_gufunc_kwargs={'allow_rechunk':True})
-
-                kernel = np.array(node.arguments['kernel'])
-                factor = node.arguments['factor']
-                fill_value = 0
-                source = node.arguments['data']['from_node']
-                openeo_scipy_modes = {'replicate':'nearest','reflect':'reflect','reflect_pixel':'mirror','wrap':'wrap'}
-                if 'replace_invalid' in node.arguments:
-                    fill_value = node.arguments['replace_invalid']
-                if 'border' in node.arguments:
-                    if isinstance(node.arguments['border'],int) or isinstance(node.arguments['border'],float):
-                        mode = 'constant'
-                        cval = node.arguments['border']
+                    # We have only x,y (or maybe only x or only y)
+                    print("We have only x,y (or maybe only x or only y)")
+                    # Overlap resolver required
+                    if 'overlap_resolver' in node.arguments and 'from_node' in node.arguments['overlap_resolver']:
+                        source = node.arguments['overlap_resolver']['from_node']
+                        self.partialResults[node.id] = self.partialResults[source]
                     else:
-                        mode_openeo = node.arguments['border']
-                        mode = openeo_scipy_modes[mode_openeo]
-                        cval = 0
-                self.partialResults[node.id] = convolve(self.partialResults[source],kernel,mode,cval,fill_value)
-                if factor!=1:
-                    self.partialResults[node.id] = self.partialResults[node.id] * factor
-
-            if processName == 'geocode':
-                from scipy.spatial import Delaunay
-                from scipy.interpolate import LinearNDInterpolator
-                source = node.arguments['data']['from_node']
-                ## TODO: add check res and crs values, if None raise error
-                spatialres = node.arguments['resolution']
-                output_crs = "epsg:" + str(node.arguments['crs'])
-                ## TODO: check if grid_lon and grid_lat are available, else raise error
-                try: 
-                    self.partialResults[source].loc[dict(variable='grid_lon')]
-                    self.partialResults[source].loc[dict(variable='grid_lat')]
-                    if len(self.partialResults[source].dims) >= 3:
-                        if len(self.partialResults[source].time)>=1 and len(self.partialResults[source].loc[dict(variable='grid_lon')].dims)>2:
-                            grid_lon = self.partialResults[source].loc[dict(variable='grid_lon',time=self.partialResults[source].time[0])].values
-                            grid_lat = self.partialResults[source].loc[dict(variable='grid_lat',time=self.partialResults[source].time[0])].values
-                        else:
-                            grid_lon = self.partialResults[source].loc[dict(variable='grid_lon')].values
-                            grid_lat = self.partialResults[source].loc[dict(variable='grid_lat')].values
-                except Exception as e:
-                    raise(e)    
-                x_regular, y_regular, grid_x_irregular, grid_y_irregular = create_S2grid(grid_lon,grid_lat,output_crs,spatialres)
-                grid_x_regular, grid_y_regular = np.meshgrid(x_regular,y_regular)
-                grid_x_irregular = grid_x_irregular.astype(np.float32)
-                grid_y_irregular = grid_y_irregular.astype(np.float32)
-                x_regular = x_regular.astype(np.float32)
-                y_regular = y_regular.astype(np.float32)
-                grid_x_regular = grid_x_regular.astype(np.float32)
-                grid_y_regular = grid_y_regular.astype(np.float32)
-                grid_x_regular_shape = grid_x_regular.shape
-                grid_regular_flat = np.asarray([grid_x_regular.flatten(), grid_y_regular.flatten()]).T
-                grid_x_regular = None
-                grid_y_regular = None
-                grid_irregular_flat = np.asarray([grid_x_irregular.flatten(), grid_y_irregular.flatten()]).T
-                grid_x_irregular = None
-                grid_y_irregular = None
-
-                delaunay_obj = Delaunay(grid_irregular_flat)  # Compute the triangulation
-                
-                geocoded_cube = xr.Dataset(
-                    coords={
-                        "y": (["y"],y_regular),
-                        "x": (["x"],x_regular)
-                    },
-                )
-
-                def data_geocoding(data,grid_regular_flat):
-                    flat_data = data.values.flatten()
-
-                    def parallel_geocoding(subgrid):
-                        interpolator  = LinearNDInterpolator(delaunay_obj, flat_data)
-                        geocoded_data_slice = interpolator(subgrid)
-                        return geocoded_data_slice
-
-                    chunk_length = 20000000
-                    subgrids = []
-                    for i in range(int(len(grid_regular_flat)/chunk_length)+1):
-                        if i<int(len(grid_regular_flat)/chunk_length):
-                            grid_regular_flat_slice = grid_regular_flat[i*chunk_length:(i+1)*chunk_length]
-                            subgrids.append(grid_regular_flat_slice)
-                        else:
-                            grid_regular_flat_slice = grid_regular_flat[i*chunk_length:]
-                            subgrids.append(grid_regular_flat_slice)     
-
-                    result = []
-                    for s in subgrids:
-                        result.append(delayed(parallel_geocoding)(s))
-
-                    result = dask.compute(*result,scheduler='threads')
-                    result_list = []
-                    for r in result:
-                        result_list += r.tolist()
-                    result_arr = np.asarray(result_list)
-                    return result_arr
-                
-                print("Geocoding started!")
-                start = time()
-                try: 
-                    self.partialResults[source]['time']
-                    for t in self.partialResults[source]['time']:
-                        print(t.values)
-                        geocoded_dataset = None
-                        for var in self.partialResults[source]['variable']:
-                            print(var.values)
-                            if (var.values!='grid_lon' and var.values!='grid_lat'):
-                                data = self.partialResults[source].loc[dict(variable=var,time=t)]
-                                geocoded_data = data_geocoding(data,grid_regular_flat).reshape(grid_x_regular_shape)
-                                if geocoded_dataset is None:
-                                    geocoded_dataset = geocoded_cube.assign_coords(time=t.values).expand_dims('time')
-                                    geocoded_dataset[str(var.values)] = (("time","y", "x"),np.expand_dims(geocoded_data,axis=0))
-                                else:
-                                    geocoded_dataset[str(var.values)] = (("time","y", "x"),np.expand_dims(geocoded_data,axis=0))
-
-                        geocoded_dataset.to_netcdf(self.tmpFolderPath+'/'+str(t.values)+'.nc')
-                        geocoded_dataset = None
-                    ## With a timeseries of geocoded data, I write every timestep, which can have multiple bands,
-                    ## into a NetCDF and then I read the timeseries in chunks to avoid memory problems.
-                    self.partialResults[node.id] = xr.open_mfdataset(self.tmpFolderPath + '/*.nc', combine="by_coords").to_array()
-                except:
-                    geocoded_dataset = None
-                    for var in self.partialResults[source]['variable']:
-                        if (var.values!='grid_lon' and var.values!='grid_lat'):
-                            data = self.partialResults[source].loc[dict(variable=var)]
-                            geocoded_data = data_geocoding(data,grid_regular_flat).reshape(grid_x_regular_shape)
-                            if geocoded_dataset is None:
-                                geocoded_cube[str(var.values)] = (("y", "x"),geocoded_data)
-                                geocoded_dataset = geocoded_cube
+                        raise Exception(OverlapResolverMissing)
+        else:
+            # CASE x,y,t + x,y (requires overlap resolver)
+            if 'time' in cube1_dims or 'time' in cube2_dims:
+                    if 'x' and 'y' in cube1_dims and 'x' and 'y' in cube2_dims:
+                        # We need to check if they have bands, if yes is still not possible
+                        if 'variable' not in cube1_dims and 'variable' not in cube2_dims:
+                            #Overlap resolver required
+                            print("Overlap resolver required")
+                            if 'overlap_resolver' in node.arguments and 'from_node' in node.arguments['overlap_resolver']:
+                                source = node.arguments['overlap_resolver']['from_node']
+                                self.partialResults[node.id] = self.partialResults[source]
                             else:
-                                geocoded_dataset[str(var.values)] = (("y", "x"),geocoded_data)
-
-                    self.partialResults[node.id] = geocoded_dataset.to_array()
-                print("Elapsed time: ", time() - start)
-            
-            if processName == 'radar_mask':
-                source = node.arguments['data']['from_node']
-                threshold = node.arguments['threshold']
-                orbit = node.arguments['orbit']
-                
-                src = self.partialResults[source]
-                samples_dem = len(src.loc[dict(variable='DEM')].x)
-                lines_dem   = len(src.loc[dict(variable='DEM')].y)
-                dx = src.loc[dict(variable='DEM')].x[1].values - src.loc[dict(variable='DEM')].x[0].values  # Change based on geocoding output
-                dy = src.loc[dict(variable='DEM')].y[1].values - src.loc[dict(variable='DEM')].y[0].values
-                demdata = src.loc[dict(variable='DEM')].values
-                # heading for sentinel:
-                # ASC = -12.5°
-                # DSC = +12.5°
-                # Convert to radians before the usage
-                heading = -12.5*np.pi/180 #ASC
-                if orbit == 'DSC':
-                    heading = 12.5*np.pi/180
-                dx_p=dx*np.tan(heading)
-                dy_p=dy*np.tan(heading)
-                daz = 2*np.sqrt(dy_p**2+dy**2)
-                drg = 2*np.sqrt(dx_p**2+dx**2)
-                h_az_0 = demdata[0:lines_dem-3,0:samples_dem-3] + (demdata[0:lines_dem-3,2:samples_dem-1] - demdata[0:lines_dem-3,0:samples_dem-3])/(2*dx)*(dx+dx_p)
-                h_az_2 = demdata[2:lines_dem-1,0:samples_dem-3] + (demdata[2:lines_dem-1,2:samples_dem-1] - demdata[2:lines_dem-1,0:samples_dem-3])/(2*dx)*(dx-dx_p)
-                inc_h_az = -(h_az_2-h_az_0)
-                h_rg_0=demdata[0:lines_dem-3,0:samples_dem-3] + (demdata[2:lines_dem-1,0:samples_dem-3] - demdata[0:lines_dem-3,0:samples_dem-3])/(2*dy)*(dy-dy_p)
-                h_rg_2=demdata[0:lines_dem-3,2:samples_dem-1] + (demdata[2:lines_dem-1,2:samples_dem-1] - demdata[0:lines_dem-3,2:samples_dem-1])/(2*dy)*(dy+dy_p)
-                inc_h_rg=h_rg_2-h_rg_0
-                rg_sign = 0
-                az_sign = 0
-                if heading >= 0:
-                    az_sign=-1
-                    rg_sign=-1 
-                else:
-                    az_sign=1
-                    rg_sign=1
-                res_out_f = np.zeros((demdata.shape))
-                res_out_o = np.zeros((demdata.shape))
-                res_out_f[1:lines_dem-2,1:samples_dem-2] = np.arctan(inc_h_rg/drg)*rg_sign # range
-                res_out_o[1:lines_dem-2,1:samples_dem-2] = np.arctan(inc_h_az/daz)*az_sign
-                res_out_f_deg = res_out_f*180/np.pi
-                res_out_o_deg = res_out_o*180/np.pi
-                mean_incAngle = np.nanmean(src.loc[dict(variable='LIA')].values)
-                #foreshortening
-                foreshorteningTH   = float(threshold) # Foreshortening threshold
-                foreshortening     = np.bitwise_and(res_out_f_deg > 0,res_out_f_deg < mean_incAngle)*res_out_f_deg / mean_incAngle
-                foreshorteningMask = np.zeros((demdata.shape))
-                foreshorteningMask = (foreshortening > foreshorteningTH).astype(np.float32)
-                #layover
-                layover        = np.bitwise_and(res_out_f_deg > 0,res_out_f_deg > mean_incAngle)*res_out_f_deg / mean_incAngle
-                layover_Mask   = (layover > 0).astype(np.float32)
-                #shadowing
-                shadow      = np.bitwise_and(res_out_f_deg  < 0,np.abs(res_out_f_deg) > (90-mean_incAngle)).astype(np.float32)
-                radar_mask = ((foreshorteningMask + layover + shadow) > 1).astype(np.float32)
-                self.partialResults[node.id] = src
-                self.partialResults[node.id]['mask'] = radar_mask
-
-            if processName == 'coherence':
-                #{'data': {'from_node': '1_0'}, 'timedelta': '6 days'}
-                source = node.arguments['data']['from_node']
-                timedelta_str = None
-                timedelta = 6
-                if 'timedelta' in node.arguments:
-                    timedelta_str =  node.arguments['timedelta']
-                if timedelta_str=='12 days':
-                    timedelta = 12
-                elif timedelta_str=='24 days':
-                    timedelta = 24
-                elif timedelta_str=='48 days':
-                    timedelta = 48
+                                raise Exception(OverlapResolverMissing)
+                        else:
+                            raise Exception("[!] Trying to merge two datacubes with different dimensions, not supported yet!")
+            else:
+                cube1 = node.arguments['cube1']['from_node']
+                cube2 = node.arguments['cube2']['from_node']
+                ds1 = self.partialResults[cube1]
+                ds2 = self.partialResults[cube2]
+                self.partialResults[node.id] = xr.concat([ds1,ds2],dim='variable')
+
+    @register_process('if',required=['value','accept','reject'])
+    def if_process(self,node):
+        acceptVal = None
+        rejectVal = None
+        valueVal  = None
+        if isinstance(node.arguments['reject'],float) or isinstance(node.arguments['reject'],int):
+            rejectVal = node.arguments['reject']
+        else:
+            reject = node.arguments['reject']['from_node']
+            rejectVal = self.partialResults[reject]
+        if isinstance(node.arguments['accept'],float) or isinstance(node.arguments['accept'],int):
+            acceptVal = node.arguments['accept']
+        else:
+            accept = node.arguments['accept']['from_node']
+            acceptVal = self.partialResults[accept]
+        if isinstance(node.arguments['value'],float) or isinstance(node.arguments['value'],int):
+            valueVal = node.arguments['value']
+        else:
+            value = node.arguments['value']['from_node']
+            valueVal = self.partialResults[value]
+
+        tmpAccept = valueVal * acceptVal
+        tmpReject = xr.ufuncs.logical_not(valueVal) * rejectVal
+        self.partialResults[node.id] = tmpAccept + tmpReject
+
+    @register_process('apply',required=['process'])
+    def apply(self,node):
+        source = node.arguments['process']['from_node']
+        self.partialResults[node.id] = self.partialResults[source]
+
+    @register_process('mask',required=['data','mask'])
+    def mask(self,node):
+        maskSource = node.arguments['mask']['from_node']
+        dataSource = node.arguments['data']['from_node']
+        # If the mask has a variable dimension, it will keep only the values of the input with the same variable name.
+        # Solution is to take the min over the variable dim to drop that dimension. (Problems if there are more than 1 band/variable)
+        if 'variable' in self.partialResults[maskSource].dims:
+            mask = self.partialResults[maskSource].min(dim='variable')
+        else:
+            mask = self.partialResults[maskSource]
+        self.partialResults[node.id] = self.partialResults[dataSource].where(xr.ufuncs.logical_not(mask))
+        if 'replacement' in node.arguments:
+            burnValue  = node.arguments['replacement']
+            self.partialResults[node.id] = self.partialResults[node.id].fillna(burnValue)
+
+    @register_process('climatological_normal',required=['data','frequency'])
+    def climatological_normal(self,node):
+        source             = node.arguments['data']['from_node']
+        frequency          = node.arguments['frequency']
+        if 'climatology_period' in node.arguments:
+            climatology_period = node.arguments['climatology_period']
+            # Perform a filter_temporal and then compute the mean over a monthly period
+            timeStart = climatology_period[0]
+            timeEnd   = climatology_period[1]
+            if len(timeStart.split('T')) > 1:         # xarray slicing operation doesn't work with dates in the format 2017-05-01T00:00:00Z but only 2017-05-01
+                timeStart = timeStart.split('T')[0]
+            if len(timeEnd.split('T')) > 1:
+                timeEnd = timeEnd.split('T')[0]
+            tmp = self.partialResults[source].loc[dict(time=slice(timeStart,timeEnd))]
+        else:
+            tmp = self.partialResults[source]
+        if frequency=='monthly':
+            freq = 'time.month'
+        else:
+            freq = None
+        self.partialResults[node.id] = tmp.groupby(freq).mean("time")
+
+    @register_process('anomaly',required=['data','normals','frequency'])
+    def anomaly(self,node):
+        source    = node.arguments['data']['from_node']
+        normals   = node.arguments['normals']['from_node']
+        frequency = node.arguments['frequency']
+        if frequency=='monthly':
+            freq = 'time.month'
+        else:
+            freq = None
+        self.partialResults[node.id] = (self.partialResults[source].groupby(freq) - self.partialResults[normals]).drop('month')
+
+    @register_process('apply_kernel',required=['data','kernel'],optional={'factor':1,'border':0,'replace_invalid':0})
+    def apply_kernel(self,node):
+        kernel = np.array(node.arguments['kernel'])
+        factor = node.arguments['factor']
+        fill_value = node.arguments['replace_invalid']
+        source = node.arguments['data']['from_node']
+        openeo_scipy_modes = {'replicate':'nearest','reflect':'reflect','reflect_pixel':'mirror','wrap':'wrap'}
+        if isinstance(node.arguments['border'],int) or isinstance(node.arguments['border'],float):
+            mode = 'constant'
+            cval = node.arguments['border']
+        else:
+            mode_openeo = node.arguments['border']
+            mode = openeo_scipy_modes[mode_openeo]
+            cval = 0
+        # Chunk by chunk convolution with a halo, the kernel rows are along y and its columns along x
+        self.partialResults[node.id] = convolve(self.partialResults[source].fillna(fill_value),kernel,mode,cval)
+        if factor!=1:
+            self.partialResults[node.id] = self.partialResults[node.id] * factor
+
+    @register_process('geocode',required=['data','resolution','crs'])
+    def geocode(self,node):
+        source = node.arguments['data']['from_node']
+        ## TODO: add check res and crs values, if None raise error
+        spatialres = node.arguments['resolution']
+        output_crs = "epsg:" + str(node.arguments['crs'])
+        ## TODO: check if grid_lon and grid_lat are available, else raise error
+        src = self.partialResults[source].chunk() # Only the geolocation grid is computed here, the data stays lazy
+        try:
+            src.loc[dict(variable='grid_lon')]
+            src.loc[dict(variable='grid_lat')]
+            if len(src.dims) >= 3:
+                if len(src.time)>=1 and len(src.loc[dict(variable='grid_lon')].dims)>2:
+                    grid_lon = src.loc[dict(variable='grid_lon',time=src.time[0])].values
+                    grid_lat = src.loc[dict(variable='grid_lat',time=src.time[0])].values
                 else:
-                    pass
-                    
-                # We put the timesteps of the datacube into an array
-                timesteps = self.partialResults[source]['time'].values
-                days_pairs = []
-                # We loop through the timesteps and check where we have 6-12-24 days pairs of dates
-
-                tmp_dataset_timeseries = None
-                for i,t in enumerate(timesteps[:-1]):
-                    if(np.timedelta64(timesteps[i+1] - timesteps[i], 'D')) == np.timedelta64(timedelta,'D'):
-                        days_pairs.append([timesteps[i],timesteps[i+1]])
-                
-                src = self.partialResults[source]
-                for i,pair in enumerate(days_pairs):
-                    print(pair)
-                    VV_q_coh = (src.loc[dict(variable='i_VV',time=pair[0])]*src.loc[dict(variable='i_VV',time=pair[1])]+src.loc[dict(variable='q_VV',time=pair[0])]*src.loc[dict(variable='q_VV',time=pair[1])])/                    np.sqrt((src.loc[dict(variable='i_VV',time=pair[0])]**2+src.loc[dict(variable='q_VV',time=pair[0])]**2)*(src.loc[dict(variable='i_VV',time=pair[1])]**2+src.loc[dict(variable='q_VV',time=pair[1])]**2))
-                    VV_i_coh = (src.loc[dict(variable='i_VV',time=pair[1])]*src.loc[dict(variable='q_VV',time=pair[0])]-src.loc[dict(variable='i_VV',time=pair[0])]*src.loc[dict(variable='q_VV',time=pair[1])])/                    np.sqrt((src.loc[dict(variable='i_VV',time=pair[0])]**2+src.loc[dict(variable='q_VV',time=pair[0])]**2)*(src.loc[dict(variable='i_VV',time=pair[1])]**2+src.loc[dict(variable='q_VV',time=pair[1])]**2))
-                    
-                    VH_q_coh = (src.loc[dict(variable='i_VH',time=pair[0])]*src.loc[dict(variable='i_VH',time=pair[1])]+src.loc[dict(variable='q_VH',time=pair[0])]*src.loc[dict(variable='q_VH',time=pair[1])])/                    np.sqrt((src.loc[dict(variable='i_VH',time=pair[0])]**2+src.loc[dict(variable='q_VH',time=pair[0])]**2)*(src.loc[dict(variable='i_VH',time=pair[1])]**2+src.loc[dict(variable='q_VH',time=pair[1])]**2))
-                    VH_i_coh = (src.loc[dict(variable='i_VH',time=pair[1])]*src.loc[dict(variable='q_VH',time=pair[0])]-src.loc[dict(variable='i_VH',time=pair[0])]*src.loc[dict(variable='q_VH',time=pair[1])])/                    np.sqrt((src.loc[dict(variable='i_VH',time=pair[0])]**2+src.loc[dict(variable='q_VH',time=pair[0])]**2)*(src.loc[dict(variable='i_VH',time=pair[1])]**2+src.loc[dict(variable='q_VH',time=pair[1])]**2))
-                                                 
-                    tmp_dataset = xr.Dataset(
-                        coords={
-                            "y": (["y"],self.partialResults[source].y.values),
-                            "x": (["x"],self.partialResults[source].x.values)
-                        },
+                    grid_lon = src.loc[dict(variable='grid_lon')].values
+                    grid_lat = src.loc[dict(variable='grid_lat')].values
+        except Exception as e:
+            raise(e)
+        x_regular, y_regular, grid_x_irregular, grid_y_irregular = create_S2grid(grid_lon,grid_lat,output_crs,spatialres)
+        x_regular = x_regular.astype(np.float32)
+        y_regular = y_regular.astype(np.float32)
+
+        def irregular_points():
+            return np.asarray([grid_x_irregular.flatten(), grid_y_irregular.flatten()]).T.astype(np.float32)
+
+        def regular_points():
+            grid_x_regular, grid_y_regular = np.meshgrid(x_regular,y_regular)
+            return np.asarray([grid_x_regular.flatten(), grid_y_regular.flatten()]).T.astype(np.float32)
+
+        # The triangulation and the interpolation weights are computed only the first time for this grid
+        key = weights_key(self.collection,output_crs,spatialres,grid_lon,grid_lat)
+        weights = get_weights(key,TMP_FOLDER_PATH + 'GEOCODING/',irregular_points,regular_points)
+
+        print("Geocoding started!")
+        start = time()
+        bands = [v for v in src['variable'].values if v not in ['grid_lon','grid_lat']]
+        data = src.loc[dict(variable=bands)]
+        # Every band of every date is geocoded by the same sparse matrix product, tile by tile on the Dask workers
+        geocoded = geocode_tiled(weights,data.data,(len(y_regular),len(x_regular)))
+        coords = {d: data[d] for d in data.dims[:-2]}
+        coords.update({'y': y_regular, 'x': x_regular})
+        self.partialResults[node.id] = xr.DataArray(geocoded,dims=data.dims[:-2] + ('y','x'),coords=coords,attrs={'crs': output_crs})
+        self.crs = output_crs
+        print("Elapsed time: ", time() - start)
+
+    @register_process('radar_mask',required=['data','threshold','orbit'])
+    def radar_mask(self,node):
+        source = node.arguments['data']['from_node']
+        threshold = node.arguments['threshold']
+        orbit = node.arguments['orbit']
+
+        src = self.materialize(node,self.partialResults[source])
+        samples_dem = len(src.loc[dict(variable='DEM')].x)
+        lines_dem   = len(src.loc[dict(variable='DEM')].y)
+        dx = src.loc[dict(variable='DEM')].x[1].values - src.loc[dict(variable='DEM')].x[0].values  # Change based on geocoding output
+        dy = src.loc[dict(variable='DEM')].y[1].values - src.loc[dict(variable='DEM')].y[0].values
+        demdata = src.loc[dict(variable='DEM')].values
+        # heading for sentinel:
+        # ASC = -12.5°
+        # DSC = +12.5°
+        # Convert to radians before the usage
+        heading = -12.5*np.pi/180 #ASC
+        if orbit == 'DSC':
+            heading = 12.5*np.pi/180
+        dx_p=dx*np.tan(heading)
+        dy_p=dy*np.tan(heading)
+        daz = 2*np.sqrt(dy_p**2+dy**2)
+        drg = 2*np.sqrt(dx_p**2+dx**2)
+        h_az_0 = demdata[0:lines_dem-3,0:samples_dem-3] + (demdata[0:lines_dem-3,2:samples_dem-1] - demdata[0:lines_dem-3,0:samples_dem-3])/(2*dx)*(dx+dx_p)
+        h_az_2 = demdata[2:lines_dem-1,0:samples_dem-3] + (demdata[2:lines_dem-1,2:samples_dem-1] - demdata[2:lines_dem-1,0:samples_dem-3])/(2*dx)*(dx-dx_p)
+        inc_h_az = -(h_az_2-h_az_0)
+        h_rg_0=demdata[0:lines_dem-3,0:samples_dem-3] + (demdata[2:lines_dem-1,0:samples_dem-3] - demdata[0:lines_dem-3,0:samples_dem-3])/(2*dy)*(dy-dy_p)
+        h_rg_2=demdata[0:lines_dem-3,2:samples_dem-1] + (demdata[2:lines_dem-1,2:samples_dem-1] - demdata[0:lines_dem-3,2:samples_dem-1])/(2*dy)*(dy+dy_p)
+        inc_h_rg=h_rg_2-h_rg_0
+        rg_sign = 0
+        az_sign = 0
+        if heading >= 0:
+            az_sign=-1
+            rg_sign=-1
+        else:
+            az_sign=1
+            rg_sign=1
+        res_out_f = np.zeros((demdata.shape))
+        res_out_o = np.zeros((demdata.shape))
+        res_out_f[1:lines_dem-2,1:samples_dem-2] = np.arctan(inc_h_rg/drg)*rg_sign # range
+        res_out_o[1:lines_dem-2,1:samples_dem-2] = np.arctan(inc_h_az/daz)*az_sign
+        res_out_f_deg = res_out_f*180/np.pi
+        res_out_o_deg = res_out_o*180/np.pi
+        mean_incAngle = np.nanmean(src.loc[dict(variable='LIA')].values)
+        #foreshortening
+        foreshorteningTH   = float(threshold) # Foreshortening threshold
+        foreshortening     = np.bitwise_and(res_out_f_deg > 0,res_out_f_deg < mean_incAngle)*res_out_f_deg / mean_incAngle
+        foreshorteningMask = np.zeros((demdata.shape))
+        foreshorteningMask = (foreshortening > foreshorteningTH).astype(np.float32)
+        #layover
+        layover        = np.bitwise_and(res_out_f_deg > 0,res_out_f_deg > mean_incAngle)*res_out_f_deg / mean_incAngle
+        layover_Mask   = (layover > 0).astype(np.float32)
+        #shadowing
+        shadow      = np.bitwise_and(res_out_f_deg  < 0,np.abs(res_out_f_deg) > (90-mean_incAngle)).astype(np.float32)
+        radar_mask = ((foreshorteningMask + layover + shadow) > 1).astype(np.float32)
+        self.partialResults[node.id] = src
+        self.partialResults[node.id]['mask'] = radar_mask
+
+    @register_process('coherence',required=['data'])
+    def coherence(self,node):
+        #{'data': {'from_node': '1_0'}, 'timedelta': '6 days', 'window': [3,3]}
+        source = node.arguments['data']['from_node']
+        timedelta = 6
+        if node.arguments.get('timedelta') is not None:
+            timedelta = int(str(node.arguments['timedelta']).split(' ')[0]) # e.g. '12 days'
+        window = node.arguments.get('window') # Pixels of the spatial averaging window, none by default
+        if isinstance(window,int):
+            window = [window,window]
+        self.partialResults[node.id] = sar_coherence(self.partialResults[source],timedelta,window)
+        print('COHERENCE RESULT:\n',self.partialResults[node.id])
+
+    @register_process('fit_curve',required=['data','function','parameters'])
+    def fit_curve(self,node):
+        start = time()
+        functionNode = node.arguments['function']['from_node']
+        data = self.partialResults[node.arguments['data']['from_node']]
+        if not self.lazy:
+            data = self.materialize(node,data)
+        baseParameters = node.arguments['parameters'] ## TODO: take care of them, currently ignored
+        nParams = len(baseParameters)
+        # The child graph is compiled into a NumPy function of the time (x) and of the parameters
+        fitting_function = compile_function(functionNode,self.nodes,nParams)
+
+        dates = data.time.values
+        unixSeconds = ((dates - np.datetime64('1970-01-01')) / np.timedelta64(1, 's')).astype(np.float64)
+        if is_linear(functionNode,self.nodes):
+            # All the pixels of a chunk are solved together with the normal equations
+            B, c = design_matrix(fitting_function,unixSeconds,nParams)
+            solver = lambda y: fit_linear(y,B,c)
+        else:
+            print('[!] The fitting function is not linear in its parameters, using Levenberg-Marquardt')
+            solver = lambda y: fit_nonlinear(y,fitting_function,unixSeconds,nParams)
+
+        data = single_chunk(data,['time']) # Every chunk needs the whole time series
+        popts3d = xr.apply_ufunc(solver,data,
+                   input_core_dims=[['time']], #Dimension along we fit the curve function
+                   output_core_dims=[['params']],
+                   dask="parallelized",
+                   output_dtypes=[np.float32],
+                   dask_gufunc_kwargs={'output_sizes':{'params':nParams}}
                     )
-                    if i==0:
-                        tmp_dataset = tmp_dataset.assign_coords(time=pair[0]).expand_dims('time')
-                        tmp_dataset['i_VV'] = (("time","y", "x"),VV_i_coh.expand_dims('time'))
-                        tmp_dataset['q_VV'] = (("time","y", "x"),VV_q_coh.expand_dims('time'))
-                        tmp_dataset['i_VH'] = (("time","y", "x"),VH_i_coh.expand_dims('time'))
-                        tmp_dataset['q_VH'] = (("time","y", "x"),VH_q_coh.expand_dims('time'))
-                        tmp_dataset_timeseries = tmp_dataset
-                    else:
-                        tmp_dataset = tmp_dataset.assign_coords(time=pair[0]).expand_dims('time')
-                        tmp_dataset['i_VV'] = (("time","y", "x"),VV_i_coh.expand_dims('time'))
-                        tmp_dataset['q_VV'] = (("time","y", "x"),VV_q_coh.expand_dims('time'))
-                        tmp_dataset['i_VH'] = (("time","y", "x"),VH_i_coh.expand_dims('time'))
-                        tmp_dataset['q_VH'] = (("time","y", "x"),VH_q_coh.expand_dims('time'))
-                        tmp_dataset_timeseries = xr.concat([tmp_dataset_timeseries,tmp_dataset],dim='time')
-                
-                print('COHERENCE RESULT:\n',tmp_dataset_timeseries.to_array())
-                self.partialResults[node.id] = tmp_dataset_timeseries.to_array()
-                
-            if processName == 'fit_curve':
-                start = time()
-                ## The fitting function as been converted in a dedicated if statement into a string
-                fitFunction = self.partialResults[node.arguments['function']['from_node']]
-                ## The data can't contain NaN values, they are replaced with zeros
-                data = self.partialResults[node.arguments['data']['from_node']].compute().fillna(0)
-                data_dataset = self.refactor_data(data)
-                data_dataset = data_dataset.rename({'t':'time'})
-                baseParameters = node.arguments['parameters'] ## TODO: take care of them, currently ignored
-
-                ## Preparation of fitting functions:
-                def build_fitting_functions():
-                    baseFun = "def fitting_function(x"
-                    parametersStr = ""
-                    for i in range(len(baseParameters)):
-                        parametersStr += ",a"+str(i)
-                    baseFun += (parametersStr + "):")
-                    baseFun += ('''
-    return '''+ fitFunction)
-                    return baseFun
-                ## Generate python fitting function as string 
-                fitFun = build_fitting_functions()
-                print(fitFun)
-                exec(fitFun,globals())
-                def fit_curve(x,y):
-                    index = np.nonzero(y) # We don't consider zero values (masked) for fitting.
-                    x = x[index]
-                    y = y[index]
-                    popt, pcov = curve_fit(fitting_function, x, y)
-                    return popt
-                
-                
-                dates = data_dataset.time.values
-                unixSeconds = [ ((x - np.datetime64('1970-01-01')) / np.timedelta64(1, 's')) for x in dates]
-                data_dataset['time'] = unixSeconds
-                popts3d = xr.apply_ufunc(fit_curve,data_dataset.time,data_dataset,
-                           vectorize=True,
-                           input_core_dims=[['time'],['time']], #Dimension along we fit the curve function
-                           output_core_dims=[['params']],
-                           dask="parallelized",
-                           output_dtypes=[np.float32],
-                           dask_gufunc_kwargs={'allow_rechunk':True,'output_sizes':{'params':len(baseParameters)}}
-                            )
-                data_dataset['time'] = dates
-                     
-                self.partialResults[node.id] = popts3d.compute()
-                print("Elapsed time: ",time() - start)
-                   
-            if processName == 'predict_curve':
-                start = time()
-                fitFunction = self.partialResults[node.arguments['function']['from_node']]
-                data = self.partialResults[node.arguments['data']['from_node']]
-                dates = data.time.values
-                unixSeconds = [ ((x - np.datetime64('1970-01-01')) / np.timedelta64(1, 's')) for x in dates]
-                data['time'] = unixSeconds
-                baseParameters = self.partialResults[node.arguments['parameters']['from_node']]
-                
-                def build_fitting_functions():
-                    baseFun = "def predicting_function(x"
-                    parametersStr = ""
-                    for i in range(len(baseParameters.params)):
-                        parametersStr += ",a"+str(i) + "=0"
-                    baseFun += (parametersStr + "):")
-                    baseFun += ('''
-    return '''+ fitFunction)
-                    return baseFun
-                fitFun = build_fitting_functions()
-                print(fitFun)
-                exec(fitFun,globals())
-                if 'variable' in data.dims:
-                    predictedData = xr.Dataset(coords={'time':dates,'y':data.y,'x':data.x})
-                    for var in data['variable'].values:
-                        input_params = {}
-                        for i in range(len(baseParameters.params)):
-                            band_parameter = baseParameters.loc[dict(variable=var)].drop('variable')[:,:,i]
-                            input_params['a'+str(i)] = band_parameter
-                        tmp_var = predicting_function(data.time,**input_params).astype(np.float32)
-                        tmp_var['time'] = dates
-                        predictedData[var] = tmp_var
+
+        if self.lazy:
+            self.partialResults[node.id] = popts3d
+        else:
+            self.partialResults[node.id] = self.materialize(node,popts3d)
+        print("Elapsed time: ",time() - start)
+
+    @register_process('predict_curve',required=['data','function','parameters'])
+    def predict_curve(self,node):
+        start = time()
+        data = self.partialResults[node.arguments['data']['from_node']]
+        baseParameters = self.partialResults[node.arguments['parameters']['from_node']]
+        nParams = baseParameters.sizes['params']
+        predicting_function = compile_function(node.arguments['function']['from_node'],self.nodes,nParams,name='predicting_function')
+        dates = data.time.values
+        unixSeconds = ((dates - np.datetime64('1970-01-01')) / np.timedelta64(1, 's')).astype(np.float64)
+        # The time is a separate chunked array: the input is not modified and the prediction is computed by time chunk
+        timeChunks = dict(zip(data.dims,data.chunks))['time'] if data.chunks is not None else PREDICT_TIME_CHUNK
+        x = xr.DataArray(unixSeconds,dims='time',coords={'time':dates}).chunk({'time':timeChunks})
+        # Every parameter is broadcast against the time, for all the bands together
+        parameters = [baseParameters.isel(params=i,drop=True) for i in range(nParams)]
+        predictedData, x = xr.broadcast(predicting_function(x,*parameters),x) # Also for functions not depending on x
+        predictedData = predictedData.astype(np.float32)
+        print("Elapsed time: ",time() - start)
+        self.partialResults[node.id] = predictedData.transpose(*[d for d in ['variable','time','y','x'] if d in predictedData.dims],...)
+
+    @register_process('load_result',required=['id'])
+    def load_result(self,node):
+        resultFolder = TMP_FOLDER_PATH + node.arguments['id']
+        if os.path.exists(resultFolder + '/output.zarr'):
+            # Lazy read of the Zarr chunks: the subsetting below selects the chunks which are read
+            data = xr.open_zarr(resultFolder + '/output.zarr',consolidated=True)
+            if 'crs' in data.attrs:
+                self.crs = data.attrs['crs']
+            arguments = dict(node.arguments)
+            arguments.update(self.pushdown.get(node.id,{}))
+            if arguments.get('bands'):
+                data = data[arguments['bands']]
+            if arguments.get('temporal_extent') is not None and 'time' in data.dims:
+                # The end of an openEO temporal extent is excluded, also when pushed down (push_down_filters uses next_day)
+                timeStart, timeEnd = [pd.Timestamp(t.rstrip('Z')) if t is not None else None for t in arguments['temporal_extent']]
+                data = data.sel(time=slice(timeStart,timeEnd - pd.Timedelta('1ns') if timeEnd is not None else None))
+            if arguments.get('spatial_extent') is not None and 'west' in arguments['spatial_extent'] and 'crs' in data.attrs:
+                data = self.clip_bbox(data,arguments['spatial_extent'])
+            self.partialResults[node.id] = data.to_array()
+            return
+        try:
+            # If the data is has a single band we load it directly as xarray.DataArray, otherwise as Dataset and convert to DataArray
+            self.partialResults[node.id] = xr.open_dataarray(resultFolder + '/output.nc',chunks={})
+        except:
+            self.partialResults[node.id] = xr.open_dataset(resultFolder + '/output.nc',chunks={}).to_array()
+
+    @register_process('save_result',required=['data','format'],terminal=True)
+    def save_result(self,node):
+        outFormat = node.arguments['format']
+        source = node.arguments['data']['from_node']
+        print(self.partialResults[source])
+        self.start_cache_writes()
+
+        if self.streaming and outFormat.lower() in ['gtiff','geotiff','tif','tiff','netcdf','nc']:
+            self.write_parts(node,self.partialResults[source],outFormat.lower())
+            return
+
+        if outFormat.lower() == 'png':
+            self.outFormat = '.png'
+            self.mimeType = 'image/png'
+            import cv2
+            size = None; red = None; green = None; blue = None; gray = None
+            if 'options' in node.arguments:
+                if 'size' in node.arguments['options']:
+                    size = node.arguments['options']['size']
+            if size is not None and 'x' in self.partialResults[source].dims and 'y' in self.partialResults[source].dims:
+                # Lazy reduction before computing, if the data is still much bigger than the requested image: block averaging
+                # for continuous data, one pixel every factor (as nearest resampling) when the values may be categorical
+                factor = int(max(len(self.partialResults[source].x),len(self.partialResults[source].y)) // size)
+                if factor >= 2 and self.continuousBands and np.issubdtype(self.partialResults[source].dtype,np.floating):
+                    self.partialResults[source] = self.partialResults[source].coarsen(x=factor,y=factor,boundary='trim').mean()
+                elif factor >= 2:
+                    self.partialResults[source] = self.partialResults[source].isel(x=slice(factor // 2,None,factor),y=slice(factor // 2,None,factor))
+            self.partialResults[source] = self.partialResults[source].fillna(0)
+            if 'options' in node.arguments:
+                if 'red' in node.arguments['options']:
+                    red = node.arguments['options']['red']
+                if 'green' in node.arguments['options']:
+                    green = node.arguments['options']['green']
+                if 'blue' in node.arguments['options']:
+                    blue = node.arguments['options']['blue']
+                if 'gray' in node.arguments['options']:
+                    gray = node.arguments['options']['gray']
+                # The bands are selected together, so that the graph is computed only once
+                if red is not None and green is not None and blue is not None and gray is not None:
+                    bgr = np.moveaxis(self.partialResults[source].loc[dict(variable=[blue,green,red,gray])].values,0,-1)
+                elif red is not None and green is not None and blue is not None:
+                    bgr = np.moveaxis(self.partialResults[source].loc[dict(variable=[blue,green,red])].values,0,-1)
                 else:
-                    predictedData = predicting_function(data.time,baseParameters[0,:,:].drop('variable'),baseParameters[1,:,:].drop('variable'),baseParameters[2,:,:].drop('variable'))
-                
-                data['time'] = dates
-                print("Elapsed time: ",time() - start)
-                self.partialResults[node.id] = predictedData.to_array().transpose('variable','time','y','x')
-                
-            if processName == 'load_result':
-                try:
-                    # If the data is has a single band we load it directly as xarray.DataArray, otherwise as Dataset and convert to DataArray
-                    self.partialResults[node.id] = xr.open_dataarray(TMP_FOLDER_PATH + node.arguments['id'] + '/output.nc',chunks={})
-                except:
-                    self.partialResults[node.id] = xr.open_dataset(TMP_FOLDER_PATH + node.arguments['id'] + '/output.nc',chunks={}).to_array()
-                
-            if processName == 'save_result':
-                outFormat = node.arguments['format']
-                source = node.arguments['data']['from_node']
-                print(self.partialResults[source])
-
-                if outFormat.lower() == 'png':
-                    self.outFormat = '.png'
-                    self.mimeType = 'image/png'
-                    import cv2
-                    self.partialResults[source] = self.partialResults[source].fillna(0)
-                    size = None; red = None; green = None; blue = None; gray = None
-                    if 'options' in node.arguments:
-                        if 'size' in node.arguments['options']:
-                            size = node.arguments['options']['size']
-                        if 'red' in node.arguments['options']:
-                            red = node.arguments['options']['red']
-                        if 'green' in node.arguments['options']:
-                            green = node.arguments['options']['green']
-                        if 'blue' in node.arguments['options']:
-                            blue = node.arguments['options']['blue']
-                        if 'gray' in node.arguments['options']:
-                            gray = node.arguments['options']['gray']
-                        if red is not None and green is not None and blue is not None and gray is not None:
-                            redBand   = self.partialResults[source].loc[dict(variable=red)].values
-                            blueBand  = self.partialResults[source].loc[dict(variable=blue)].values
-                            greenBand = self.partialResults[source].loc[dict(variable=green)].values
-                            grayBand  = self.partialResults[source].loc[dict(variable=gray)].values
-                            bgr = np.stack((blueBand,greenBand,redBand,grayBand),axis=2)
-                        elif red is not None and green is not None and blue is not None:
-                            redBand   = self.partialResults[source].loc[dict(variable=red)].values
-                            blueBand  = self.partialResults[source].loc[dict(variable=blue)].values
-                            greenBand = self.partialResults[source].loc[dict(variable=green)].values
-                            bgr = np.stack((blueBand,greenBand,redBand),axis=2)
-                        else:
-                            bgr = self.partialResults[source].values
-                            if bgr.shape[0] in [1,2,3,4]:
-                                bgr = np.moveaxis(bgr,0,-1)
-                    else:
-                        bgr = self.partialResults[source].values
-                        if bgr.shape[0] in [1,2,3,4]:
-                            bgr = np.moveaxis(bgr,0,-1)
-                    if size is not None: # The OpenEO API let the user set the "longest dimension of the image in pixels"
-                        # 1 find the bigger dimension
-                        if bgr.shape[0] > bgr.shape[1]:
-                            scaleFactor = size/bgr.shape[0]
-                            width = int(bgr.shape[1] * scaleFactor)
-                            height = int(size)
-                            dsize = (width, height)
-                            # 2 resize
-                            bgr = cv2.resize(bgr, dsize)
-                        else:
-                            scaleFactor = size/bgr.shape[1]
-                            width = int(size)
-                            height = int(bgr.shape[0] * scaleFactor)
-                            dsize = (width, height)
-                            bgr = cv2.resize(bgr, dsize)
-                    bgr = bgr.astype(np.uint8)
-                    if(self.sar2cubeCollection): bgr=np.flipud(bgr)
-                    cv2.imwrite(str(self.tmpFolderPath) + '/output.png',bgr)
-                    return 0
-
-                if outFormat.lower() in ['gtiff','geotiff','tif','tiff']:
-                    self.outFormat = '.tiff'
-                    self.mimeType = 'image/tiff'
-                    import rioxarray
-                    
-                    if self.partialResults[source].dtype == 'bool':
-                        self.partialResults[source] = self.partialResults[source].astype(np.uint8)
-                    
-                    if len(self.partialResults[source].dims) > 3:
-                        if len(self.partialResults[source].time)>=1 and len(self.partialResults[source].variable)==1:
-                            # We keep the time dimension as band in the GeoTiff, timeseries of a single band/variable
-                            self.partialResults[node.id] = self.partialResults[source].squeeze('variable').to_dataset(name='result')
-                        elif (len(self.partialResults[source].time==1) and len(self.partialResults[source].variable>=1)):
-                            # We keep the time variable as band in the GeoTiff, multiple band/variables of the same timestamp
-                            self.partialResults[node.id] = self.partialResults[source].squeeze('time')
-                            geocoded_cube = xr.Dataset(
-                                                        coords={
-                                                            "y": (["y"],self.partialResults[node.id].y),
-                                                            "x": (["x"],self.partialResults[node.id].x)
-                                                        },
-                                                    )
-                            for var in self.partialResults[node.id]['variable']:
-                                geocoded_cube[str(var.values)] = (("y", "x"),self.partialResults[node.id].loc[dict(variable=var.values)])
-                            self.partialResults[node.id] = geocoded_cube
-                        else:
-                            raise Exception("[!] Not possible to write a 4-dimensional GeoTiff, use NetCDF instead.")
-                    else:
-                        self.partialResults[node.id] = self.partialResults[source] 
-                    self.partialResults[node.id].attrs['crs'] = self.crs
-                    self.partialResults[node.id].rio.to_raster(self.tmpFolderPath + "/output.tif")
-                    return 0
-
-                if outFormat.lower() in ['netcdf','nc']:
-                    self.outFormat = '.nc'
-                    self.mimeType = 'application/octet-stream'
-                    if 'params' in self.partialResults[source].dims:
-                        self.partialResults[source].to_netcdf(self.tmpFolderPath + "/output.nc")
-                        return
-                    
-                    tmp = self.refactor_data(self.partialResults[source])
-                    tmp.attrs = self.partialResults[source].attrs
-    #                 self.partialResults[source].time.encoding['units'] = "seconds since 1970-01-01 00:00:00"
-                    try:
-                        tmp.to_netcdf(self.tmpFolderPath + "/output.nc")
-                    except:
-                        pass
-                    try:
-                        tmp.t.attrs.pop('units', None)
-                        tmp.to_netcdf(self.tmpFolderPath + "/output.nc")
-                    except:
-                        pass
-                    return 
-                
-                if outFormat.lower == 'json':
-                    self.outFormat = '.json'
-                    self.mimeType = 'application/json'
-                    self.partialResults[node.id] = self.partialResults[source].to_dict()
-                    with open(self.tmpFolderPath + "/output.json", 'w') as outfile:
-                        json.dump(self.partialResults[node.id],outfile)
-                    return 
-                
+                    bgr = self.partialResults[source].values
+                    if bgr.shape[0] in [1,2,3,4]:
+                        bgr = np.moveaxis(bgr,0,-1)
+            else:
+                bgr = self.partialResults[source].values
+                if bgr.shape[0] in [1,2,3,4]:
+                    bgr = np.moveaxis(bgr,0,-1)
+            if size is not None: # The OpenEO API let the user set the "longest dimension of the image in pixels"
+                # 1 find the bigger dimension
+                if bgr.shape[0] > bgr.shape[1]:
+                    scaleFactor = size/bgr.shape[0]
+                    width = int(bgr.shape[1] * scaleFactor)
+                    height = int(size)
+                    dsize = (width, height)
+                    # 2 resize
+                    bgr = cv2.resize(bgr, dsize)
                 else:
-                    raise Exception("[!] Output format not recognized/implemented!")
+                    scaleFactor = size/bgr.shape[1]
+                    width = int(size)
+                    height = int(bgr.shape[0] * scaleFactor)
+                    dsize = (width, height)
+                    bgr = cv2.resize(bgr, dsize)
+            bgr = bgr.astype(np.uint8)
+            if(self.sar2cubeCollection): bgr=np.flipud(bgr)
+            cv2.imwrite(str(self.tmpFolderPath) + '/output.png',bgr)
 
-                return 0 # Save result is the end of the process graph
-            
-            self.listExecutedIds.append(node.id) # Store the processed nodes ids
-            return 1 # Go on and process the next node
-        
-        except Exception as e:
-            print(e)
-            raise Exception(processName + '\n' + str(e))
-    
-    def refactor_data(self,data):
-        # The following code is required to recreate a Dataset from the final result as Dataarray, to get a well formatted netCDF
-        if 'time' in data.coords:
-            tmp = xr.Dataset(coords={'t':data.time.values,'y':data.y,'x':data.x})
-            if 'variable' in data.coords:
-                try:
-                    for var in data['variable'].values:
-                        tmp[str(var)] = (('t','y','x'),data.loc[dict(variable=var)].drop('variable').transpose('time','y','x'))
-                except Exception as e:
-                    print(e)
-                    tmp[str((data['variable'].values))] = (('t','y','x'),data.transpose('time','y','x'))
+        elif outFormat.lower() in ['gtiff','geotiff','tif','tiff','cog']:
+            self.outFormat = '.tiff'
+            self.mimeType = 'image/tiff'
+            cog = outFormat.lower() == 'cog' or node.arguments.get('options',{}).get('cog',False)
+            data = self.partialResults[source]
+
+            if data.dtype == 'bool':
+                data = data.astype(np.uint8)
+
+            if len(data.dims) > 3:
+                if len(data.time)>=1 and len(data.variable)==1:
+                    # We keep the time dimension as band in the GeoTiff, timeseries of a single band/variable
+                    data = data.squeeze('variable')
+                elif len(data.time)==1 and len(data.variable)>=1:
+                    # We keep the variable dimension as band in the GeoTiff, multiple band/variables of the same timestamp
+                    data = data.squeeze('time')
+                else:
+                    raise Exception("[!] Not possible to write a 4-dimensional GeoTiff, use NetCDF instead.")
+            if len(data.dims) == 2:
+                data = data.expand_dims('band')
+            bandDim = [d for d in data.dims if d not in ['y','x']][0]
+            data = data.transpose(bandDim,'y','x')
+            # Every Dask worker writes the chunks it computes, the lock serializes the access to the file
+            write_geotiff(data,self.tmpFolderPath + "/output.tiff",str(self.crs),cog=cog,lock=Lock('geotiff-' + self.tmpFolderPath,client=client))
+
+        elif outFormat.lower() in ['netcdf','nc']:
+            self.outFormat = '.nc'
+            self.mimeType = 'application/octet-stream'
+            data = self.partialResults[source]
+            if 'params' not in data.dims:
+                data = self.refactor_data(data)
+            write_netcdf(data,self.tmpFolderPath + "/output.nc")
+
+        elif outFormat.lower() == 'zarr':
+            self.outFormat = '.zarr.zip'
+            self.mimeType = 'application/zip'
+            data = self.partialResults[source]
+            if 'variable' in data.dims:
+                data = data.to_dataset(dim='variable')
             else:
-                return data
+                data = data.to_dataset(name='result')
+            data.attrs['crs'] = str(self.crs)
+            if data.chunks:
+                # Zarr needs regular chunks: the chunks of the computation are kept, unless the last steps made them irregular
+                irregular = {dim: max(c) for dim, c in data.chunks.items() if len(set(c[:-1])) > 1 or (len(c) > 1 and c[-1] > c[0])}
+                if len(irregular) > 0:
+                    data = data.chunk(irregular)
+            for variable in data.variables.values():
+                variable.encoding.pop('chunks',None) # Chunks of the source store (e.g. the cache), not of this data
+            # Every Dask worker writes the chunks it computes directly into the store
+            sanitize_attrs(data).to_zarr(self.tmpFolderPath + '/output.zarr',mode='w',consolidated=True)
+            # The store is kept for load_result, a zip copy is delivered
+            shutil.make_archive(self.tmpFolderPath + '/output.zarr','zip',self.tmpFolderPath,'output.zarr')
+
+        elif outFormat.lower() == 'json':
+            self.outFormat = '.json'
+            self.mimeType = 'application/json'
+            self.partialResults[node.id] = self.partialResults[source].to_dict()
+            with open(self.tmpFolderPath + "/output.json", 'w') as outfile:
+                json.dump(self.partialResults[node.id],outfile)
+
+        else:
+            raise Exception("[!] Output format not recognized/implemented!")
+
+    def write_parts(self,node,data,outFormat):
+        # Streaming mode: the result is computed and written in parts, one per date or per strip of rows. Every part is
+        # listed in parts/manifest.json as soon as it is complete, parts/done is written after the last one
+        partsFolder = self.tmpFolderPath + '/parts/'
+        os.makedirs(partsFolder,exist_ok=True)
+        if outFormat in ['netcdf','nc']:
+            self.outFormat = '.nc'
+            self.mimeType = 'application/octet-stream'
+            writer = lambda part, path: write_netcdf(self.refactor_data(part),path)
         else:
-            tmp = xr.Dataset(coords={'y':data.y,'x':data.x})
-            if 'variable' in data.coords:
-                try:
-                    for var in data['variable'].values:
-                        tmp[str(var)] = (('y','x'),data.loc[dict(variable=var)].drop('variable').transpose('y','x'))
-                except Exception as e:
-                    print(e)
-                    tmp[str((data['variable'].values))] = (('y','x'),data.transpose('y','x'))
+            self.outFormat = '.tiff'
+            self.mimeType = 'image/tiff'
+            writer = self.write_tiff_part
+        if 'time' in data.dims and len(data.time) > 1:
+            dim = 'time'
+            sizes = [1] * len(data.time)
+        else:
+            dim = 'y'
+            if data.chunks is not None:
+                sizes = dict(zip(data.dims,data.chunks))['y']
+            else:
+                sizes = [STREAM_STRIP_ROWS] * int(math.ceil(len(data.y) / STREAM_STRIP_ROWS))
+        if data.chunks is None:
+            data = data.chunk() # The parts are computed by the Dask cluster, see below
+        parts = []
+        start = 0
+        for size in sizes:
+            parts.append(data.isel({dim: slice(start,start + size)}))
+            start += size
+        # All the parts are submitted as a single graph, so that the work they share (e.g. fit_curve or the geocoding
+        # of the same dates) is computed only once. They are written in the order they are completed
+        futures = client.compute(parts)
+        index = {future.key: i for i, future in enumerate(futures)}
+        names = []
+        for future in as_completed(futures):
+            part = future.result()
+            name = 'part_{:05d}{}'.format(index[future.key],self.outFormat)
+            writer(part,partsFolder + '.' + name)
+            os.rename(partsFolder + '.' + name,partsFolder + name)
+            names.append(name)
+            with open(partsFolder + '.manifest.json','w') as f:
+                json.dump({'parts': names, 'mimeType': self.mimeType, 'dimension': dim},f)
+            os.rename(partsFolder + '.manifest.json',partsFolder + 'manifest.json')
+            future.release()
+        open(partsFolder + 'done','w').close()
+
+    def write_tiff_part(self,part,path):
+        if 'time' in part.dims:
+            if len(part.time) == 1:
+                part = part.squeeze('time',drop=True)
+            elif 'variable' in part.dims and len(part.variable) == 1:
+                part = part.squeeze('variable',drop=True) # The dates are the bands of the GeoTiff
             else:
-                return data
+                raise Exception("[!] Not possible to write a 4-dimensional GeoTiff, use NetCDF instead.")
+        if part.dtype == 'bool':
+            part = part.astype(np.uint8)
+        part.attrs = {}
+        part.rio.write_crs(str(self.crs)).rio.to_raster(path,driver='GTiff')
+
+    def refactor_data(self,data):
+        # Dataset with a variable per band and the time dimension named t, to get a well formatted netCDF
+        if 'variable' not in data.dims:
+            return data
+        tmp = data.to_dataset(dim='variable')
+        if 'time' in tmp.dims:
+            tmp = tmp.rename({'time':'t'})
+        tmp = tmp.transpose(*[d for d in ['t','y','x'] if d in tmp.dims],...)
         tmp.attrs = data.attrs
-        return tmp
\ No newline at end of file
+        return tmp
+
+def data_crs(data):
+    # CRS of the data, as set by ODC, geocode or load_result in its attributes, or by rioxarray
+    if data.attrs.get('crs') is not None:
+        return str(data.attrs['crs'])
+    try:
+        if data.rio.crs is not None:
+            return str(data.rio.crs)
+    except Exception:
+        pass
+    raise Exception('[!] The CRS of the data is unknown, the bounding box can\'t be applied.')
+
+def radar_geometry(data):
+    # Data of SAR2Cube collections not geocoded yet: its pixels are located by the grid_lon and grid_lat bands
+    return 'variable' in data.dims and all([v in data['variable'].values for v in ['grid_lon','grid_lat']])
+
+
+load_plugins(PROCESS_PLUGINS)
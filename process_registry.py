@@ -0,0 +1,102 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Registry of the openEO processes implemented by the back-end.
+# Every process id is mapped to the callable that executes it, so that a node is dispatched with a single dictionary
+# lookup. New processes (e.g. SAR2Cube kernels) can be added from external modules with the register_process decorator:
+#
+#     from process_registry import register_process
+#
+#     @register_process('my_process', required=['data'])
+#     def my_process(eo, node):
+#         source = node.arguments['data']['from_node']
+#         eo.partialResults[node.id] = eo.partialResults[source] * 2
+#
+# The handler receives the OpenEO object executing the graph and the node to process.
+
+import importlib
+from time import time
+
+from openEO_error_messages import *
+
+PROCESSES       = {} # process_id -> Process
+CHILD_PROCESSES = {} # parent process_id -> {process_id -> Process}, for child graphs translated by their parent (e.g. fit_curve)
+HOOKS           = [] # Callables hook(node,elapsedTime) called after every handler, e.g. for profiling
+
+
+class Process():
+    def __init__(self,processId,handler,required=None,optional=None,terminal=False):
+        self.processId = processId
+        self.handler   = handler
+        self.required  = required if required is not None else [] # Arguments that must be present in the node
+        self.optional  = optional if optional is not None else {} # Arguments with their default value, set if not present in the node
+        self.terminal  = terminal                                 # True if the graph execution ends with this process (e.g. save_result)
+
+    def check_arguments(self,node):
+        for argument in self.required:
+            if argument not in node.arguments:
+                raise Exception(ArgumentMissing.format(argument,self.processId))
+        for argument, default in self.optional.items():
+            if argument not in node.arguments:
+                node.arguments[argument] = default
+
+    def __call__(self,owner,node):
+        self.check_arguments(node)
+        start = time()
+        result = self.handler(owner,node)
+        elapsedTime = time() - start
+        for hook in HOOKS:
+            hook(node,elapsedTime)
+        return result
+
+
+def register_process(*processIds,required=None,optional=None,terminal=False,parents=None):
+    """
+    Decorator registering a handler for one or more openEO processes.
+
+    :param processIds: the openEO process ids executed by the decorated handler
+    :param list required: arguments that must be present in the node
+    :param dict optional: arguments with their default value, added to the node if missing
+    :param bool terminal: if True the graph execution stops after this process
+    :param list parents: if set, the handler is used only for nodes in the child graph of these processes
+    """
+    def decorator(handler):
+        for processId in processIds:
+            process = Process(processId,handler,required,optional,terminal)
+            if parents is None:
+                PROCESSES[processId] = process
+            else:
+                for parent in parents:
+                    CHILD_PROCESSES.setdefault(parent,{})[processId] = process
+        return handler
+    return decorator
+
+def translated_by_parent(*parents):
+    # The child graphs of these processes are not executed node by node, their parent handler translates them
+    for parent in parents:
+        CHILD_PROCESSES.setdefault(parent,{})
+
+def get_process(node):
+    # Returns the Process executing the node, or None if the node belongs to a child graph translated by its parent
+    parent = node.parent_process
+    if parent is not None and parent.process_id in CHILD_PROCESSES:
+        return CHILD_PROCESSES[parent.process_id].get(node.process_id)
+    try:
+        return PROCESSES[node.process_id]
+    except KeyError:
+        raise Exception(ProcessUnsupported.format(node.process_id))
+
+def add_hook(hook):
+    HOOKS.append(hook)
+
+def remove_hook(hook):
+    HOOKS.remove(hook)
+
+def load_plugins(moduleNames):
+    # Importing a module is enough to register the processes it decorates
+    for moduleName in moduleNames:
+        try:
+            importlib.import_module(moduleName)
+        except Exception as e:
+            print('[!] Could not load processes from {}: {}'.format(moduleName,e))
@@ -0,0 +1,160 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Content-addressed cache of loaded data, shared by all the requests and by all the gunicorn workers.
+# Every entry is a chunked Zarr store named after the hash of what has been loaded. The last access time of an entry
+# is the modification time of its folder, used to evict the least recently used entries when the cache is full.
+# Only data requested at least twice is written: the first request of a key leaves a marker file (key.seen), an entry
+# is written by a following request of the same key.
+
+import os
+import json
+import shutil
+import hashlib
+import uuid
+from time import time
+import numpy as np
+import xarray as xr
+import dask
+
+
+class ResultCache():
+    def __init__(self,folder,maxSize,maxEntrySize,protectTime=3600,seenTime=86400):
+        self.folder       = folder
+        self.maxSize      = maxSize      # Bytes
+        self.maxEntrySize = maxEntrySize # Bytes, bigger data is never cached
+        self.protectTime  = protectTime  # Seconds, entries accessed more recently may be in use and are not evicted
+        self.seenTime     = seenTime     # Seconds, a key requested again within this time is cached
+        try:
+            os.makedirs(self.folder)
+        except:
+            pass
+
+    def key(self,*args):
+        # Canonical hash of the description of the data
+        return hashlib.sha1(json.dumps(args,sort_keys=True,default=str).encode('utf-8')).hexdigest()
+
+    def path(self,key):
+        return os.path.join(self.folder,key + '.zarr')
+
+    def get(self,key):
+        path = self.path(key)
+        if not os.path.exists(os.path.join(path,'.zmetadata')): # The consolidated metadata is written last, only complete entries have it
+            return None
+        try:
+            os.utime(path)
+            data = xr.open_zarr(path,consolidated=True)
+        except Exception as e:
+            print('[!] Cache entry {} not readable: {}'.format(key,e))
+            return None
+        print('[*] Data read from cache entry {}'.format(key))
+        return data
+
+    def put(self,key,data):
+        """
+        Prepares the writing of the data into the cache, without reading it.
+
+        The returned Dask delayed writes the entry when computed: computing it together with the result lets the
+        scheduler read the loaded chunks only once for both.
+        :param str key: from ResultCache.key
+        :param data: lazy xarray Dataset
+        :return: Dask delayed, None if the data is too big, requested for the first time or already cached
+        """
+        if data.nbytes > self.maxEntrySize or not self.seen(key):
+            return None
+        path = self.path(key)
+        if os.path.exists(os.path.join(path,'.zmetadata')):
+            return None
+        tmpPath = path + '.' + str(uuid.uuid4()) + '.tmp'
+        try:
+            store = sanitize_attrs(data).to_zarr(tmpPath,consolidated=True,compute=False) # Only the metadata is written here
+        except Exception as e:
+            print('[!] Cache entry {} not written: {}'.format(key,e))
+            shutil.rmtree(tmpPath,ignore_errors=True)
+            return None
+        return dask.delayed(self.commit)(store,key,tmpPath)
+
+    def commit(self,store,key,tmpPath):
+        # Runs after the chunks have been written (store is the result of the write): the entry becomes visible
+        path = self.path(key)
+        try:
+            os.rename(tmpPath,path)
+            print('[*] Cache entry {} written'.format(key))
+        except Exception as e: # Another request may have written the same entry
+            print('[!] Cache entry {} not written: {}'.format(key,e))
+            shutil.rmtree(tmpPath,ignore_errors=True)
+        self.evict()
+
+    def seen(self,key):
+        # Returns True if the key has been requested recently, otherwise records the request
+        marker = os.path.join(self.folder,key + '.seen')
+        try:
+            if time() - os.path.getmtime(marker) < self.seenTime:
+                return True
+        except OSError:
+            pass
+        try:
+            open(marker,'w').close()
+        except Exception as e:
+            print('[!] Cache request of {} not recorded: {}'.format(key,e))
+        return False
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder,name)
+            if name.endswith('.zarr'):
+                entries.append((os.path.getmtime(path),folder_size(path),path))
+            elif name.endswith('.tmp') and time() - last_modified(path) > self.protectTime:
+                shutil.rmtree(path,ignore_errors=True) # Left by a write which failed or whose process was killed
+            elif name.endswith('.seen') and time() - last_modified(path) > self.seenTime:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        entries.sort()
+        totalSize = sum([e[1] for e in entries])
+        for accessTime, size, path in entries:
+            if totalSize <= self.maxSize:
+                break
+            if time() - accessTime < self.protectTime:
+                continue
+            shutil.rmtree(path,ignore_errors=True)
+            totalSize -= size
+
+def folder_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            size += os.path.getsize(os.path.join(root,f))
+    return size
+
+def last_modified(path):
+    # The chunks are written in the folders of the variables, the root folder isn't modified by them
+    try:
+        modified = os.path.getmtime(path)
+        for root, dirs, files in os.walk(path):
+            modified = max([modified] + [os.path.getmtime(os.path.join(root,d)) for d in dirs])
+    except OSError: # Renamed or removed in the meantime
+        return time()
+    return modified
+
+def sanitize_attrs(data):
+    # Zarr stores only JSON serializable attributes, e.g. the CRS objects set by ODC are converted to strings
+    def sanitize(attrs):
+        clean = {}
+        for k, v in attrs.items():
+            if isinstance(v,(np.generic,)):
+                v = v.item()
+            try:
+                json.dumps(v)
+            except:
+                v = str(v)
+            clean[k] = v
+        return clean
+    data = data.copy()
+    data.attrs = sanitize(data.attrs)
+    for variable in data.variables.values():
+        variable.attrs = sanitize(variable.attrs)
+    return data
@@ -0,0 +1,94 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Spatial index over the geolocation grid (grid_lon, grid_lat) of the SAR2Cube products, which are in radar geometry.
+# The grid is split in blocks of BLOCK_SIZE x BLOCK_SIZE pixels and the index stores the lon/lat range of every block.
+# A lat/lon bounding box is mapped to the row/column window of the blocks it intersects, so that only this window of
+# the lazily loaded data is read. The index is computed once per product grid and stored in a folder.
+
+import os
+import threading
+import numpy as np
+
+BLOCK_SIZE = 256 # Pixels, side of the blocks of the index
+
+indexes     = {} # key -> Sar2CubeIndex
+indexesLock = threading.Lock()
+
+
+class Sar2CubeIndex():
+    def __init__(self,shape,lonMin,lonMax,latMin,latMax,blockSize=BLOCK_SIZE):
+        self.shape     = tuple(shape) # (rows, columns) of the geolocation grid
+        self.lonMin    = lonMin       # (block rows, block columns) arrays
+        self.lonMax    = lonMax
+        self.latMin    = latMin
+        self.latMax    = latMax
+        self.blockSize = blockSize
+
+    @classmethod
+    def build(cls,gridLon,gridLat,blockSize=BLOCK_SIZE):
+        # gridLon and gridLat are 2D DataArrays, reduced block by block without loading the whole grid in memory
+        yDim, xDim = gridLon.dims
+        blocks = {yDim: blockSize, xDim: blockSize}
+        lon = gridLon.coarsen(blocks,boundary='pad')
+        lat = gridLat.coarsen(blocks,boundary='pad')
+        return cls(gridLon.shape,lon.min().values,lon.max().values,lat.min().values,lat.max().values,blockSize)
+
+    @classmethod
+    def read(cls,path):
+        stored = np.load(path)
+        return cls(stored['shape'],stored['lonMin'],stored['lonMax'],stored['latMin'],stored['latMax'],int(stored['blockSize']))
+
+    def write(self,path):
+        tmpPath = path + '.' + str(os.getpid()) + '.tmp.npz'
+        np.savez(tmpPath,shape=self.shape,lonMin=self.lonMin,lonMax=self.lonMax,latMin=self.latMin,latMax=self.latMax,blockSize=self.blockSize)
+        os.rename(tmpPath,path)
+
+    def window(self,west,south,east,north):
+        """
+        Returns the row and column slices of the grid containing the pixels inside the bounding box.
+
+        :return: (rows, columns) slices, None if no pixel of the grid is inside the bounding box
+        """
+        with np.errstate(invalid='ignore'): # Blocks of nodata only have NaN ranges and are never selected
+            blocks = (self.lonMin <= east) & (self.lonMax >= west) & (self.latMin <= north) & (self.latMax >= south)
+        rows, cols = np.nonzero(blocks)
+        if len(rows) == 0:
+            return None
+        rowSlice = slice(rows.min() * self.blockSize,min((rows.max() + 1) * self.blockSize,self.shape[0]))
+        colSlice = slice(cols.min() * self.blockSize,min((cols.max() + 1) * self.blockSize,self.shape[1]))
+        return rowSlice, colSlice
+
+def get_index(product,gridLon,gridLat,folder):
+    """
+    Returns the index of the product, reading it from the folder or building it from the geolocation grid.
+
+    :param str product: name of the SAR2Cube product
+    :param gridLon: 2D DataArray of the longitudes of the product, lazy
+    :param gridLat: 2D DataArray of the latitudes of the product, lazy
+    :param str folder: where the indexes are stored
+    """
+    shape = tuple(gridLon.shape)
+    key = '{}_{}x{}'.format(product,shape[0],shape[1]) # A product re-processed on a different grid gets a new index
+    with indexesLock:
+        if key in indexes:
+            return indexes[key]
+    path = os.path.join(folder,key + '.npz')
+    index = None
+    if os.path.exists(path):
+        try:
+            index = Sar2CubeIndex.read(path)
+        except Exception as e:
+            print('[!] SAR2Cube index of {} not readable: {}'.format(product,e))
+    if index is None:
+        print('[*] Building the SAR2Cube index of {}'.format(product))
+        index = Sar2CubeIndex.build(gridLon,gridLat)
+        try:
+            os.makedirs(folder,exist_ok=True)
+            index.write(path)
+        except Exception as e:
+            print('[!] SAR2Cube index of {} not written: {}'.format(product,e))
+    with indexesLock:
+        indexes[key] = index
+    return index
@@ -0,0 +1,42 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+# Date matching of resample_cube_temporal. For every target date, two searchsorted calls on the sorted source dates
+# give the last source date not after it and the first source date not before it, for all the target dates at once.
+
+import numpy as np
+
+MODES = ['nearest','before','after']
+
+
+def match_dates(sourceTimes,targetTimes,mode='nearest',validWithin=None):
+    """
+    Finds the date of the source matching every target date.
+
+    :param sourceTimes: sorted array of datetime64, dates of the data
+    :param targetTimes: array of datetime64, dates of the target
+    :param str mode: 'nearest' source date (the earlier one on ties), or the nearest one 'before' or 'after' the target date
+    :param validWithin: maximum distance in days, None for no limit
+    :return: (index, valid) arrays, with the index in sourceTimes of every target date and whether a date was matched
+    """
+    if mode not in MODES:
+        raise Exception("[!] resample_cube_temporal mode must be 'nearest', 'before' or 'after', got {}".format(mode))
+    before = np.searchsorted(sourceTimes,targetTimes,side='right') - 1
+    after  = np.searchsorted(sourceTimes,targetTimes,side='left')
+    hasBefore = before >= 0
+    hasAfter  = after < len(sourceTimes)
+    before = np.clip(before,0,len(sourceTimes) - 1)
+    after  = np.clip(after,0,len(sourceTimes) - 1)
+    if mode == 'before':
+        index, valid = before, hasBefore
+    elif mode == 'after':
+        index, valid = after, hasAfter
+    else:
+        closerAfter = hasAfter & (~hasBefore | (np.abs(sourceTimes[after] - targetTimes) < np.abs(targetTimes - sourceTimes[before])))
+        index = np.where(closerAfter,after,before)
+        valid = hasBefore | hasAfter
+    if validWithin is not None:
+        tolerance = np.timedelta64(int(round(float(validWithin) * 86400)),'s')
+        valid = valid & (np.abs(sourceTimes[index] - targetTimes) <= tolerance)
+    return index, valid
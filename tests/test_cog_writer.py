@@ -0,0 +1,51 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+xr = pytest.importorskip('xarray')
+da = pytest.importorskip('dask.array')
+rasterio = pytest.importorskip('rasterio')
+
+from cog_writer import write_geotiff, geotiff_profile
+
+
+def multiband_cube(bands=4,size=1200):
+    rng = np.random.RandomState(0)
+    values = np.round(rng.rand(bands,size,size) * 100).astype(np.float32) # Compressible, like real data
+    data = xr.DataArray(da.from_array(values,chunks=(2,500,500)),dims=('variable','y','x'),
+                        coords={'variable': ['b{}'.format(i) for i in range(bands)],
+                                'y': 5000000 - np.arange(size) * 10.0 - 5,'x': 600000 + np.arange(size) * 10.0 + 5})
+    return data, values
+
+def test_values_read_back(tmp_path):
+    data, values = multiband_cube()
+    path = str(tmp_path / 'output.tiff')
+    write_geotiff(data,path,'epsg:32632')
+    with rasterio.open(path) as src:
+        assert src.count == values.shape[0]
+        assert src.descriptions == tuple(data.variable.values)
+        np.testing.assert_array_equal(src.read(),values)
+        assert src.transform.e == -10 and src.transform.f == 5000000
+
+def test_multiband_size(tmp_path):
+    # The bands are written in separate windows: every tile must be written once, as when writing all at once
+    data, values = multiband_cube()
+    path = str(tmp_path / 'output.tiff')
+    write_geotiff(data,path,'epsg:32632')
+    reference = str(tmp_path / 'reference.tiff')
+    with rasterio.open(reference,'w',**geotiff_profile(data,'epsg:32632')) as dst:
+        dst.write(values)
+    assert os.path.getsize(path) <= 1.05 * os.path.getsize(reference)
+
+def test_cog(tmp_path):
+    data, values = multiband_cube(bands=2,size=1024)
+    path = str(tmp_path / 'output.tiff')
+    write_geotiff(data,path,'epsg:32632',cog=True)
+    with rasterio.open(path) as src:
+        np.testing.assert_array_equal(src.read(),values)
+        assert src.overviews(1) == [2] # Down to the tile size
+    assert [f for f in os.listdir(str(tmp_path)) if f.startswith('.')] == [] # The temporary file is removed
@@ -0,0 +1,67 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import pytest
+
+np = pytest.importorskip('numpy')
+xr = pytest.importorskip('xarray')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('dask.array')
+
+from coherence import coherence
+
+VARIABLES = ['i_VV','q_VV','i_VH','q_VH']
+
+
+def slc_cube(days=(0,6,12,20,26),shape=(8,10)):
+    values = np.random.default_rng(0).normal(size=(len(VARIABLES),len(days)) + shape).astype(np.float32)
+    times = pd.Timestamp('2020-01-01') + pd.to_timedelta(list(days),unit='D')
+    return xr.DataArray(values,dims=('variable','time','y','x'),
+                        coords={'variable': VARIABLES,'time': times,'y': np.arange(shape[0]),'x': np.arange(shape[1])}).chunk({'time': 1})
+
+def previous_coherence(src,timedelta):
+    # Pair by pair computation of the previous implementation
+    timesteps = src['time'].values
+    pairs = [(timesteps[k],timesteps[k + 1]) for k in range(len(timesteps) - 1)
+             if np.timedelta64(timesteps[k + 1] - timesteps[k],'D') == np.timedelta64(timedelta,'D')]
+    results = []
+    for t0, t1 in pairs:
+        bands = {}
+        for pol in ['VV','VH']:
+            i0 = src.loc[dict(variable='i_' + pol,time=t0)]
+            q0 = src.loc[dict(variable='q_' + pol,time=t0)]
+            i1 = src.loc[dict(variable='i_' + pol,time=t1)]
+            q1 = src.loc[dict(variable='q_' + pol,time=t1)]
+            norm = np.sqrt((i0**2 + q0**2) * (i1**2 + q1**2))
+            bands['i_' + pol] = ((i1*q0 - i0*q1) / norm).drop_vars(['variable','time'])
+            bands['q_' + pol] = ((i0*i1 + q0*q1) / norm).drop_vars(['variable','time'])
+        results.append(xr.Dataset(bands).assign_coords(time=t0).expand_dims('time'))
+    return xr.concat(results,dim='time').to_array()
+
+def test_matches_the_previous_implementation():
+    src = slc_cube()
+    result = coherence(src,6)
+    expected = previous_coherence(src,6)
+    assert list(result['variable'].values) == VARIABLES
+    np.testing.assert_array_equal(result.time.values,expected.time.values)
+    np.testing.assert_allclose(result.transpose('variable','time','y','x').values,expected.values,rtol=1e-5,atol=1e-6)
+
+def test_other_timedelta():
+    src = slc_cube(days=(0,12,24,30))
+    result = coherence(src,12)
+    assert len(result.time) == 2
+    np.testing.assert_allclose(result.transpose('variable','time','y','x').values,previous_coherence(src,12).values,rtol=1e-5,atol=1e-6)
+
+def test_window_of_one_pixel_changes_nothing():
+    src = slc_cube()
+    np.testing.assert_allclose(coherence(src,6,[1,1]).values,coherence(src,6).values,rtol=1e-6)
+
+def test_window_bounds_the_magnitude():
+    result = coherence(slc_cube(),6,[3,3])
+    magnitude = np.sqrt(result.sel(variable='i_VV')**2 + result.sel(variable='q_VV')**2)
+    assert float(magnitude.max()) <= 1 + 1e-5
+
+def test_no_pairs():
+    with pytest.raises(Exception):
+        coherence(slc_cube(days=(0,5,11)),6)
@@ -0,0 +1,66 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import pytest
+
+np = pytest.importorskip('numpy')
+xr = pytest.importorskip('xarray')
+pytest.importorskip('dask.array')
+ndimage = pytest.importorskip('scipy.ndimage')
+
+from convolution import convolve, separate
+
+
+def cube(shape=(3,50,70),chunks=(1,16,24),seed=0):
+    values = np.random.default_rng(seed).random(shape).astype(np.float32)
+    return xr.DataArray(values,dims=('time','y','x')).chunk(dict(zip(('time','y','x'),chunks)))
+
+def expected(data,kernel,mode,cval=0):
+    # Convolution of the whole image at once, as before the chunked engine
+    kernel = np.asarray(kernel,dtype=np.float64)
+    return np.stack([ndimage.convolve(image.astype(np.float64),kernel,mode=mode,cval=cval) for image in data.values])
+
+@pytest.mark.parametrize('mode', ['constant','nearest','reflect','mirror','wrap'])
+def test_border_modes(mode):
+    data = cube()
+    kernel = np.random.default_rng(1).random((5,3))
+    result = convolve(data,kernel,mode=mode,cval=0.5)
+    assert result.dims == data.dims
+    assert result.chunks == data.chunks
+    np.testing.assert_allclose(result.values,expected(data,kernel,mode,0.5),rtol=1e-5,atol=1e-5)
+
+def test_separable_kernel():
+    kernel = np.outer([1,2,1],[1,0,-1]).astype(np.float64)
+    assert separate(kernel) is not None
+    data = cube()
+    np.testing.assert_allclose(convolve(data,kernel).values,expected(data,kernel,'constant'),rtol=1e-5,atol=1e-5)
+
+def test_fft_kernel():
+    kernel = np.random.default_rng(2).random((15,15))
+    assert separate(kernel) is None
+    data = cube(chunks=(1,32,32))
+    np.testing.assert_allclose(convolve(data,kernel,mode='reflect').values,expected(data,kernel,'reflect'),rtol=1e-4,atol=1e-4)
+
+def test_chunks_smaller_than_the_halo():
+    kernel = np.ones((9,9)) / 81
+    data = cube(chunks=(1,3,5))
+    np.testing.assert_allclose(convolve(data,kernel,mode='nearest').values,expected(data,kernel,'nearest'),rtol=1e-5,atol=1e-5)
+
+def test_dimension_order_kept():
+    data = cube().transpose('y','time','x')
+    kernel = np.random.default_rng(3).random((3,3))
+    result = convolve(data,kernel)
+    assert result.dims == ('y','time','x')
+    np.testing.assert_allclose(result.transpose('time','y','x').values,expected(data.transpose('time','y','x'),kernel,'constant'),rtol=1e-5,atol=1e-5)
+
+def test_integer_data_convolved_as_float():
+    data = (cube() * 100).astype(np.int16)
+    kernel = np.ones((3,3))
+    result = convolve(data,kernel)
+    assert np.issubdtype(result.dtype,np.floating)
+    np.testing.assert_allclose(result.values,expected(data,kernel,'constant'),rtol=1e-5,atol=1e-3)
+
+def test_even_kernel_rejected():
+    with pytest.raises(Exception):
+        convolve(cube(),np.ones((2,3)))
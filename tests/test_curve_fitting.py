@@ -0,0 +1,94 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from curve_fitting import parameter_degree, design_matrix, fit_linear, fit_nonlinear
+
+W = 2 * np.pi / 365
+
+
+class Node():
+    # Minimal node of a graph translated by openeo_pg_parser
+    def __init__(self,id,process_id,arguments):
+        self.id         = id
+        self.process_id = process_id
+        self.arguments  = arguments
+
+def harmonic(x,a0,a1,a2):
+    return a0 + a1 * np.cos(W * x) + a2 * np.sin(W * x)
+
+def exponential(x,a0,a1):
+    return a0 * np.exp(-a1 * x)
+
+def observations(function,x,params,rows=4,cols=5,seed=0):
+    # (rows, cols, T) observations of the model with the given parameters per pixel, with some noise
+    rng = np.random.default_rng(seed)
+    y = np.stack([function(x,*p) for p in params.reshape((-1,params.shape[-1]))])
+    y = y + rng.normal(0,0.01,y.shape)
+    return y.reshape((rows,cols,len(x)))
+
+def nodes_of(*nodes):
+    return {node.id: node for node in nodes}
+
+def parameter(id,index):
+    return Node(id,'array_element',{'data': {'from_parameter': 'parameters'},'index': index})
+
+def test_harmonic_model_is_linear():
+    nodes = nodes_of(parameter('a0',0),parameter('a1',1),
+                     Node('wx','multiply',{'x': 0.0172,'y': {'from_parameter': 'x'}}),
+                     Node('cos','cos',{'x': {'from_node': 'wx'}}),
+                     Node('m','multiply',{'x': {'from_node': 'a1'},'y': {'from_node': 'cos'}}),
+                     Node('sum','add',{'x': {'from_node': 'a0'},'y': {'from_node': 'm'}}))
+    assert parameter_degree('sum',nodes) == 1
+
+@pytest.mark.parametrize('process, arguments, degree', [
+    ('power',    {'base': {'from_node': 'a0'},'p': 2},               2),
+    ('power',    {'base': {'from_node': 'a0'},'p': 1},               1),
+    ('power',    {'base': {'from_node': 'a0'},'p': 0.5},             np.inf),
+    ('power',    {'base': 2,'p': {'from_node': 'a0'}},               np.inf),
+    ('exp',      {'x': {'from_node': 'a0'}},                         np.inf),
+    ('divide',   {'x': {'from_node': 'a0'},'y': 2},                  1),
+    ('divide',   {'x': 1,'y': {'from_node': 'a0'}},                  np.inf),
+    ('multiply', {'x': {'from_node': 'a0'},'y': {'from_node': 'a0'}},2),
+    ('unknown',  {'x': {'from_node': 'a0'}},                         np.inf),
+])
+def test_parameter_degree(process,arguments,degree):
+    nodes = nodes_of(parameter('a0',0),Node('f',process,arguments))
+    assert parameter_degree('f',nodes) == degree
+
+def test_linear_fit_matches_per_pixel_least_squares():
+    x = np.arange(0,730,16,dtype=np.float64)
+    params = np.random.default_rng(1).uniform(0.1,1,(20,3))
+    y = observations(harmonic,x,params)
+    y[0,0,::3] = np.nan # Masked observations
+    y[1,2,::5] = 0
+    B, c = design_matrix(harmonic,x,3)
+    fitted = fit_linear(y,B,c)
+    assert fitted.shape == (4,5,3)
+    for i in range(4):
+        for j in range(5):
+            valid = np.isfinite(y[i,j]) & (y[i,j] != 0)
+            expected = np.linalg.lstsq(B[valid],y[i,j][valid] - c[valid],rcond=None)[0]
+            np.testing.assert_allclose(fitted[i,j],expected,rtol=1e-4,atol=1e-5)
+
+def test_linear_fit_with_too_few_observations():
+    x = np.arange(0,100,10,dtype=np.float64)
+    y = np.full((1,1,len(x)),np.nan)
+    y[0,0,:2] = 1
+    B, c = design_matrix(harmonic,x,3)
+    assert np.all(np.isnan(fit_linear(y,B,c)))
+
+def test_nonlinear_fit_matches_curve_fit():
+    optimize = pytest.importorskip('scipy.optimize')
+    x = np.linspace(0,5,30)
+    params = np.random.default_rng(2).uniform([0.5,0.2],[2,1.5],(20,2))
+    y = observations(exponential,x,params)
+    fitted = fit_nonlinear(y,exponential,x,2)
+    for i in range(4):
+        for j in range(5):
+            expected = optimize.curve_fit(exponential,x,y[i,j])[0]
+            np.testing.assert_allclose(fitted[i,j],expected,rtol=1e-3,atol=1e-4)
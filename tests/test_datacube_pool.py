@@ -0,0 +1,89 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import sys
+import types
+import threading
+import importlib
+import pytest
+
+
+class FakeDatacube():
+    # Datacube counting the connections opened, its index fails the health check once closed
+    opened = 0
+
+    def __init__(self,config=None,app=None):
+        FakeDatacube.opened += 1
+        self.closed = False
+        self.index = types.SimpleNamespace(datasets=types.SimpleNamespace(has=self.has))
+
+    def has(self,datasetId):
+        if self.closed:
+            raise Exception('connection closed')
+        return False
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def pool_module(monkeypatch):
+    # The pool is imported with a fake datacube module, no ODC index is needed
+    monkeypatch.setitem(sys.modules,'datacube',types.ModuleType('datacube'))
+    sys.modules['datacube'].Datacube = FakeDatacube
+    monkeypatch.delitem(sys.modules,'datacube_pool',raising=False)
+    FakeDatacube.opened = 0
+    module = importlib.import_module('datacube_pool')
+    yield module
+    sys.modules.pop('datacube_pool',None)
+
+def test_connections_reused(pool_module):
+    pool = pool_module.DatacubePool('config',size=2)
+    dc = pool.acquire()
+    pool.release(dc)
+    assert pool.acquire() is dc
+    assert FakeDatacube.opened == 1
+
+def test_pool_size_bounds_the_connections(pool_module):
+    pool = pool_module.DatacubePool('config',size=2)
+    first, second = pool.acquire(), pool.acquire()
+    assert FakeDatacube.opened == 2
+    acquired = []
+    waiting = threading.Thread(target=lambda: acquired.append(pool.acquire(timeout=5)))
+    waiting.start()
+    pool.release(first)
+    waiting.join()
+    assert acquired == [first]
+    assert FakeDatacube.opened == 2
+
+def test_busy_pool_times_out(pool_module):
+    pool = pool_module.DatacubePool('config',size=1)
+    pool.acquire()
+    with pytest.raises(Exception) as error:
+        pool.acquire(timeout=0.1)
+    assert 'busy' in str(error.value)
+
+def test_unhealthy_connection_replaced(pool_module,monkeypatch):
+    monkeypatch.setattr(pool_module,'HEALTHCHECK_INTERVAL',-1) # Checked at every reuse
+    pool = pool_module.DatacubePool('config',size=1)
+    dc = pool.acquire()
+    dc.close()
+    pool.release(dc)
+    replaced = pool.acquire()
+    assert replaced is not dc
+    assert FakeDatacube.opened == 2
+
+def test_failed_connection_frees_its_slot(pool_module,monkeypatch):
+    pool = pool_module.DatacubePool('config',size=1)
+    def refuse(config=None,app=None):
+        raise Exception('database unreachable')
+    monkeypatch.setattr(sys.modules['datacube'],'Datacube',refuse)
+    with pytest.raises(Exception):
+        pool.acquire()
+    monkeypatch.setattr(sys.modules['datacube'],'Datacube',FakeDatacube)
+    assert pool.acquire(timeout=0.1) is not None
+
+def test_context_manager_releases(pool_module):
+    with pool_module.datacube_connection('config') as dc:
+        assert pool_module.get_pool('config').idle == []
+    assert pool_module.get_pool('config').idle[0][0] is dc
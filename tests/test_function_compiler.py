@@ -0,0 +1,82 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import threading
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from function_compiler import expression, compile_function
+
+
+class Node():
+    # Minimal node of a graph translated by openeo_pg_parser
+    def __init__(self,id,process_id,arguments):
+        self.id         = id
+        self.process_id = process_id
+        self.arguments  = arguments
+
+def harmonic_nodes(w=0.0172):
+    # a0 + a1 * cos(w * x) + a2 * sin(w * x)
+    nodes = [Node('a0','array_element',{'data': {'from_parameter': 'parameters'},'index': 0}),
+             Node('a1','array_element',{'data': {'from_parameter': 'parameters'},'index': 1}),
+             Node('a2','array_element',{'data': {'from_parameter': 'parameters'},'index': 2}),
+             Node('wx','multiply',{'x': w,'y': {'from_parameter': 'x'}}),
+             Node('cos','cos',{'x': {'from_node': 'wx'}}),
+             Node('sin','sin',{'x': {'from_node': 'wx'}}),
+             Node('m1','multiply',{'x': {'from_node': 'a1'},'y': {'from_node': 'cos'}}),
+             Node('m2','multiply',{'x': {'from_node': 'a2'},'y': {'from_node': 'sin'}}),
+             Node('s1','add',{'x': {'from_node': 'a0'},'y': {'from_node': 'm1'}}),
+             Node('s2','add',{'x': {'from_node': 's1'},'y': {'from_node': 'm2'}})]
+    return {node.id: node for node in nodes}
+
+def test_compiled_function_matches_the_model():
+    function = compile_function('s2',harmonic_nodes(),3)
+    x = np.arange(0,365,5,dtype=np.float64)
+    expected = 0.5 + 0.2 * np.cos(0.0172 * x) - 0.1 * np.sin(0.0172 * x)
+    np.testing.assert_allclose(function(x,0.5,0.2,-0.1),expected)
+
+def test_vectorized_over_the_parameters():
+    function = compile_function('s2',harmonic_nodes(),3)
+    x = np.arange(10,dtype=np.float64)[None,:]
+    a = np.array([[0.5],[1.0]])
+    result = function(x,a,a,a)
+    assert result.shape == (2,10)
+    np.testing.assert_allclose(result[1],function(x[0],1.0,1.0,1.0))
+
+def test_same_source_compiled_once():
+    assert compile_function('s2',harmonic_nodes(),3) is compile_function('s2',harmonic_nodes(),3)
+    assert compile_function('s2',harmonic_nodes(),3) is not compile_function('s2',harmonic_nodes(0.5),3)
+
+def test_power_and_constants():
+    nodes = {'a0': Node('a0','array_element',{'data': {'from_parameter': 'parameters'},'index': 0}),
+             'p': Node('p','power',{'base': {'from_parameter': 'x'},'p': 2}),
+             'm': Node('m','multiply',{'x': {'from_node': 'a0'},'y': {'from_node': 'p'}})}
+    assert expression('m',nodes) == '(a0*(x**2.0))'
+
+def test_division_by_zero():
+    nodes = {'d': Node('d','divide',{'x': {'from_parameter': 'x'},'y': 0})}
+    with pytest.raises(Exception):
+        expression('d',nodes)
+
+def test_unsupported_process():
+    nodes = {'f': Node('f','linear_scale_range',{'x': {'from_parameter': 'x'}})}
+    with pytest.raises(Exception):
+        compile_function('f',nodes,0)
+
+def test_concurrent_compilations_are_isolated():
+    # Every thread compiles a model with its own constant and must get back its own function
+    results = {}
+
+    def compile_and_run(w):
+        function = compile_function('s2',harmonic_nodes(w),3)
+        results[w] = function(np.array([1.0]),0.0,1.0,0.0)[0]
+
+    threads = [threading.Thread(target=compile_and_run,args=(w,)) for w in np.linspace(0.1,1,16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for w, value in results.items():
+        assert value == pytest.approx(np.cos(w))
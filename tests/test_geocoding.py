@@ -0,0 +1,62 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import pytest
+
+np = pytest.importorskip('numpy')
+da = pytest.importorskip('dask.array')
+pytest.importorskip('scipy')
+from scipy.interpolate import LinearNDInterpolator
+
+from geocoding import barycentric_weights, geocode_array, geocode_tiled, get_weights, weights_key
+
+
+def radar_grid(rows=40,cols=30):
+    # Irregular geolocation grid: a rotated and sheared regular grid
+    r, c = np.meshgrid(np.arange(rows),np.arange(cols),indexing='ij')
+    x = 100 + c * 1.0 + r * 0.3
+    y = 200 + r * 1.1 - c * 0.2
+    return x, y
+
+def regular_grid(x,y,size=(25,35)):
+    xReg = np.linspace(x.min() - 2,x.max() + 2,size[1])
+    yReg = np.linspace(y.max() + 2,y.min() - 2,size[0])
+    gx, gy = np.meshgrid(xReg,yReg)
+    return np.c_[gx.ravel(),gy.ravel()], size
+
+def test_weights_match_linear_interpolation():
+    # Baseline: the scipy interpolation used before the weights were cached
+    x, y = radar_grid()
+    points = np.c_[x.ravel(),y.ravel()]
+    targets, shape = regular_grid(x,y)
+    values = np.random.RandomState(0).rand(*x.shape).astype(np.float32)
+    weights = barycentric_weights(points,targets)
+    geocoded = geocode_array(weights,values[None],shape)[0]
+    expected = LinearNDInterpolator(points,values.ravel())(targets).reshape(shape)
+    np.testing.assert_array_equal(np.isnan(geocoded),np.isnan(expected))
+    np.testing.assert_allclose(geocoded[~np.isnan(geocoded)],expected[~np.isnan(expected)],rtol=1e-4,atol=1e-5)
+
+def test_tiled_equals_untiled():
+    x, y = radar_grid()
+    points = np.c_[x.ravel(),y.ravel()]
+    targets, shape = regular_grid(x,y)
+    values = np.random.RandomState(1).rand(5,2,*x.shape).astype(np.float32)
+    weights = barycentric_weights(points,targets)
+    expected = geocode_array(weights,values,shape)
+    tiled = geocode_tiled(weights,da.from_array(values,chunks=(2,2,20,15)),shape,tileSize=8)
+    assert tiled.shape == expected.shape
+    np.testing.assert_allclose(tiled.compute(),expected,rtol=1e-6)
+
+def test_weights_stored_and_read(tmp_path):
+    x, y = radar_grid()
+    targets, shape = regular_grid(x,y)
+    key = weights_key('product','epsg:32632',10,x,y)
+    calls = []
+    def points():
+        calls.append(1)
+        return np.c_[x.ravel(),y.ravel()]
+    first = get_weights(key,str(tmp_path),points,lambda: targets)
+    second = get_weights(key,str(tmp_path),points,lambda: targets)
+    assert len(calls) == 1
+    assert (first != second).nnz == 0
@@ -0,0 +1,105 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from graph_optimizer import graph_keys, eliminate_common_subexpressions, push_down_filters, needs_native_resolution
+
+
+class Node():
+    # Minimal node of a graph translated by openeo_pg_parser
+    def __init__(self,id,process_id,arguments,parent_process=None):
+        self.id             = id
+        self.process_id     = process_id
+        self.arguments      = arguments
+        self.parent_process = parent_process
+
+def load(nodeId,collection='S2',**arguments):
+    arguments['id'] = collection
+    return Node(nodeId,'load_collection',arguments)
+
+def ndvi_graph(suffix,collection='S2'):
+    # load_collection -> reduce_dimension(bands) with a normalized_difference child graph
+    loadNode = load('load' + suffix,collection)
+    reduceNode = Node('reduce' + suffix,'reduce_dimension',{'data': {'from_node': 'load' + suffix},'dimension': 'bands',
+                                                            'reducer': {'callback': {'from_node': 'nd' + suffix}}})
+    nir = Node('nir' + suffix,'array_element',{'data': {'from_parameter': 'data'},'index': 1},reduceNode)
+    red = Node('red' + suffix,'array_element',{'data': {'from_parameter': 'data'},'index': 0},reduceNode)
+    nd  = Node('nd' + suffix,'normalized_difference',{'x': {'from_node': 'nir' + suffix},'y': {'from_node': 'red' + suffix}},reduceNode)
+    return [loadNode,nir,red,nd,reduceNode]
+
+def test_identical_subgraphs_have_the_same_keys():
+    keys = graph_keys(ndvi_graph('1') + ndvi_graph('2'))
+    for name in ['load','nir','red','nd','reduce']:
+        assert keys[name + '1'] == keys[name + '2']
+
+def test_different_arguments_have_different_keys():
+    keys = graph_keys(ndvi_graph('1') + ndvi_graph('2',collection='S1'))
+    assert keys['load1'] != keys['load2']
+    assert keys['reduce1'] != keys['reduce2']
+    assert keys['nd1'] != keys['nd2'] # The parent process provides different data to the child graph
+
+def test_integer_and_float_arguments_match():
+    graph = [load('a'),Node('m1','multiply',{'x': {'from_node': 'a'},'y': 2}),Node('m2','multiply',{'x': {'from_node': 'a'},'y': 2.0})]
+    keys = graph_keys(graph)
+    assert keys['m1'] == keys['m2']
+
+def test_save_result_never_merged():
+    graph = [load('a'),Node('s1','save_result',{'data': {'from_node': 'a'},'format': 'NetCDF'}),
+             Node('s2','save_result',{'data': {'from_node': 'a'},'format': 'NetCDF'})]
+    assert eliminate_common_subexpressions(graph) == {}
+
+def test_duplicates_rewired_to_the_first_node():
+    graph = ndvi_graph('1') + ndvi_graph('2')
+    graph.append(Node('sub','subtract',{'x': {'from_node': 'reduce1'},'y': {'from_node': 'reduce2'}}))
+    aliases = eliminate_common_subexpressions(graph)
+    assert aliases['load2'] == 'load1'
+    assert aliases['reduce2'] == 'reduce1'
+    assert graph[-1].arguments == {'x': {'from_node': 'reduce1'},'y': {'from_node': 'reduce1'}}
+    assert graph[9].arguments['data'] == {'from_node': 'load1'}
+
+def test_resampled_load_not_merged():
+    graph = [load('a'),load('b'),
+             Node('r','resample_spatial',{'data': {'from_node': 'b'},'resolution': 60}),
+             Node('sub','subtract',{'x': {'from_node': 'a'},'y': {'from_node': 'r'}})]
+    aliases = eliminate_common_subexpressions(graph)
+    assert 'b' not in aliases
+
+def test_filters_pushed_down_to_the_query():
+    graph = [load('a',bands=['B02','B04','B08']),
+             Node('fb','filter_bands',{'data': {'from_node': 'a'},'bands': ['B04','B08']}),
+             Node('ft','filter_temporal',{'data': {'from_node': 'fb'},'extent': ['2020-01-01','2020-01-31']}),
+             Node('fx','filter_bbox',{'data': {'from_node': 'ft'},'extent': {'west': 11,'south': 46,'east': 11.5,'north': 46.5}}),
+             Node('s','save_result',{'data': {'from_node': 'fx'},'format': 'NetCDF'})]
+    params = push_down_filters(graph)['a']
+    assert params['bands'] == ['B04','B08']
+    assert params['temporal_extent'] == ['2020-01-01','2020-02-01'] # End date included by filter_temporal
+    assert params['spatial_extent'] == {'west': 11,'south': 46,'east': 11.5,'north': 46.5}
+
+def test_union_of_the_paths_pushed_down():
+    graph = [load('a'),
+             Node('f1','filter_bands',{'data': {'from_node': 'a'},'bands': ['B04']}),
+             Node('f2','filter_bands',{'data': {'from_node': 'a'},'bands': ['B08']}),
+             Node('sub','subtract',{'x': {'from_node': 'f1'},'y': {'from_node': 'f2'}})]
+    assert push_down_filters(graph)['a']['bands'] == ['B04','B08']
+
+def test_not_pushed_down_if_a_path_is_unfiltered():
+    graph = [load('a'),
+             Node('ft','filter_temporal',{'data': {'from_node': 'a'},'extent': ['2020-01-01','2020-01-31']}),
+             Node('sub','subtract',{'x': {'from_node': 'a'},'y': {'from_node': 'ft'}})]
+    assert 'a' not in push_down_filters(graph)
+
+def test_bbox_in_other_crs_not_pushed_down():
+    graph = [load('a'),
+             Node('fx','filter_bbox',{'data': {'from_node': 'a'},'extent': {'west': 600000,'south': 5100000,'east': 610000,'north': 5110000,'crs': 32632}}),
+             Node('s','save_result',{'data': {'from_node': 'fx'},'format': 'NetCDF'})]
+    assert 'a' not in push_down_filters(graph)
+
+def test_native_resolution_for_pixel_processes():
+    graph = [load('a'),load('b','S1'),
+             Node('k','apply_kernel',{'data': {'from_node': 'a'},'kernel': [[1]]}),
+             Node('m','multiply',{'x': {'from_node': 'b'},'y': 2})]
+    assert needs_native_resolution(graph) == ['a']
@@ -0,0 +1,90 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import os
+import sys
+import json
+import types
+import importlib
+import pytest
+
+
+class FakeOpenEO():
+    # Executes a process graph writing its output in the workspace of the job, like OpenEO
+    outFormat = '.nc'
+    mimeType  = 'application/x-netcdf'
+
+    def __init__(self,jsonGraph,streaming=False):
+        if jsonGraph.get('fail'):
+            raise Exception('process graph failed')
+        with open(os.path.join(driver_tmp_folder(),jsonGraph['id'],'output.nc'),'w') as f:
+            f.write('result')
+
+def driver_tmp_folder():
+    return sys.modules['openeo_odc_driver'].TMP_FOLDER_PATH
+
+@pytest.fixture
+def jobs(tmp_path,monkeypatch):
+    # The driver connects to the Dask scheduler when imported, the jobs module is imported with a fake one
+    driver = types.ModuleType('openeo_odc_driver')
+    driver.TMP_FOLDER_PATH = str(tmp_path) + '/'
+    driver.OpenEO = FakeOpenEO
+    monkeypatch.setitem(sys.modules,'openeo_odc_driver',driver)
+    monkeypatch.delitem(sys.modules,'jobs',raising=False)
+    module = importlib.import_module('jobs')
+    for state in [module.QUEUED,module.RUNNING]:
+        os.makedirs(os.path.join(module.QUEUE_FOLDER,state),exist_ok=True)
+    yield module
+    sys.modules.pop('jobs',None)
+
+def test_submitted_job_is_queued(jobs):
+    status = jobs.submit_job({'process_graph': {}},streaming=True)
+    jobId = status['id']
+    assert status['status'] == jobs.QUEUED
+    assert os.path.exists(jobs.queue_entry(jobs.QUEUED,jobId))
+    assert jobs.read_status(jobId)['streaming'] is True
+    with open(jobs.graph_path(jobId)) as f:
+        assert json.load(f)['id'] == jobId
+
+def test_oldest_jobs_claimed_first(jobs):
+    ids = [jobs.submit_job({})['id'] for i in range(3)]
+    for age, jobId in enumerate(ids):
+        os.utime(jobs.queue_entry(jobs.QUEUED,jobId),(1000 - age,1000 - age)) # The last submitted is the oldest
+    assert jobs.claim_jobs(2) == [ids[2],ids[1]]
+    assert os.listdir(os.path.join(jobs.QUEUE_FOLDER,jobs.QUEUED)) == [ids[0]]
+    assert jobs.claim_jobs(0) == []
+
+def test_finished_job(jobs):
+    jobId = jobs.submit_job({})['id']
+    assert jobs.job_result(jobId) is None
+    assert jobs.claim_jobs(1) == [jobId]
+    jobs.run_job(jobId)
+    status = jobs.read_status(jobId)
+    assert status['status'] == jobs.FINISHED
+    assert status['mimeType'] == FakeOpenEO.mimeType
+    assert jobs.job_result(jobId) == os.path.join(jobs.workspace(jobId),'output.nc')
+    assert not os.path.exists(jobs.queue_entry(jobs.RUNNING,jobId))
+
+def test_failed_job(jobs):
+    jobId = jobs.submit_job({'fail': True})['id']
+    jobs.claim_jobs(1)
+    jobs.run_job(jobId)
+    status = jobs.read_status(jobId)
+    assert status['status'] == jobs.ERROR
+    assert status['error'] == 'process graph failed'
+    assert jobs.job_result(jobId) is None
+    assert not os.path.exists(jobs.queue_entry(jobs.RUNNING,jobId))
+
+def test_interrupted_jobs_set_to_error(jobs):
+    jobId = jobs.submit_job({})['id']
+    jobs.claim_jobs(1)
+    jobs.write_status(jobId,status=jobs.RUNNING)
+    jobs.fail_interrupted_jobs()
+    assert jobs.read_status(jobId)['status'] == jobs.ERROR
+    assert os.listdir(os.path.join(jobs.QUEUE_FOLDER,jobs.RUNNING)) == []
+
+def test_only_generated_ids_accepted(jobs):
+    assert jobs.read_status('../etc') is None
+    assert not jobs.valid_job_id('not-a-uuid')
+    assert jobs.valid_job_id(jobs.submit_job({})['id'])
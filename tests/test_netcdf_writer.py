@@ -0,0 +1,52 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import pytest
+
+np = pytest.importorskip('numpy')
+xr = pytest.importorskip('xarray')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('dask.array')
+pytest.importorskip('netCDF4')
+
+from netcdf_writer import netcdf_attrs, write_netcdf
+
+
+def cube():
+    values = np.random.default_rng(0).random((4,20,30)).astype(np.float32)
+    data = xr.DataArray(values,dims=('time','y','x'),name='ndvi',
+                        coords={'time': pd.date_range('2020-01-01',periods=4),'y': np.arange(20),'x': np.arange(30)})
+    data.attrs = {'crs': 'EPSG:32632','valid': True,'resolution': [10,10],'nodata': None,'history': {'step': 1}}
+    data.time.attrs['units'] = 'days since 2020-01-01'
+    return data.chunk({'time': 1,'y': 10,'x': 15})
+
+def test_netcdf_attrs():
+    clean = netcdf_attrs({'a': None,'b': True,'c': [1,2],'d': [[1,2]],'e': {'k': 'v'},'f': 'text','g': 1.5})
+    assert 'a' not in clean
+    assert clean['b'] == 1
+    np.testing.assert_array_equal(clean['c'],[1,2])
+    assert isinstance(clean['d'],str)
+    assert isinstance(clean['e'],str)
+    assert clean['f'] == 'text'
+    assert clean['g'] == 1.5
+
+def test_written_once_compressed_and_chunked(tmp_path):
+    data = cube()
+    path = str(tmp_path / 'result.nc')
+    write_netcdf(data,path)
+    with xr.open_dataset(path) as written:
+        np.testing.assert_array_equal(written['ndvi'].values,data.values)
+        np.testing.assert_array_equal(written.time.values,data.time.values)
+        encoding = written['ndvi'].encoding
+        assert encoding['zlib']
+        assert tuple(encoding['chunksizes']) == (1,10,15)
+        assert written['ndvi'].attrs['valid'] == 1
+        assert 'nodata' not in written['ndvi'].attrs
+
+def test_boolean_variables(tmp_path):
+    data = (cube() > 0.5).rename('mask')
+    path = str(tmp_path / 'mask.nc')
+    write_netcdf(data,path)
+    with xr.open_dataset(path) as written:
+        np.testing.assert_array_equal(written['mask'].values.astype(bool),data.values)
@@ -0,0 +1,56 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+xr = pytest.importorskip('xarray')
+dask = pytest.importorskip('dask')
+pytest.importorskip('zarr')
+
+from result_cache import ResultCache
+
+
+def loaded_data():
+    values = np.arange(2 * 6 * 8,dtype=np.float32).reshape((2,6,8))
+    data = xr.Dataset({'B04': (('time','y','x'),values)},coords={'time': np.array(['2021-01-01','2021-01-11'],dtype='datetime64[ns]'),'y': np.arange(6),'x': np.arange(8)})
+    data.attrs['crs'] = object() # Not serializable, as the CRS set by ODC
+    return data.chunk({'time': 1,'y': 3,'x': 4})
+
+def test_written_when_requested_again(tmp_path):
+    cache = ResultCache(str(tmp_path),maxSize=10**9,maxEntrySize=10**8)
+    data = loaded_data()
+    key = cache.key({'product': 'S2'},'2021-01-01','2021-01-31')
+    assert cache.get(key) is None
+    assert cache.put(key,data) is None # First request
+    write = cache.put(key,data)
+    assert write is not None
+    assert cache.get(key) is None # Visible only once the chunks are written
+    dask.compute(write)
+    cached = cache.get(key)
+    np.testing.assert_array_equal(cached['B04'].values,data['B04'].values)
+    np.testing.assert_array_equal(cached.time.values,data.time.values)
+    assert isinstance(cached.attrs['crs'],str)
+    assert cache.put(key,data) is None # Already cached
+
+def test_too_big_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path),maxSize=10**9,maxEntrySize=10)
+    data = loaded_data()
+    key = cache.key('big')
+    cache.put(key,data)
+    assert cache.put(key,data) is None
+
+def test_evict_removes_stale_temporary_stores(tmp_path):
+    cache = ResultCache(str(tmp_path),maxSize=10**9,maxEntrySize=10**8,protectTime=60)
+    stale = tmp_path / 'abc.zarr.123.tmp'
+    (stale / 'B04').mkdir(parents=True)
+    fresh = tmp_path / 'def.zarr.456.tmp'
+    fresh.mkdir()
+    old = os.path.getmtime(str(stale)) - 3600
+    os.utime(str(stale),(old,old))
+    os.utime(str(stale / 'B04'),(old,old))
+    cache.evict()
+    assert not stale.exists()
+    assert fresh.exists()
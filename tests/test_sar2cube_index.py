@@ -0,0 +1,40 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+xr = pytest.importorskip('xarray')
+
+from sar2cube_index import Sar2CubeIndex, get_index
+
+
+def geolocation_grid(rows=300,cols=200):
+    r, c = np.meshgrid(np.arange(rows),np.arange(cols),indexing='ij')
+    lon = xr.DataArray(11 + c * 0.001 + r * 0.0002,dims=('y','x'))
+    lat = xr.DataArray(46 + r * 0.001 - c * 0.0001,dims=('y','x'))
+    return lon, lat
+
+def test_window_contains_all_the_pixels_in_the_bbox():
+    lon, lat = geolocation_grid()
+    index = Sar2CubeIndex.build(lon,lat,blockSize=32)
+    bbox = (11.05,46.1,11.12,46.2)
+    inside = (lon.values >= bbox[0]) & (lon.values <= bbox[2]) & (lat.values >= bbox[1]) & (lat.values <= bbox[3])
+    rows, cols = index.window(*bbox)
+    assert inside.sum() > 0
+    assert inside[rows,cols].sum() == inside.sum()
+    assert rows.stop - rows.start < lon.shape[0] or cols.stop - cols.start < lon.shape[1] # Smaller than the grid
+
+def test_window_outside():
+    lon, lat = geolocation_grid()
+    assert Sar2CubeIndex.build(lon,lat,blockSize=32).window(12,47,12.1,47.1) is None
+
+def test_stored_per_product_and_shape(tmp_path):
+    lon, lat = geolocation_grid()
+    index = get_index('SAR2Cube_test',lon,lat,str(tmp_path))
+    assert os.path.exists(str(tmp_path / 'SAR2Cube_test_300x200.npz'))
+    stored = Sar2CubeIndex.read(str(tmp_path / 'SAR2Cube_test_300x200.npz'))
+    np.testing.assert_array_equal(stored.lonMin,index.lonMin)
+    assert stored.shape == (300,200)
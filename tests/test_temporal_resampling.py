@@ -0,0 +1,50 @@
+# coding=utf-8
+# Author: Claus Michele - Eurac Research - michele (dot) claus (at) eurac (dot) edu
+# Date:   17/10/2026
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from temporal_resampling import match_dates
+
+
+def dates(*days):
+    return np.array(['2020-01-01'],dtype='datetime64[ns]') + np.array(days,dtype='timedelta64[D]')
+
+def nearest(items,pivot):
+    # Matching of the previous implementation, one target date at a time
+    return min(items,key=lambda x: abs(x - pivot))
+
+def test_nearest_matches_the_previous_implementation():
+    rng = np.random.default_rng(0)
+    source = np.sort(dates(*rng.choice(200,40,replace=False)))
+    target = dates(*rng.integers(-20,220,100))
+    index, valid = match_dates(source,target)
+    assert valid.all()
+    expected = [nearest(source,t) for t in target]
+    np.testing.assert_array_equal(source[index],expected)
+
+def test_ties_go_to_the_earlier_date():
+    index, valid = match_dates(dates(0,4),dates(2))
+    assert index[0] == 0
+
+def test_before_and_after():
+    source = dates(0,10,20)
+    target = dates(-5,0,5,25)
+    index, valid = match_dates(source,target,'before')
+    np.testing.assert_array_equal(valid,[False,True,True,True])
+    np.testing.assert_array_equal(source[index][valid],dates(0,0,20))
+    index, valid = match_dates(source,target,'after')
+    np.testing.assert_array_equal(valid,[True,True,True,False])
+    np.testing.assert_array_equal(source[index][valid],dates(0,0,10))
+
+def test_valid_within():
+    index, valid = match_dates(dates(0,10),dates(1,5,12),validWithin=2)
+    np.testing.assert_array_equal(valid,[True,False,True])
+    index, valid = match_dates(dates(0,10),dates(1),validWithin=0.5)
+    assert not valid[0]
+
+def test_unknown_mode():
+    with pytest.raises(Exception):
+        match_dates(dates(0),dates(0),'closest')